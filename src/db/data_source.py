@@ -1,73 +1,301 @@
 import logging
+import os
 import sqlite3
 import time
-from typing import Any, Dict, List, Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.utils.date_utils import IMESSAGE_SINCE_SQL, imessage_since_params
 
 logger = logging.getLogger(__name__)
 
+# Connection tuning for scanning years of message history: read up to 256 MiB
+# of the file through a memory map instead of copying pages into the page
+# cache, and sort ORDER BY results in memory instead of a temporary file
+DEFAULT_MMAP_SIZE = 256 * 2**20
+DEFAULT_TEMP_STORE = "memory"
+TEMP_STORE_MODES = ("default", "file", "memory")
+
+# Seconds to wait for Messages to finish a write before giving up
+DEFAULT_BUSY_TIMEOUT = 5.0
+
+# SQL predicate matching the text of every supported payment notification.
+# Every pattern contains "AED", so checking that first rejects most other
+# messages with one LIKE instead of four.
+PAYMENT_MESSAGE_FILTER = """text LIKE '%AED%' AND (
+    text LIKE '%Payment of AED%' OR
+    text LIKE '%Your local transfer of AED%' OR
+    text LIKE '%AED% sent by%' OR
+    text LIKE '%AED% from% has been refunded%'
+)"""
+
+
+class MessageDatabaseError(Exception):
+    """The iMessage database could not be read"""
+
+    def __init__(self, message: str, db_path: Optional[str] = None):
+        super().__init__(message)
+        self.db_path = db_path
+
+
+class DatabaseNotFoundError(MessageDatabaseError):
+    """The database file does not exist"""
+
+
+class DatabaseAccessError(MessageDatabaseError):
+    """The database file can't be opened, e.g. without Full Disk Access on macOS"""
+
+
+class DatabaseLockedError(MessageDatabaseError):
+    """The database stayed locked by a writer for longer than the busy timeout"""
+
+
+class DatabaseSchemaError(MessageDatabaseError):
+    """The file is not a database or lacks the expected iMessage tables"""
+
+
+def translate_error(error: sqlite3.Error, db_path: str) -> MessageDatabaseError:
+    """Convert an sqlite3 exception into the matching MessageDatabaseError
+
+    Args:
+        error: Exception raised by sqlite3
+        db_path: Path of the database the operation was on
+
+    Returns:
+        Typed error to raise instead
+    """
+    message = str(error)
+    lowered = message.lower()
+
+    if "locked" in lowered or "busy" in lowered:
+        error_type = DatabaseLockedError
+    elif "unable to open" in lowered or "authorization" in lowered or "readonly" in lowered:
+        error_type = DatabaseAccessError
+    elif "no such" in lowered or "not a database" in lowered or "malformed" in lowered:
+        error_type = DatabaseSchemaError
+    else:
+        error_type = MessageDatabaseError
+
+    return error_type(f"{db_path}: {message}", db_path)
+
 
 class MessageDatabase:
-    """Data source for accessing iMessage database"""
+    """Data source for accessing iMessage database
+
+    chat.db is opened through a read-only URI (and optionally as immutable),
+    so reading never takes a write lock on the live Messages database. The
+    connection is tuned for long scans and kept open between calls until
+    close(), which saves reopening it on every poll in long-running use.
+    SQLite errors are raised as MessageDatabaseError subclasses.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        immutable: bool = False,
+        mmap_size: Optional[int] = None,
+        cache_size: Optional[int] = None,
+        temp_store: Optional[str] = None,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+    ):
+        """Initialize message database
+
+        Args:
+            db_path: Path to chat.db
+            immutable: Whether to open the file as immutable, skipping all
+                locking and change detection; only safe for a copy that
+                nothing writes to
+            mmap_size: Bytes of the file to memory-map (default 256 MiB, 0 disables)
+            cache_size: SQLite page cache size, in pages or negative KiB
+                (default: SQLite's own, 2 MiB)
+            temp_store: Where sorts keep temporary data: "default", "file" or
+                "memory" (default "memory")
+            busy_timeout: Seconds to wait for a lock held by a writer
+        """
+        temp_store = (temp_store or DEFAULT_TEMP_STORE).lower()
+        if temp_store not in TEMP_STORE_MODES:
+            raise ValueError(f"temp_store must be one of {', '.join(TEMP_STORE_MODES)}")
 
-    def __init__(self, db_path: str):
-        """Initialize database connection"""
         self.db_path = db_path
+        self.immutable = immutable
+        self.mmap_size = DEFAULT_MMAP_SIZE if mmap_size is None else mmap_size
+        self.cache_size = cache_size
+        self.temp_store = temp_store
+        self.busy_timeout = busy_timeout
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def uri(self) -> str:
+        """Read-only SQLite URI of the database file"""
+        uri = Path(self.db_path).resolve().as_uri() + "?mode=ro"
+        return uri + "&immutable=1" if self.immutable else uri
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Read-only connection to the database, opened and tuned on first use"""
+        if self._conn is None:
+            if not os.path.exists(self.db_path):
+                raise DatabaseNotFoundError(
+                    f"Database file not found at {self.db_path}", self.db_path
+                )
+            try:
+                conn = sqlite3.connect(self.uri, uri=True, timeout=self.busy_timeout)
+                try:
+                    conn.execute("PRAGMA query_only = ON")
+                    conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+                    if self.cache_size is not None:
+                        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+                    conn.execute(f"PRAGMA temp_store = {self.temp_store}")
+                except sqlite3.Error:
+                    conn.close()
+                    raise
+            except sqlite3.Error as e:
+                raise translate_error(e, self.db_path) from e
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        """Close the database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
 
-    def fetch_payment_messages(self, days: Optional[int] = None) -> List[Dict[str, Any]]:
+    def __enter__(self) -> "MessageDatabase":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def fetch_payment_messages(
+        self,
+        days: Optional[int] = None,
+        since_rowid: Optional[int] = None,
+        until_rowid: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
         """Fetch payment messages from the database
 
         Args:
             days: Optional number of days to limit the search
+            since_rowid: Only return messages with a ROWID greater than this
+            until_rowid: Only return messages with a ROWID up to and including this
 
         Returns:
-            List of dictionaries with message text and date
+            List of dictionaries with message ROWID, text and date
+
+        Raises:
+            MessageDatabaseError: If the database can't be read
         """
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            # Query to capture all relevant payment patterns
-            query = """
-            SELECT text, date FROM message
-            WHERE (
-                text LIKE '%Payment of AED%' OR
-                text LIKE '%Your local transfer of AED%' OR
-                text LIKE '%AED% sent by%' OR
-                text LIKE '%AED% from% has been refunded%'
-            )
-            """
+        return list(
+            self.iter_payment_messages(days=days, since_rowid=since_rowid, until_rowid=until_rowid)
+        )
+
+    def iter_payment_messages(
+        self,
+        days: Optional[int] = None,
+        since_rowid: Optional[int] = None,
+        until_rowid: Optional[int] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream payment messages from the database in batches
+
+        Args:
+            days: Optional number of days to limit the search
+            since_rowid: Only return messages with a ROWID greater than this
+            until_rowid: Only return messages with a ROWID up to and including this
+            batch_size: Number of rows fetched from the cursor at a time
 
-            params = []
+        Yields:
+            Dictionaries with message ROWID, text and date, newest first
 
-            if days:
-                # Convert days to iMessage timestamp format (Mac Absolute Time)
+        Raises:
+            MessageDatabaseError: If the database can't be read, also midway
+        """
+        # Query to capture all relevant payment patterns
+        query = f"SELECT ROWID, text, date FROM message WHERE {PAYMENT_MESSAGE_FILTER}"
+
+        params = []
 
-                # Current time in seconds since Unix epoch
-                current_time_unix = time.time()
+        # ROWID bounds turn the scan into a primary key range lookup
+        if since_rowid is not None:
+            query += " AND ROWID > ?"
+            params.append(since_rowid)
 
-                # Convert to Mac epoch (seconds since 2001-01-01)
-                mac_epoch_diff = 978307200  # Seconds between Unix epoch and Mac epoch
-                current_time_mac = current_time_unix - mac_epoch_diff
+        if until_rowid is not None:
+            query += " AND ROWID <= ?"
+            params.append(until_rowid)
 
-                # Calculate cutoff time in seconds
-                cutoff_time_mac = current_time_mac - (days * 86400)  # 86400 seconds in a day
+        if days:
+            query += " AND " + IMESSAGE_SINCE_SQL.format(date="date")
+            params.extend(imessage_since_params(time.time() - days * 86400))
 
-                # Convert to nanoseconds for iMessage database
-                cutoff_time_ns = int(cutoff_time_mac * 1e9)
+        # Sort by date descending to get newest messages first
+        query += " ORDER BY date DESC"
 
-                # Add to query with parameter
-                query += " AND date > ?"
-                params.append(cutoff_time_ns)
+        conn = self.conn
+        cursor = None
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for rowid, text, date in rows:
+                    yield {"rowid": rowid, "text": text, "date": date}
+        except sqlite3.Error as e:
+            raise translate_error(e, self.db_path) from e
+        finally:
+            # Ends the read transaction even if the caller stops early, so
+            # the reused connection never pins an old snapshot of the WAL
+            if cursor is not None:
+                cursor.close()
 
-            # Sort by date descending to get newest messages first
-            query += " ORDER BY date DESC"
+    def _query_one(self, query: str) -> Optional[tuple]:
+        """Run a query and return its first row"""
+        try:
+            cursor = self.conn.execute(query)
+            try:
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+        except sqlite3.Error as e:
+            raise translate_error(e, self.db_path) from e
 
-            cursor.execute(query, params)
-            results = cursor.fetchall()
-            conn.close()
+    def get_max_rowid(self) -> int:
+        """Get the highest message ROWID currently in the database
 
-            return [{"text": text, "date": date} for text, date in results]
+        Returns:
+            Highest ROWID, or 0 for an empty table
+
+        Raises:
+            MessageDatabaseError: If the database can't be read
+        """
+        (max_rowid,) = self._query_one("SELECT MAX(ROWID) FROM message")
+        return max_rowid or 0
 
-        except Exception as e:
-            logger.error(f"Database error: {e}")
-            return []
+    def get_identity(self) -> str:
+        """Get a fingerprint identifying this particular message database
+
+        Made of the file's real path and the unique identifier Messages
+        stores in _SqliteDatabaseProperties when it creates a chat.db. Both
+        stay the same while messages come and go, including when old
+        threads are deleted, but the identifier changes when the database
+        is recreated. A recreated database at the same path is also caught
+        by its ROWIDs going backwards.
+
+        Returns:
+            Identity string
+
+        Raises:
+            MessageDatabaseError: If the database can't be read
+        """
+        has_properties = self._query_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+            "AND name = '_SqliteDatabaseProperties'"
+        )
+        unique_id = ""
+        if has_properties:
+            row = self._query_one(
+                "SELECT value FROM _SqliteDatabaseProperties WHERE key = '_UniqueIdentifier'"
+            )
+            unique_id = row[0] if row else ""
+        return f"{os.path.realpath(self.db_path)}:{unique_id}"
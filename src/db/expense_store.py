@@ -0,0 +1,699 @@
+import logging
+import os
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from src.models.expense import ExpenseBatch
+from src.services.sketches import amount_bucket
+from src.utils.config import ExpenseStore
+from src.utils.date_utils import DAY_KEY_SQL, MONTH_KEY_SQL
+
+logger = logging.getLogger(__name__)
+
+# File extensions that select the SQLite expense store
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    amount REAL NOT NULL,
+    merchant TEXT NOT NULL,
+    category TEXT NOT NULL,
+    date TEXT,
+    message TEXT NOT NULL DEFAULT '',
+    is_income INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+CREATE INDEX IF NOT EXISTS idx_expenses_merchant ON expenses(merchant);
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _rollup_keys(bucket: str, sketch: bool) -> List[str]:
+    """Get the key columns of a rollup table"""
+    keys = [bucket, "category", "merchant", "is_income"]
+    if sketch:
+        keys.append("amount_bucket")
+    return keys
+
+
+def _rollup_values(key_sql: str, sketch: bool, row: str) -> List[str]:
+    """Get the SQL expressions of a rollup table's keys for an expenses row
+
+    Args:
+        key_sql: SQL expression deriving the time bucket from a date column
+        sketch: Whether the table has an amount bucket column
+        row: Row reference, e.g. NEW or OLD, or "" for the table itself
+    """
+    prefix = f"{row}." if row else ""
+    values = [
+        key_sql.format(date=f"{prefix}date"),
+        f"{prefix}category",
+        f"{prefix}merchant",
+        f"{prefix}is_income",
+    ]
+    if sketch:
+        values.append(f"amount_bucket({prefix}amount)")
+    return values
+
+
+def _rollup_schema(table: str, bucket: str, key_sql: str, sketch: bool = False) -> str:
+    """Build a rollup table of totals per (bucket, category, merchant, direction)
+
+    The table is kept up to date by triggers that apply the delta of every
+    insert, update and delete. The triggers are recreated on every open so
+    stores pick up trigger changes.
+
+    Args:
+        table: Name of the rollup table
+        bucket: Name of its integer time bucket column
+        key_sql: SQL expression deriving the bucket from a date column, 0 for NULL
+        sketch: Whether to also key the totals by the amount's AmountSketch
+            bucket, which makes the table a set of amount distribution sketches
+    """
+    keys = _rollup_keys(bucket, sketch)
+    key_list = ", ".join(keys)
+    new_values = ", ".join(_rollup_values(key_sql, sketch, "NEW"))
+    old_match = " AND ".join(
+        f"{key} = {value}" for key, value in zip(keys, _rollup_values(key_sql, sketch, "OLD"))
+    )
+    key_columns = "".join(
+        f"    {key} {'TEXT' if key in ('category', 'merchant') else 'INTEGER'} NOT NULL,\n"
+        for key in keys
+    )
+    return f"""
+CREATE TABLE IF NOT EXISTS {table} (
+{key_columns}    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY ({key_list})
+);
+DROP TRIGGER IF EXISTS {table}_insert;
+CREATE TRIGGER {table}_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO {table} ({key_list}, total, count)
+    VALUES ({new_values}, NEW.amount, 1)
+    ON CONFLICT ({key_list})
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+DROP TRIGGER IF EXISTS {table}_delete;
+CREATE TRIGGER {table}_delete AFTER DELETE ON expenses BEGIN
+    UPDATE {table} SET total = total - OLD.amount, count = count - 1
+    WHERE {old_match};
+    DELETE FROM {table} WHERE {old_match} AND count <= 0;
+END;
+DROP TRIGGER IF EXISTS {table}_update;
+CREATE TRIGGER {table}_update
+AFTER UPDATE OF amount, merchant, category, date, is_income ON expenses BEGIN
+    UPDATE {table} SET total = total - OLD.amount, count = count - 1
+    WHERE {old_match};
+    DELETE FROM {table} WHERE {old_match} AND count <= 0;
+    INSERT INTO {table} ({key_list}, total, count)
+    VALUES ({new_values}, NEW.amount, 1)
+    ON CONFLICT ({key_list})
+    DO UPDATE SET total = total + excluded.total, count = count + 1;
+END;
+"""
+
+
+def _rollup_query(bucket: str, key_sql: str, sketch: bool = False) -> str:
+    """Build a query recomputing a rollup table from scratch, grouped like the table"""
+    keys = _rollup_keys(bucket, sketch)
+    values = _rollup_values(key_sql, sketch, "")
+    columns = ", ".join(
+        value if value == key else f"{value} AS {key}" for key, value in zip(keys, values)
+    )
+    return f"""
+SELECT {columns}, SUM(amount), COUNT(*)
+FROM expenses
+GROUP BY {", ".join(keys)}
+"""
+
+
+# Rollup tables as (table, bucket column, bucket expression, sketch): totals
+# per YYYYMM month for whole-history reports, per YYYYMMDD day for date
+# ranges, and per month and AmountSketch bucket for amount distributions
+ROLLUP_TABLES = (
+    ("expense_rollups", "month", MONTH_KEY_SQL, False),
+    ("expense_daily_rollups", "day", DAY_KEY_SQL, False),
+    ("expense_amount_sketches", "month", MONTH_KEY_SQL, True),
+)
+
+ROLLUP_SCHEMA = "".join(_rollup_schema(*table) for table in ROLLUP_TABLES)
+
+
+# Distinct merchants of the stored expenses with their expense counts, kept up
+# to date by triggers. `keyword` is the category keyword that decided the
+# merchant's category ('' when none matched, NULL until indexed), so the
+# merchants affected by a keyword change can be found without a scan.
+MERCHANT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchants (
+    merchant TEXT PRIMARY KEY,
+    expense_count INTEGER NOT NULL,
+    keyword TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_merchants_keyword ON merchants(keyword);
+CREATE TRIGGER IF NOT EXISTS merchants_insert AFTER INSERT ON expenses BEGIN
+    INSERT INTO merchants (merchant, expense_count) VALUES (NEW.merchant, 1)
+    ON CONFLICT (merchant) DO UPDATE SET expense_count = expense_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS merchants_delete AFTER DELETE ON expenses BEGIN
+    UPDATE merchants SET expense_count = expense_count - 1 WHERE merchant = OLD.merchant;
+    DELETE FROM merchants WHERE merchant = OLD.merchant AND expense_count <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS merchants_update AFTER UPDATE OF merchant ON expenses BEGIN
+    UPDATE merchants SET expense_count = expense_count - 1 WHERE merchant = OLD.merchant;
+    DELETE FROM merchants WHERE merchant = OLD.merchant AND expense_count <= 0;
+    INSERT INTO merchants (merchant, expense_count) VALUES (NEW.merchant, 1)
+    ON CONFLICT (merchant) DO UPDATE SET expense_count = expense_count + 1;
+END;
+"""
+
+EXPENSE_COLUMNS = "id, amount, merchant, category, date, message, is_income"
+
+
+def _expense_row(expense: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Convert an expense dictionary to insert parameters"""
+    return (
+        expense["amount"],
+        expense["merchant"],
+        expense["category"],
+        expense.get("date"),
+        expense.get("message", ""),
+        int(bool(expense.get("is_income", False))),
+    )
+
+
+def _expense_dict(row: Tuple[Any, ...]) -> Dict[str, Any]:
+    """Convert a database row to an expense dictionary like Expense.to_dict"""
+    expense_id, amount, merchant, category, date, message, is_income = row
+    result = {
+        "id": expense_id,
+        "amount": amount,
+        "merchant": merchant,
+        "category": category,
+        "message": message,
+        "is_income": bool(is_income),
+    }
+
+    if date:
+        result["date"] = date
+
+    return result
+
+
+class SQLiteExpenseStore:
+    """Expense store backed by an indexed SQLite database
+
+    Offers the same API as the JSON ExpenseStore, but every expense gets a
+    stable id and appends and category updates only touch the affected rows
+    instead of rewriting the whole history. Totals per month, category,
+    merchant and direction are materialized alongside the expenses, as are
+    AmountSketch buckets of their transaction sizes.
+    """
+
+    def __init__(self, data_file: str = "expenses.db", migrate_from: Optional[str] = None):
+        """Initialize expense store
+
+        Args:
+            data_file: Path to the SQLite database file
+            migrate_from: Legacy JSON expenses file imported once into a new store
+        """
+        self.data_file = data_file
+        self.migrate_from = migrate_from
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection to the store database, opened and migrated on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.data_file)
+            # Used by the amount sketch triggers, so writes need a connection made here
+            self._conn.create_function("amount_bucket", 1, amount_bucket, deterministic=True)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate_json()
+            self._init_rollups()
+            self._init_merchants()
+        return self._conn
+
+    def close(self):
+        """Close the database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _migrate_json(self):
+        """Import expenses from the legacy JSON file the first time the store is opened"""
+        conn = self._conn
+        if conn.execute("SELECT value FROM store_meta WHERE key = 'migrated'").fetchone():
+            return
+
+        with conn:
+            if self.migrate_from and os.path.exists(self.migrate_from):
+                if conn.execute("SELECT 1 FROM expenses LIMIT 1").fetchone() is None:
+                    count = self._insert(ExpenseStore(self.migrate_from).load_expenses())
+                    logger.info(f"Migrated {count} expenses from {self.migrate_from}")
+            conn.execute("INSERT INTO store_meta (key, value) VALUES ('migrated', '1')")
+
+    def _init_rollups(self):
+        """Create the rollup tables and triggers, backfilling stores created without them"""
+        conn = self._conn
+        existing = {
+            name
+            for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+        }
+
+        with conn:
+            conn.executescript(ROLLUP_SCHEMA)
+            for table in ROLLUP_TABLES:
+                if table[0] not in existing:
+                    self._rebuild_rollup_table(*table)
+
+    def _init_merchants(self):
+        """Create the merchant table and triggers, backfilling stores created without them"""
+        conn = self._conn
+        has_merchants = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'merchants'"
+        ).fetchone()
+
+        with conn:
+            conn.executescript(MERCHANT_SCHEMA)
+            if not has_merchants:
+                conn.execute(
+                    "INSERT INTO merchants (merchant, expense_count) "
+                    "SELECT merchant, COUNT(*) FROM expenses GROUP BY merchant"
+                )
+
+    def _rebuild_rollup_table(self, table: str, bucket: str, key_sql: str, sketch: bool):
+        """Recompute one rollup table from the expenses in the current transaction"""
+        keys = ", ".join(_rollup_keys(bucket, sketch))
+        self.conn.execute(f"DELETE FROM {table}")
+        self.conn.execute(
+            f"INSERT INTO {table} ({keys}, total, count) " + _rollup_query(bucket, key_sql, sketch)
+        )
+
+    def _rebuild_rollups(self):
+        """Recompute every rollup table from the expenses in the current transaction"""
+        for table in ROLLUP_TABLES:
+            self._rebuild_rollup_table(*table)
+
+    def rebuild_rollups(self):
+        """Recompute the rollup tables from scratch"""
+        with self.conn:
+            self._rebuild_rollups()
+
+    def load_rollups(self) -> List[Tuple[int, str, str, bool, float, int]]:
+        """Load the materialized monthly expense totals
+
+        Returns:
+            List of (YYYYMM month or 0, category, merchant, is_income, total, count)
+        """
+        return [
+            (month, category, merchant, bool(is_income), total, count)
+            for month, category, merchant, is_income, total, count in self.conn.execute(
+                "SELECT month, category, merchant, is_income, total, count FROM expense_rollups"
+            )
+        ]
+
+    def load_daily_rollups(
+        self, first_day: Optional[int] = None, last_day: Optional[int] = None
+    ) -> List[Tuple[int, str, str, bool, float, int]]:
+        """Load the materialized daily expense totals of dated expenses
+
+        Args:
+            first_day: Optional first YYYYMMDD day to include (0 for no limit)
+            last_day: Optional last YYYYMMDD day to include (0 for no limit)
+
+        Returns:
+            List of (YYYYMMDD day, category, merchant, is_income, total, count), by day
+        """
+        # The day leads the primary key, so a range is an index range scan
+        return [
+            (day, category, merchant, bool(is_income), total, count)
+            for day, category, merchant, is_income, total, count in self.conn.execute(
+                "SELECT day, category, merchant, is_income, total, count "
+                "FROM expense_daily_rollups WHERE day BETWEEN ? AND ? ORDER BY day",
+                (max(first_day or 0, 1), last_day or 99991231),
+            )
+        ]
+
+    def load_amount_sketches(
+        self,
+        first_month: Optional[int] = None,
+        last_month: Optional[int] = None,
+        is_income: bool = False,
+    ) -> List[Tuple[int, str, str, int, float, int]]:
+        """Load the materialized amount distribution sketches of one direction
+
+        Args:
+            first_month: Optional first YYYYMM month to include, which leaves
+                out undated expenses (0 or None for no limit)
+            last_month: Optional last YYYYMM month to include (0 or None for no limit)
+            is_income: Whether to load incoming instead of outgoing transactions
+
+        Returns:
+            List of (YYYYMM month or 0, category, merchant, AmountSketch bucket, total, count)
+        """
+        return self.conn.execute(
+            "SELECT month, category, merchant, amount_bucket, total, count "
+            "FROM expense_amount_sketches WHERE month BETWEEN ? AND ? AND is_income = ?",
+            (first_month or 0, last_month or 999912, int(is_income)),
+        ).fetchall()
+
+    def verify_rollups(self, tolerance: float = 1e-6) -> List[Dict[str, Any]]:
+        """Compare the materialized rollups with a full recompute from the expenses
+
+        Args:
+            tolerance: Allowed absolute difference between totals
+
+        Returns:
+            List of mismatching buckets with their table, stored and expected
+            totals; empty if consistent
+        """
+        mismatches = []
+        for table, bucket, key_sql, sketch in ROLLUP_TABLES:
+            keys = _rollup_keys(bucket, sketch)
+            expected = {
+                row[:-2]: row[-2:]
+                for row in self.conn.execute(_rollup_query(bucket, key_sql, sketch))
+            }
+            stored = {
+                row[:-2]: row[-2:]
+                for row in self.conn.execute(
+                    f"SELECT {', '.join(keys)}, total, count FROM {table}"
+                )
+            }
+
+            for key in expected.keys() | stored.keys():
+                expected_total, expected_count = expected.get(key, (0.0, 0))
+                stored_total, stored_count = stored.get(key, (0.0, 0))
+                if stored_count != expected_count or abs(stored_total - expected_total) > tolerance:
+                    mismatch: Dict[str, Any] = {"table": table, **dict(zip(keys, key))}
+                    mismatch["is_income"] = bool(mismatch["is_income"])
+                    mismatch["stored"] = (stored_total, stored_count)
+                    mismatch["expected"] = (expected_total, expected_count)
+                    mismatches.append(mismatch)
+
+        return mismatches
+
+    def _insert(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
+        """Insert expenses in the current transaction
+
+        Returns:
+            Number of inserted expenses
+        """
+        if isinstance(expenses, ExpenseBatch):
+            # Columns map straight to parameters, without intermediate dicts
+            rows = expenses.iter_rows()
+        else:
+            rows = (_expense_row(expense) for expense in expenses)
+
+        cursor = self.conn.executemany(
+            "INSERT INTO expenses (amount, merchant, category, date, message, is_income) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        return cursor.rowcount
+
+    def save_expenses(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
+        """Replace all stored expenses
+
+        Args:
+            expenses: Iterable of expense dictionaries or an ExpenseBatch
+
+        Returns:
+            Number of expenses saved
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM expenses")
+            return self._insert(expenses)
+
+    def append_expenses(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
+        """Append expenses to the ones already stored
+
+        Args:
+            expenses: Iterable of expense dictionaries or an ExpenseBatch
+
+        Returns:
+            Number of expenses appended
+        """
+        with self.conn:
+            return self._insert(expenses)
+
+    def merge_expenses(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
+        """Append expenses, skipping the ones already stored
+
+        An expense is already stored when one with the same date and
+        message exists, so importing a message window again, e.g. after the
+        ingest watermark was lost, keeps the history and adds no duplicates.
+        Expenses without a message are always appended.
+
+        Args:
+            expenses: Iterable of expense dictionaries or an ExpenseBatch
+
+        Returns:
+            Number of expenses appended
+        """
+        if isinstance(expenses, ExpenseBatch):
+            rows = expenses.iter_rows()
+        else:
+            rows = (_expense_row(expense) for expense in expenses)
+
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT INTO expenses (amount, merchant, category, date, message, is_income) "
+                "SELECT ?1, ?2, ?3, ?4, ?5, ?6 WHERE ?5 = '' OR NOT EXISTS ("
+                "SELECT 1 FROM expenses WHERE date IS ?4 AND message = ?5)",
+                rows,
+            )
+            return cursor.rowcount
+
+    def iter_expenses(
+        self,
+        batch_size: int = 1000,
+        first_day: Optional[date] = None,
+        last_day: Optional[date] = None,
+        after_id: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream stored expenses in insertion order
+
+        Args:
+            batch_size: Number of rows fetched from the cursor at a time
+            first_day: Optional first day to include; undated expenses are then left out
+            last_day: Optional last day to include; undated expenses are then left out
+            after_id: Optional id, e.g. from get_last_id, after which to start
+
+        Yields:
+            Expense dictionaries including their id
+        """
+        # ISO dates sort as text, so the bounds can use the date index
+        conditions = []
+        params = []
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        if first_day is not None:
+            conditions.append("date >= ?")
+            params.append(first_day.isoformat())
+        if last_day is not None:
+            conditions.append("date < ?")
+            params.append((last_day + timedelta(days=1)).isoformat())
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        cursor = self.conn.execute(
+            f"SELECT {EXPENSE_COLUMNS} FROM expenses{where} ORDER BY id", params
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _expense_dict(row)
+
+    def load_expenses(self) -> List[Dict[str, Any]]:
+        """Load all stored expenses
+
+        Returns:
+            List of expense dictionaries including their id
+        """
+        return list(self.iter_expenses())
+
+    def get_expense(self, expense_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single expense by id
+
+        Args:
+            expense_id: Stable expense id
+
+        Returns:
+            Expense dictionary or None if no such expense exists
+        """
+        row = self.conn.execute(
+            f"SELECT {EXPENSE_COLUMNS} FROM expenses WHERE id = ?", (expense_id,)
+        ).fetchone()
+        return _expense_dict(row) if row else None
+
+    def get_last_id(self) -> Optional[int]:
+        """Get the id of the most recently stored expense
+
+        Returns:
+            Largest expense id, None if no expenses are stored
+        """
+        return self.conn.execute("SELECT MAX(id) FROM expenses").fetchone()[0]
+
+    def update_expense_category(self, expense_id: int, category: str) -> Optional[Dict[str, Any]]:
+        """Update category for a specific expense
+
+        Args:
+            expense_id: Stable expense id, as listed in reports
+            category: New category
+
+        Returns:
+            Updated expense or None if no such expense exists
+        """
+        if not self.update_expense_categories([(expense_id, category)]):
+            return None
+        return self.get_expense(expense_id)
+
+    def load_merchants(self) -> Dict[str, Optional[str]]:
+        """Get the distinct merchants of the stored expenses
+
+        Returns:
+            Mapping of merchant to the keyword that decided its category: ''
+            when no keyword matched, None when not indexed yet
+        """
+        return dict(self.conn.execute("SELECT merchant, keyword FROM merchants"))
+
+    def merchants_for_keyword(self, keyword: str) -> List[str]:
+        """Get the merchants whose category was decided by a keyword
+
+        Args:
+            keyword: Lowercase category keyword
+
+        Returns:
+            List of merchant names
+        """
+        cursor = self.conn.execute("SELECT merchant FROM merchants WHERE keyword = ?", (keyword,))
+        return [row[0] for row in cursor]
+
+    def get_merchant_rules_version(self) -> Optional[str]:
+        """Get the version of the category rules the merchant keywords were computed with"""
+        row = self.conn.execute(
+            "SELECT value FROM store_meta WHERE key = 'merchant_rules_version'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_merchant_keywords(
+        self, keywords: Iterable[Tuple[str, Optional[str]]], rules_version: str
+    ):
+        """Record the keyword that decided the category of each merchant
+
+        Args:
+            keywords: Iterable of (merchant, keyword or None) pairs
+            rules_version: Version of the category rules the keywords come from
+        """
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE merchants SET keyword = ? WHERE merchant = ?",
+                ((keyword or "", merchant) for merchant, keyword in keywords),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) "
+                "VALUES ('merchant_rules_version', ?)",
+                (rules_version,),
+            )
+
+    def get_merchant_revision(self) -> Optional[int]:
+        """Get the merchant canonicalization revision the stored merchant names follow"""
+        row = self.conn.execute(
+            "SELECT value FROM store_meta WHERE key = 'merchant_revision'"
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def update_expense_merchants(self, updates: Iterable[Tuple[int, str]], revision: int) -> int:
+        """Rename the merchant of many expenses in one transaction
+
+        Categories are left unchanged. The rollups and merchant counts follow
+        through their triggers.
+
+        Args:
+            updates: Iterable of (expense id, new merchant name) pairs
+            revision: Merchant canonicalization revision the names now follow
+
+        Returns:
+            Number of updated expenses
+        """
+        with self.conn:
+            cursor = self.conn.executemany(
+                "UPDATE expenses SET merchant = ? WHERE id = ?",
+                ((merchant, expense_id) for expense_id, merchant in updates),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO store_meta (key, value) VALUES ('merchant_revision', ?)",
+                (str(revision),),
+            )
+            return cursor.rowcount
+
+    def clear_merchant_keywords(self):
+        """Mark every merchant as not indexed, e.g. after the category rules changed"""
+        with self.conn:
+            self.conn.execute("UPDATE merchants SET keyword = NULL")
+            self.conn.execute("DELETE FROM store_meta WHERE key = 'merchant_rules_version'")
+
+    def recategorize_merchants(self, changes: Iterable[Tuple[str, str, str]]) -> int:
+        """Move the expenses of merchants from one category to another in one transaction
+
+        Only expenses still in the old category are moved, so categories set
+        by hand are kept.
+
+        Args:
+            changes: Iterable of (merchant, old category, new category)
+
+        Returns:
+            Number of updated expenses
+        """
+        with self.conn:
+            cursor = self.conn.executemany(
+                "UPDATE expenses SET category = ? WHERE merchant = ? AND category = ?",
+                ((new, merchant, old) for merchant, old, new in changes),
+            )
+            return cursor.rowcount
+
+    def update_expense_categories(self, updates: Iterable[Tuple[int, str]]) -> int:
+        """Update the category of many expenses in one transaction
+
+        Args:
+            updates: Iterable of (expense id, new category) pairs
+
+        Returns:
+            Number of updated expenses
+        """
+        with self.conn:
+            cursor = self.conn.executemany(
+                "UPDATE expenses SET category = ? WHERE id = ?",
+                ((category, expense_id) for expense_id, category in updates),
+            )
+            return cursor.rowcount
+
+
+def open_expense_store(data_file: str):
+    """Open the expense store matching a data file's extension
+
+    SQLite files (.db, .sqlite, .sqlite3) use SQLiteExpenseStore, which imports a
+    JSON file with the same name on first use. Anything else uses the JSON
+    ExpenseStore.
+
+    Args:
+        data_file: Path to data file
+
+    Returns:
+        SQLiteExpenseStore or ExpenseStore
+    """
+    base, extension = os.path.splitext(data_file)
+    if extension.lower() in SQLITE_EXTENSIONS:
+        return SQLiteExpenseStore(data_file, migrate_from=f"{base}.json")
+    return ExpenseStore(data_file)
@@ -0,0 +1,210 @@
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.services.merchants import MERCHANT_REVISION, canonical_merchant
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS merchant_names (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS merchant_aliases (
+    raw TEXT PRIMARY KEY,
+    merchant_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dictionary_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class MerchantDictionary:
+    """Persistent interning of merchant names into integer ids
+
+    Every raw merchant name extracted from a message is canonicalized once
+    (see canonical_merchant) and recorded as an alias of a merchant id.
+    Variants that differ only in case, whitespace, punctuation or store
+    numbers share one id, named after the first variant seen. Ids are
+    dense, so per-merchant state can live in lists, and every expense of a
+    merchant references the same name string.
+
+    The pipeline categorizes each merchant id once per run. Stored expenses,
+    reports, ExpenseBatch and the categorizer's cache keep using the
+    canonical name, which maps one to one to the id, so they group the same
+    way without depending on this file.
+
+    The dictionary is loaded whole on first use; new names are written
+    back by flush(). It is dropped when MERCHANT_REVISION changes.
+    """
+
+    def __init__(self, dictionary_file: Optional[str] = None, read_only: bool = False):
+        """Initialize merchant dictionary
+
+        Args:
+            dictionary_file: Path to the dictionary database; None keeps it in memory
+            read_only: Whether to leave the file unchanged, e.g. in worker processes
+        """
+        self.dictionary_file = dictionary_file
+        self.read_only = read_only or dictionary_file is None
+        self.names: List[str] = []
+        self._key_ids: Dict[str, int] = {}
+        self._raw_ids: Dict[str, int] = {}
+        self._new_names: List[Tuple[int, str, str]] = []
+        self._new_aliases: List[Tuple[str, int]] = []
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection to the dictionary database, validated against MERCHANT_REVISION
+
+        A read-only dictionary opens the file read-only and leaves the schema
+        and the revision check to the writer.
+        """
+        if self._conn is None:
+            if self.read_only:
+                uri = Path(self.dictionary_file).resolve().as_uri() + "?mode=ro"
+                self._conn = sqlite3.connect(uri, uri=True, timeout=30)
+                return self._conn
+
+            # Worker processes read the file while the main process writes it
+            self._conn = sqlite3.connect(self.dictionary_file, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._check_revision()
+        return self._conn
+
+    def close(self):
+        """Write pending names and close the database connection"""
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _check_revision(self):
+        """Drop the dictionary if it was built by a different canonicalization revision"""
+        row = self._conn.execute(
+            "SELECT value FROM dictionary_meta WHERE key = 'revision'"
+        ).fetchone()
+        if row and row[0] == str(MERCHANT_REVISION):
+            return
+
+        with self._conn:
+            if row:
+                logger.info("Merchant canonicalization changed, clearing merchant dictionary")
+            self._conn.execute("DELETE FROM merchant_names")
+            self._conn.execute("DELETE FROM merchant_aliases")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dictionary_meta (key, value) VALUES ('revision', ?)",
+                (str(MERCHANT_REVISION),),
+            )
+
+    def _load(self):
+        """Read the persisted names and aliases"""
+        self._loaded = True
+        if self.dictionary_file is None:
+            return
+
+        try:
+            conn = self.conn
+            row = conn.execute(
+                "SELECT value FROM dictionary_meta WHERE key = 'revision'"
+            ).fetchone()
+        except sqlite3.Error:
+            if not self.read_only:
+                raise
+            # The writer hasn't created the file yet, so every name is new
+            return
+        if not row or row[0] != str(MERCHANT_REVISION):
+            # Only a read-only copy gets here; the writer rebuilds the file
+            return
+
+        # Ids are assigned in order by a single writer, so they are dense
+        for merchant_id, key, name in conn.execute(
+            "SELECT id, key, name FROM merchant_names ORDER BY id"
+        ):
+            self.names.append(name)
+            self._key_ids[key] = merchant_id
+
+        self._raw_ids.update(conn.execute("SELECT raw, merchant_id FROM merchant_aliases"))
+
+    def __len__(self) -> int:
+        """Number of distinct merchants"""
+        if not self._loaded:
+            self._load()
+        return len(self.names)
+
+    @property
+    def alias_count(self) -> int:
+        """Number of raw merchant names recorded"""
+        if not self._loaded:
+            self._load()
+        return len(self._raw_ids)
+
+    def intern(self, raw: str) -> int:
+        """Get the id of a raw merchant name, assigning one to new merchants
+
+        Args:
+            raw: Merchant name as extracted from a message
+
+        Returns:
+            Merchant id, an index into names
+        """
+        merchant_id = self._raw_ids.get(raw)
+        if merchant_id is not None:
+            return merchant_id
+        if not self._loaded:
+            self._load()
+            merchant_id = self._raw_ids.get(raw)
+            if merchant_id is not None:
+                return merchant_id
+
+        name = canonical_merchant(raw)
+        key = name.casefold()
+        merchant_id = self._key_ids.get(key)
+        if merchant_id is None:
+            merchant_id = self._key_ids[key] = len(self.names)
+            self.names.append(name)
+            self._new_names.append((merchant_id, key, name))
+
+        self._raw_ids[raw] = merchant_id
+        self._new_aliases.append((raw, merchant_id))
+        return merchant_id
+
+    def name(self, merchant_id: int) -> str:
+        """Get the canonical name of a merchant id"""
+        return self.names[merchant_id]
+
+    def canonicalize(self, raw: str) -> str:
+        """Get the canonical name of a raw merchant name"""
+        return self.names[self.intern(raw)]
+
+    def flush(self):
+        """Write the names and aliases recorded since the last flush"""
+        if self.read_only or not (self._new_names or self._new_aliases):
+            self._new_names.clear()
+            self._new_aliases.clear()
+            return
+
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO merchant_names (id, key, name) VALUES (?, ?, ?)",
+                    self._new_names,
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO merchant_aliases (raw, merchant_id) VALUES (?, ?)",
+                    self._new_aliases,
+                )
+        except sqlite3.Error as e:
+            # Names are assigned again from the raw merchants on the next run
+            logger.error(f"Error writing merchant dictionary: {e}")
+        self._new_names.clear()
+        self._new_aliases.clear()
@@ -0,0 +1,211 @@
+import hashlib
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.services.parser import ParsedMessage, get_parser_version, parse_messages
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS parsed_messages (
+    rowid INTEGER PRIMARY KEY,
+    message_hash BLOB NOT NULL,
+    amount REAL NOT NULL,
+    merchant TEXT NOT NULL,
+    is_income INTEGER NOT NULL,
+    date TEXT
+);
+CREATE TABLE IF NOT EXISTS cache_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Number of ROWIDs looked up per query, below SQLite's old 999 variable limit
+LOOKUP_BATCH_SIZE = 500
+
+
+def message_hash(text: str, date: Optional[int]) -> bytes:
+    """Short digest of a message's text and raw date
+
+    Detects ROWIDs that now hold a different message, e.g. after switching
+    to another chat.db.
+    """
+    return hashlib.blake2b(f"{date}:{text}".encode(), digest_size=8).digest()
+
+
+def cache_version() -> str:
+    """Version parsed results are valid for
+
+    Dates are converted to local time, so the local time zone is part of the
+    version along with the parser fingerprint.
+    """
+    return f"{get_parser_version()}:{'/'.join(time.tzname)}:{time.timezone}"
+
+
+class ParseCache:
+    """Persistent cache of parsed payment messages
+
+    Maps a message ROWID to the amount, merchant, direction and date parsed
+    from it. A hash of the text and raw date is stored alongside, so a ROWID
+    holding a different message is parsed again. The whole cache is dropped
+    when the parser version (template definitions) or the local time zone
+    changes.
+    """
+
+    def __init__(self, cache_file: str):
+        """Initialize parse cache
+
+        Args:
+            cache_file: Path to the cache database
+        """
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Connection to the cache database, validated against the parser version on first use"""
+        if self._conn is None:
+            # Worker processes share the file, so wait for each other's writes
+            self._conn = sqlite3.connect(self.cache_file, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._check_version()
+        return self._conn
+
+    def close(self):
+        """Close the database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _check_version(self):
+        """Drop all cached results if they were produced by a different parser version"""
+        version = cache_version()
+        row = self._conn.execute(
+            "SELECT value FROM cache_meta WHERE key = 'version'"
+        ).fetchone()
+        if row and row[0] == version:
+            return
+
+        with self._conn:
+            if row:
+                logger.info("Parser changed, clearing parse cache")
+            self._conn.execute("DELETE FROM parsed_messages")
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_meta (key, value) VALUES ('version', ?)", (version,)
+            )
+
+    def clear(self):
+        """Remove all cached results"""
+        with self.conn:
+            self.conn.execute("DELETE FROM parsed_messages")
+
+    def _lookup(self, rowids: List[int]) -> Dict[int, Tuple[Any, ...]]:
+        """Fetch cached rows by ROWID"""
+        placeholders = ",".join("?" * len(rowids))
+        cursor = self.conn.execute(
+            "SELECT rowid, message_hash, amount, merchant, is_income, date FROM parsed_messages "
+            f"WHERE rowid IN ({placeholders})",
+            rowids,
+        )
+        return {row[0]: row for row in cursor}
+
+    def iter_parsed(self, messages: Iterable[Dict[str, Any]]) -> Iterator[ParsedMessage]:
+        """Parse messages, reusing cached results where possible
+
+        Messages are looked up in batches by ROWID. The misses of a batch are
+        parsed together and written back. Messages without a ROWID are parsed
+        without the cache.
+
+        Args:
+            messages: Message dictionaries with rowid, text and date
+
+        Yields:
+            Tuples of (message, payment details, date or None), in input order
+        """
+        messages = iter(messages)
+
+        while True:
+            batch = list(islice(messages, LOOKUP_BATCH_SIZE))
+            if not batch:
+                break
+
+            rowids = [message["rowid"] for message in batch if message.get("rowid") is not None]
+            cached = self._lookup(rowids) if rowids else {}
+
+            results: List[Optional[ParsedMessage]] = []
+            misses = []
+            digests = []
+
+            for message in batch:
+                rowid = message.get("rowid")
+                digest = message_hash(message["text"], message.get("date"))
+                row = cached.get(rowid) if rowid is not None else None
+
+                if row is not None and row[1] == digest:
+                    self.hits += 1
+                    _, _, amount, merchant, is_income, date = row
+                    details = {
+                        "amount": amount,
+                        "merchant": merchant,
+                        "message": message["text"],
+                        "is_income": bool(is_income),
+                    }
+                    date = datetime.fromisoformat(date) if date else None
+                    results.append((message, details, date))
+                else:
+                    results.append(None)
+                    misses.append(message)
+                    digests.append(digest)
+
+            if misses:
+                parsed = parse_messages(misses)
+                rows = []
+                for (message, details, date), digest in zip(parsed, digests):
+                    if message.get("rowid") is None:
+                        continue
+                    self.misses += 1
+                    rows.append(
+                        (
+                            message["rowid"],
+                            digest,
+                            details["amount"],
+                            details["merchant"],
+                            int(details["is_income"]),
+                            date.isoformat() if date else None,
+                        )
+                    )
+                if rows:
+                    self._store(rows)
+
+                # Fill the gaps left by the misses, in input order
+                remaining = iter(parsed)
+                results = [result or next(remaining) for result in results]
+
+            yield from results
+
+    def _store(self, rows: List[Tuple[Any, ...]]):
+        """Write parsed results, replacing stale ones for the same ROWID"""
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO parsed_messages "
+                    "(rowid, message_hash, amount, merchant, is_income, date) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            # The cache is only an optimization; the run continues without it
+            logger.error(f"Error writing parse cache: {e}")
+
+    def cache_info(self) -> Dict[str, int]:
+        """Get hit and miss counts of this instance"""
+        return {"hits": self.hits, "misses": self.misses}
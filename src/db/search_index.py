@@ -0,0 +1,240 @@
+import logging
+import sqlite3
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from src.db.data_source import PAYMENT_MESSAGE_FILTER, MessageDatabase, translate_error
+from src.utils.date_utils import IMESSAGE_SINCE_SQL, imessage_since_params
+
+logger = logging.getLogger(__name__)
+
+# FTS5 query selecting candidates for every pattern in PAYMENT_MESSAGE_FILTER.
+# The trigram tokenizer matches substrings case-insensitively like LIKE does;
+# candidates are re-checked with the LIKE filter itself for exact semantics.
+PAYMENT_MATCH_QUERY = (
+    '"Payment of AED" OR "Your local transfer of AED" OR '
+    '("AED" AND "sent by") OR ("AED" AND "from" AND "has been refunded")'
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    rowid INTEGER PRIMARY KEY,
+    date INTEGER,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(date);
+CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+    text, content='messages', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class MessageSearchIndex:
+    """Sidecar SQLite database with a full-text index over iMessage messages
+
+    Message ROWID, date and text are mirrored from chat.db into a local
+    database with an FTS5 trigram index, so payment messages can be found
+    without scanning every message body. chat.db is only ever opened
+    read-only; the mirror is extended incrementally by ROWID. SQLite errors
+    are raised as MessageDatabaseError subclasses.
+    """
+
+    def __init__(self, index_path: str, source: Union[str, MessageDatabase]):
+        """Initialize search index
+
+        Args:
+            index_path: Path to the sidecar index database
+            source: iMessage database that is mirrored, or the path to it
+        """
+        self.index_path = index_path
+        self.source = source if isinstance(source, MessageDatabase) else MessageDatabase(source)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the sidecar database, creating the schema if needed"""
+        conn = sqlite3.connect(self.index_path)
+        conn.executescript(SCHEMA)
+        return conn
+
+    @staticmethod
+    def _get_state(conn: sqlite3.Connection, key: str) -> Optional[str]:
+        """Read a value from the index state table"""
+        row = conn.execute("SELECT value FROM index_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _set_state(conn: sqlite3.Connection, key: str, value: str):
+        """Write a value to the index state table"""
+        conn.execute(
+            "INSERT OR REPLACE INTO index_state (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def sync(self) -> int:
+        """Mirror messages added to chat.db since the last sync into the index
+
+        The index is rebuilt from scratch when it was built from a different
+        database.
+
+        Returns:
+            Number of messages added to the index
+
+        Raises:
+            MessageDatabaseError: If chat.db or the index can't be read or written
+        """
+        identity = self.source.get_identity()
+
+        try:
+            conn = self._connect()
+            try:
+                if self._get_state(conn, "source_identity") != identity:
+                    conn.execute("DELETE FROM messages")
+                    conn.execute("INSERT INTO messages_fts(messages_fts) VALUES ('delete-all')")
+                    self._set_state(conn, "source_identity", identity)
+                    self._set_state(conn, "last_rowid", "0")
+
+                last_rowid = int(self._get_state(conn, "last_rowid") or 0)
+
+                # Attach chat.db read-only so the copy runs entirely inside SQLite
+                conn.execute("ATTACH DATABASE ? AS source", (self.source.uri,))
+                try:
+                    (max_rowid,) = conn.execute("SELECT MAX(ROWID) FROM source.message").fetchone()
+                    max_rowid = max_rowid or 0
+
+                    cursor = conn.execute(
+                        """
+                        INSERT INTO messages (rowid, date, text)
+                        SELECT ROWID, date, text FROM source.message
+                        WHERE ROWID > ? AND ROWID <= ? AND text IS NOT NULL
+                        """,
+                        (last_rowid, max_rowid),
+                    )
+                    added = cursor.rowcount
+                    conn.execute(
+                        """
+                        INSERT INTO messages_fts (rowid, text)
+                        SELECT rowid, text FROM messages WHERE rowid > ? AND rowid <= ?
+                        """,
+                        (last_rowid, max_rowid),
+                    )
+                    self._set_state(conn, "last_rowid", str(max(last_rowid, max_rowid)))
+                    conn.commit()
+                finally:
+                    conn.execute("DETACH DATABASE source")
+            finally:
+                conn.close()
+
+            return added
+
+        except sqlite3.Error as e:
+            raise translate_error(e, self.index_path) from e
+
+    def get_identity(self) -> str:
+        """Get the identity of the mirrored message database"""
+        return self.source.get_identity()
+
+    def get_max_rowid(self) -> int:
+        """Get the highest message ROWID mirrored by the last sync
+
+        Returns:
+            Highest synced ROWID, or 0 for an empty index
+
+        Raises:
+            MessageDatabaseError: If the index can't be read
+        """
+        try:
+            conn = self._connect()
+            try:
+                return int(self._get_state(conn, "last_rowid") or 0)
+            finally:
+                conn.close()
+
+        except sqlite3.Error as e:
+            raise translate_error(e, self.index_path) from e
+
+    def fetch_payment_messages(
+        self,
+        days: Optional[int] = None,
+        since_rowid: Optional[int] = None,
+        until_rowid: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Fetch payment messages from the index
+
+        Args:
+            days: Optional number of days to limit the search
+            since_rowid: Only return messages with a ROWID greater than this
+            until_rowid: Only return messages with a ROWID up to and including this
+
+        Returns:
+            List of dictionaries with message ROWID, text and date
+        """
+        return list(
+            self.iter_payment_messages(days=days, since_rowid=since_rowid, until_rowid=until_rowid)
+        )
+
+    def iter_payment_messages(
+        self,
+        days: Optional[int] = None,
+        since_rowid: Optional[int] = None,
+        until_rowid: Optional[int] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[Dict[str, Any]]:
+        """Stream payment messages from the index in batches
+
+        Takes the same arguments and yields the same rows as
+        MessageDatabase.iter_payment_messages, as of the last sync.
+
+        Args:
+            days: Optional number of days to limit the search
+            since_rowid: Only return messages with a ROWID greater than this
+            until_rowid: Only return messages with a ROWID up to and including this
+            batch_size: Number of rows fetched from the cursor at a time
+
+        Yields:
+            Dictionaries with message ROWID, text and date, newest first
+
+        Raises:
+            MessageDatabaseError: If the index can't be read, also midway
+        """
+        query = f"""
+        SELECT rowid, text, date FROM messages
+        WHERE rowid IN (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ?)
+        AND {PAYMENT_MESSAGE_FILTER}
+        """
+
+        params: List[Any] = [PAYMENT_MATCH_QUERY]
+
+        if since_rowid is not None:
+            query += " AND rowid > ?"
+            params.append(since_rowid)
+
+        if until_rowid is not None:
+            query += " AND rowid <= ?"
+            params.append(until_rowid)
+
+        if days:
+            query += " AND " + IMESSAGE_SINCE_SQL.format(date="date")
+            params.extend(imessage_since_params(time.time() - days * 86400))
+
+        # Sort by date descending to get newest messages first
+        query += " ORDER BY date DESC"
+
+        try:
+            conn = self._connect()
+        except sqlite3.Error as e:
+            raise translate_error(e, self.index_path) from e
+
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for rowid, text, date in rows:
+                    yield {"rowid": rowid, "text": text, "date": date}
+        except sqlite3.Error as e:
+            raise translate_error(e, self.index_path) from e
+        finally:
+            conn.close()
@@ -1,16 +1,26 @@
-import json
 import logging
 import os
+import signal
 import sys
-
-from src.db.data_source import MessageDatabase
+from datetime import datetime
+from itertools import chain, islice
+
+from src.db.data_source import MessageDatabase, MessageDatabaseError
+from src.db.expense_store import SQLiteExpenseStore, open_expense_store
+from src.db.merchant_dictionary import MerchantDictionary
+from src.db.parse_cache import ParseCache
+from src.db.search_index import MessageSearchIndex
 from src.models.expense import Expense
-from src.services.analytics import ExpenseAnalyzer
 from src.services.categorizer import ExpenseCategorizer
-from src.services.parser import convert_imessage_date, extract_payment_details
+from src.services.merchants import canonicalize_stored_merchants
+from src.services.pipeline import ProcessingStats, iter_expenses, iter_expenses_parallel
+from src.services.recategorize import change_keyword
+from src.services.watcher import DatabaseWatcher
 from src.ui.cli import ExpenseTrackerCLI
-from src.ui.visualization import ExpenseVisualizer
-from src.utils.config import Config, ExpenseStore
+from src.utils import profiling
+from src.utils.config import Config, IngestState
+from src.utils.date_utils import day_key, month_key
+from src.utils.report import write_report
 
 # Configure logging
 logging.basicConfig(
@@ -18,67 +28,277 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Number of transactions shown in the report's recent transactions table
+RECENT_TRANSACTIONS = 15
+
 
-def process_messages(messages, categorizer):
+def process_messages(
+    messages, categorizer, workers=1, parse_cache=None, quiet=False, merchants=None
+):
     """Process messages into expense objects"""
-    expenses = []
-    successful_count = 0
-    unknown_merchants = 0
-
-    for message in messages:
-        # Extract payment details
-        details = extract_payment_details(message["text"])
-
-        # Skip messages with no amount (like promotional messages)
-        if details["amount"] == 0:
-            continue
-
-        # Keep track of unknown merchants
-        if details["merchant"] == "Unknown":
-            unknown_merchants += 1
-            # Optionally print problematic messages for debugging
-            # print(f"Could not extract merchant from: {message['text']}")
-        else:
-            successful_count += 1
-
-        # Convert date if available
-        date = None
-        if "date" in message and message["date"]:
-            date = convert_imessage_date(message["date"])
-
-        # Categorize the expense
-        category = categorizer.categorize(details["merchant"])
-
-        # Create expense object
-        expense = Expense(
-            amount=details["amount"],
-            merchant=details["merchant"],
-            category=category,
-            date=date,
-            message=details["message"],
+    stats = ProcessingStats()
+    if workers > 1:
+        expenses = list(
+            iter_expenses_parallel(
+                messages,
+                categorizer,
+                workers,
+                stats,
+                parse_cache=parse_cache,
+                merchants=merchants,
+            )
         )
+    else:
+        expenses = list(iter_expenses(messages, categorizer, stats, parse_cache, merchants))
+
+    if not quiet:
+        stats.print_summary()
+    logger.debug(f"Categorizer cache: {categorizer.cache_info()}")
+
+    return expenses
 
-        # Add is_income flag if message represents income
-        if "is_income" in details:
-            setattr(expense, "is_income", details["is_income"])
 
-        expenses.append(expense)
+def ingest_new_messages(
+    db,
+    categorizer,
+    expense_store,
+    ingest_state,
+    days=None,
+    workers=1,
+    parse_cache=None,
+    quiet=False,
+    merchants=None,
+):
+    """Fetch, process and store only messages received since the last run
+
+    Args:
+        db: Message database to read from
+        categorizer: Categorizer for new expenses
+        expense_store: Store the new expenses are appended to
+        ingest_state: Persisted ROWID watermark
+        days: Day limit for the first run, when no watermark exists yet
+        workers: Number of processes used to parse and categorize messages
+        parse_cache: Optional persistent cache of parse results
+        quiet: Whether to skip printing the processing summary
+        merchants: Optional merchant dictionary canonicalizing merchant names
+
+    Returns:
+        List of newly stored expenses, with their ids
+
+    Raises:
+        MessageDatabaseError: If the database can't be read; the watermark
+            is left unchanged, so the next run fetches the same messages
+    """
+    db_identity = db.get_identity()
+    max_rowid = db.get_max_rowid()
+
+    since_rowid = ingest_state.get_watermark(db_identity)
+    if since_rowid is not None and since_rowid > max_rowid:
+        # ROWIDs went backwards, so this can't be the database we saw before
+        since_rowid = None
+
+    with profiling.stage("fetch") as stage:
+        if since_rowid is None:
+            print("No ingest watermark for this database, importing without duplicates...")
+            messages = db.fetch_payment_messages(days=days, until_rowid=max_rowid)
+        else:
+            messages = db.fetch_payment_messages(since_rowid=since_rowid, until_rowid=max_rowid)
+        stage.rows_out = len(messages)
+
+    with profiling.stage("process", rows_in=len(messages)) as stage:
+        expenses = (
+            process_messages(messages, categorizer, workers, parse_cache, quiet, merchants)
+            if messages
+            else []
+        )
+        stage.rows_out = len(expenses)
+
+    with profiling.stage("store", rows_in=len(expenses)):
+        last_id = expense_store.get_last_id()
+        if since_rowid is None:
+            # The window may overlap expenses stored by earlier runs, and the
+            # history before it must be kept
+            expense_store.merge_expenses([exp.to_dict() for exp in expenses])
+        else:
+            expense_store.append_expenses([exp.to_dict() for exp in expenses])
+        # Read back what was stored, for the ids assigned by the store
+        expenses = [
+            Expense.from_dict(expense) for expense in expense_store.iter_expenses(after_id=last_id)
+        ]
 
-    print(f"Processed {len(expenses)} payment messages")
-    print(f"Successfully extracted merchants: {successful_count}")
-    print(f"Unknown merchants: {unknown_merchants}")
+    # Advance past every row we have seen, not just the payment messages
+    ingest_state.save_watermark(db_identity, max_rowid)
 
     return expenses
 
 
+def watch(
+    db,
+    db_path,
+    categorizer,
+    expense_store,
+    ingest_state,
+    cli,
+    args,
+    parse_cache=None,
+    top_capacity=None,
+    merchants=None,
+):
+    """Ingest new messages as they arrive until interrupted
+
+    The categorizer, expense store and session totals stay in memory between
+    updates; each update only reads ROWIDs past the stored watermark.
+
+    Args:
+        db: Message database or search index to read from
+        db_path: Path to chat.db, watched for changes
+        categorizer: Categorizer for new expenses
+        expense_store: Store the new expenses are appended to
+        ingest_state: Persisted ROWID watermark
+        cli: CLI used for the session report on exit
+        args: Parsed command line arguments
+        parse_cache: Optional persistent cache of parse results
+        top_capacity: Distinct merchants tracked exactly for the session report
+        merchants: Optional merchant dictionary canonicalizing merchant names
+    """
+    from src.services.analytics import ExpenseAggregator
+
+    aggregator = ExpenseAggregator(args.top, args.top_income, top_capacity)
+    recent = []
+
+    def update():
+        if isinstance(db, MessageSearchIndex):
+            db.sync()
+
+        expenses = ingest_new_messages(
+            db,
+            categorizer,
+            expense_store,
+            ingest_state,
+            days=args.days,
+            parse_cache=parse_cache,
+            quiet=True,
+            merchants=merchants,
+        )
+
+        # Messages come newest first; print them in arrival order
+        for expense in reversed(expenses):
+            aggregator.add(expense)
+            sign = "+" if expense.is_income else "-"
+            date = expense.date.strftime("%Y-%m-%d %H:%M") if expense.date else "Unknown"
+            print(
+                f"{date}  {sign}AED {expense.amount:.2f}  {expense.merchant} ({expense.category})"
+            )
+        recent[:0] = expenses[:RECENT_TRANSACTIONS]
+        del recent[RECENT_TRANSACTIONS:]
+
+    # Start watching before catching up, so writes made meanwhile are not missed
+    watcher = DatabaseWatcher(db_path, update, max_interval=args.poll_interval)
+    update()
+
+    print(
+        f"Watching {db_path} for new messages since {datetime.now():%H:%M:%S}. "
+        "Press Ctrl+C to stop."
+    )
+    # Let `kill` end the session like Ctrl+C, with the report
+    previous_handler = signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+
+    print("\nStopped watching.")
+    if recent:
+        cli.display_report(recent, aggregator.result())
+
+
+def analyze_date_range(expense_store, args):
+    """Analyze the stored expenses of the --from/--to range from the daily rollups
+
+    The daily buckets of the range (and of the period it is compared with)
+    are indexed once; the report, comparison and weekly or monthly view are
+    then all sums of pre-aggregated totals.
+
+    Args:
+        expense_store: SQLite store with the daily rollup table
+        args: Parsed command line arguments
+
+    Returns:
+        Tuple of (first day, last day, analytics), or None if the range holds no expenses
+    """
+    # numpy is only imported by the commands that analyze expenses
+    from src.services.rollups import DailyRollups, previous_period
+    from src.services.sketches import distributions
+
+    # Load only the days the report needs; the compared period is only
+    # known up front if both ends of the range are given
+    load_first = args.date_from
+    if args.compare:
+        load_first = None
+        if args.date_from and args.date_to:
+            load_first = previous_period(args.date_from, args.date_to, args.compare)[0]
+
+    with profiling.stage("load_rollups") as stage:
+        buckets = expense_store.load_daily_rollups(day_key(load_first), day_key(args.date_to))
+        stage.rows_out = len(buckets)
+        rollups = DailyRollups(buckets)
+
+    first = args.date_from or rollups.first_date
+    last = args.date_to or rollups.last_date
+    if first is None or last is None or first > last:
+        print("No stored expenses in the requested date range.")
+        return None
+
+    with profiling.stage("analyze", rows_in=len(buckets)):
+        analytics = rollups.analytics(first, last, args.top, args.top_income)
+        if "error" in analytics:
+            print(f"No stored expenses between {first} and {last}.")
+            return None
+        if args.compare:
+            analytics["comparison"] = rollups.compare(first, last, args.compare)
+        if args.view:
+            analytics["period_view"] = {
+                "period": args.view,
+                "totals": rollups.view(first, last, args.view),
+            }
+
+        # Amount sketches are kept per month, so they cover the whole months of the range
+        sketches = expense_store.load_amount_sketches(month_key(first), month_key(last))
+        analytics["distributions"] = distributions(
+            (
+                (category, merchant, bucket, count, total)
+                for _, category, merchant, bucket, total, count in sketches
+            ),
+            analytics["top_merchants"],
+        )
+        analytics["distributions"]["months"] = {
+            "from": f"{first:%Y-%m}",
+            "to": f"{last:%Y-%m}",
+        }
+
+    return first, last, analytics
+
+
 def main():
     """Main entry point for the expense tracker CLI"""
+    profiler = None
     try:
         # Initialize components
         config = Config()
         cli = ExpenseTrackerCLI()
         args = cli.parse_args()
 
+        # Record per-stage timings if requested
+        if args.timings or args.profile:
+            profiler = profiling.Profiler(
+                trace_memory=args.trace_memory,
+                profile_stage=args.profile,
+                profile_file=args.profile_file,
+            )
+            profiler.start()
+
         # Initialize data source
         db_path = config.get("db_path")
         if not db_path:
@@ -91,82 +311,310 @@ def main():
             print(f"Error: Database file not found at {db_path}")
             return 1
 
-        db = MessageDatabase(db_path)
+        db = MessageDatabase(
+            db_path,
+            immutable=config.get("db_immutable"),
+            mmap_size=config.get("db_mmap_size"),
+            cache_size=config.get("db_cache_size"),
+            temp_store=config.get("db_temp_store"),
+        )
 
         # Get categories file path
         categories_file = args.categories or config.get("categories_file")
 
         # Initialize services
-        categorizer = ExpenseCategorizer(categories_file)
-        analyzer = ExpenseAnalyzer()
-        visualizer = ExpenseVisualizer()
-        expense_store = ExpenseStore(config.get("data_file"))
+        with profiling.stage("load_categories"):
+            categorizer = ExpenseCategorizer(categories_file)
+        with profiling.stage("open_store"):
+            expense_store = open_expense_store(config.get("data_file"))
+        parse_cache = None if args.no_parse_cache else ParseCache(config.get("parse_cache_file"))
+        merchants = MerchantDictionary(config.get("merchants_file"))
 
         # Display categories if requested
         if args.show_categories:
             cli.display_categories(categorizer.categories)
             return 0
 
-        # Add keyword to category if requested
-        if args.add_keyword:
-            category, keyword = args.add_keyword
-            categorizer.add_keyword(category, keyword)
-            categorizer.save_categories(categories_file)
-            print(f"Added keyword '{keyword}' to category '{category}'")
+        # Add or remove a category keyword and recategorize the affected
+        # stored expenses if requested
+        if args.add_keyword or args.remove_keyword:
+            remove = bool(args.remove_keyword)
+            category, keyword = args.remove_keyword or args.add_keyword
+            with profiling.stage("recategorize") as stage:
+                try:
+                    result = change_keyword(
+                        expense_store, categorizer, category, keyword, remove, categories_file
+                    )
+                except OSError as e:
+                    print(f"Error: {e}; stored expenses were not changed")
+                    return 1
+                if result:
+                    stage.rows_in = result.merchants_checked
+                    stage.rows_out = result.expenses_updated
+
+            if result is None:
+                if category not in categorizer.categories:
+                    print(f"Error: Unknown category '{category}'")
+                    return 1
+                state = "not in" if remove else "already in"
+                print(f"Keyword '{keyword}' is {state} category '{category}'")
+                return 0
+
+            action = "Removed keyword '{}' from" if remove else "Added keyword '{}' to"
+            print(f"{action.format(keyword)} category '{category}'")
+            result.print_summary()
             return 0
 
         # Handle category update if requested
-        if args.category and args.index is not None:
-            result = expense_store.update_expense_category(args.index, args.category)
+        if args.category and args.expense_id is not None:
+            result = expense_store.update_expense_category(args.expense_id, args.category)
             if result:
-                print(f"Updated expense {args.index} category to {args.category}")
+                print(f"Updated expense {args.expense_id} category to {args.category}")
             else:
-                print(f"Failed to update expense {args.index}")
+                print(f"Failed to update expense {args.expense_id}")
             return 0
 
-        # Fetch data
-        print("Fetching expenses from iMessage database...")
-        messages = db.fetch_payment_messages(days=args.days)
+        # Check the materialized totals against a full recompute if requested
+        if args.verify_rollups:
+            if not isinstance(expense_store, SQLiteExpenseStore):
+                print("Error: Rollups are only available for SQLite expense stores")
+                return 1
+            mismatches = expense_store.verify_rollups()
+            for mismatch in mismatches:
+                print(f"Rollup mismatch: {mismatch}")
+            if mismatches:
+                print(f"Found {len(mismatches)} inconsistent rollup buckets")
+                return 1
+            print("Rollups are consistent with stored expenses")
+            return 0
 
-        if not messages:
-            print("No payment messages found.")
+        # Rename the stored merchants to their canonical names if requested
+        if args.canonicalize_merchants:
+            if not isinstance(expense_store, SQLiteExpenseStore):
+                print("Error: Merchant renaming is only available for SQLite expense stores")
+                return 1
+            with profiling.stage("canonicalize_merchants") as stage:
+                stage.rows_out = canonicalize_stored_merchants(expense_store, merchants)
+            print(f"Renamed the merchant of {stage.rows_out} stored expenses")
             return 0
 
-        # Process messages
-        print(f"Processing {len(messages)} messages...")
-        expenses = process_messages(messages, categorizer)
+        date_range = bool(args.date_from or args.date_to or args.compare or args.view)
+        if date_range and not isinstance(expense_store, SQLiteExpenseStore):
+            print("Error: Date range reports are only available for SQLite expense stores")
+            return 1
+        if args.date_from and args.date_to and args.date_from > args.date_to:
+            print("Error: --from is after --to")
+            return 1
 
-        if not expenses:
-            print("No valid expense data found in messages.")
+        # Answer payment lookups from the full-text sidecar index if configured
+        index_file = args.index_file or config.get("index_file")
+        if index_file:
+            print("Updating message search index...")
+            db = MessageSearchIndex(index_file, db)
+            with profiling.stage("sync_index") as stage:
+                indexed = db.sync()
+                stage.rows_out = indexed
+            print(f"Indexed {indexed} new messages")
+
+        if args.watch:
+            ingest_state = IngestState(config.get("state_file"))
+            watch(
+                db,
+                db_path,
+                categorizer,
+                expense_store,
+                ingest_state,
+                cli,
+                args,
+                parse_cache=parse_cache,
+                top_capacity=config.get("top_capacity"),
+                merchants=merchants,
+            )
             return 0
 
-        # Save expenses
-        expense_dicts = [exp.to_dict() for exp in expenses]
-        expense_store.save_expenses(expense_dicts)
+        if date_range:
+            if args.incremental:
+                # Bring the store up to date before reporting on it
+                print("Fetching new expenses from iMessage database...")
+                ingest_state = IngestState(config.get("state_file"))
+                ingest_new_messages(
+                    db,
+                    categorizer,
+                    expense_store,
+                    ingest_state,
+                    days=args.days,
+                    workers=args.workers,
+                    parse_cache=parse_cache,
+                    merchants=merchants,
+                )
+
+            print("Analyzing stored expenses...")
+            result = analyze_date_range(expense_store, args)
+            if result is None:
+                return 0
+            first, last, analytics = result
+
+            # Only the first transactions of the range are listed
+            expenses = [
+                Expense.from_dict(expense)
+                for expense in islice(
+                    expense_store.iter_expenses(first_day=first, last_day=last),
+                    RECENT_TRANSACTIONS,
+                )
+            ]
+        elif args.incremental:
+            # Only ingest messages received since the last incremental run
+            print("Fetching new expenses from iMessage database...")
+            ingest_state = IngestState(config.get("state_file"))
+            expenses = ingest_new_messages(
+                db,
+                categorizer,
+                expense_store,
+                ingest_state,
+                days=args.days,
+                workers=args.workers,
+                parse_cache=parse_cache,
+                merchants=merchants,
+            )
+
+            if not expenses:
+                print("No new payment messages found.")
+                return 0
 
-        # Analyze expenses
-        print("Analyzing expenses...")
-        analytics = analyzer.analyze(expenses)
+            # pandas is only imported by the commands that analyze expenses
+            from src.services.analytics import ExpenseAnalyzer
+
+            analyzer = ExpenseAnalyzer(args.top, args.top_income, config.get("top_capacity"))
+
+            if isinstance(expense_store, SQLiteExpenseStore):
+                # Report on the whole stored history from the materialized totals
+                print("Analyzing stored expenses...")
+                with profiling.stage("analyze"):
+                    analytics = analyzer.analyze_rollups(
+                        expense_store.load_rollups(), expense_store.load_amount_sketches()
+                    )
+            else:
+                print("Analyzing expenses...")
+                with profiling.stage("analyze", rows_in=len(expenses)):
+                    analytics = analyzer.analyze(expenses)
+        else:
+            # Stream messages through parsing, categorization, storage and
+            # aggregation without holding the full history in memory
+            print("Fetching and processing expenses from iMessage database...")
+            messages = profiling.iter_stage("fetch", db.iter_payment_messages(days=args.days))
+            stats = ProcessingStats()
+            if args.workers > 1:
+                expense_stream = iter_expenses_parallel(
+                    messages,
+                    categorizer,
+                    args.workers,
+                    stats,
+                    parse_cache=parse_cache,
+                    merchants=merchants,
+                )
+            else:
+                expense_stream = iter_expenses(
+                    messages, categorizer, stats, parse_cache, merchants
+                )
+
+            first_expense = next(expense_stream, None)
+            if first_expense is None:
+                if stats.messages:
+                    print("No valid expense data found in messages.")
+                else:
+                    print("No payment messages found.")
+                return 0
+
+            from src.services.analytics import ExpenseAggregator
+
+            aggregator = ExpenseAggregator(args.top, args.top_income, config.get("top_capacity"))
+
+            def aggregate(stream):
+                for expense in stream:
+                    aggregator.add(expense)
+                    yield expense.to_dict()
+
+            # Self time of "store" is the writing alone; fetching, parsing,
+            # categorizing and aggregating are reported as their own stages.
+            # Expenses stored by earlier runs, including those outside the
+            # --days window, keep their ids and manual category changes.
+            with profiling.stage("store"):
+                last_id = expense_store.get_last_id()
+                expense_store.merge_expenses(
+                    profiling.iter_stage(
+                        "aggregate", aggregate(chain([first_expense], expense_stream))
+                    )
+                )
+            stats.print_summary()
+
+            # Only the first newly stored transactions are shown, with their ids
+            expenses = [
+                Expense.from_dict(expense)
+                for expense in islice(
+                    expense_store.iter_expenses(after_id=last_id), RECENT_TRANSACTIONS
+                )
+            ]
+
+            print("Analyzing expenses...")
+            with profiling.stage("analyze", rows_in=stats.expenses):
+                analytics = aggregator.result()
 
         # Display report
-        cli.display_report(expenses, analytics)
+        with profiling.stage("report"):
+            cli.display_report(expenses, analytics)
+            if args.distributions and "distributions" in analytics:
+                cli.display_distributions(analytics["distributions"])
+            if "comparison" in analytics:
+                cli.display_comparison(analytics["comparison"])
+            if "period_view" in analytics:
+                cli.display_period_view(
+                    analytics["period_view"]["totals"], analytics["period_view"]["period"]
+                )
 
         # Generate charts if requested
-        if args.plot:
+        if args.plot or args.plot_dir:
+            # matplotlib is only imported when charts are requested
+            from src.ui.visualization import ExpenseVisualizer
+
             print("Generating charts...")
-            visualizer.generate_charts(analytics)
+            with profiling.stage("plot"):
+                if args.plot_dir:
+                    ExpenseVisualizer().render_charts(analytics, args.plot_dir, args.plot_format)
+                else:
+                    ExpenseVisualizer().generate_charts(analytics)
 
         # Save report if requested
         if args.output:
-            with open(args.output, "w") as f:
-                json.dump({"analytics": analytics, "expenses": expense_dicts}, f, indent=2)
+            with profiling.stage("output") as stage:
+                if date_range:
+                    expense_dicts = expense_store.iter_expenses(first_day=first, last_day=last)
+                elif args.incremental:
+                    expense_dicts = (exp.to_dict() for exp in expenses)
+                else:
+                    expense_dicts = expense_store.iter_expenses()
+                stage.rows_out = write_report(args.output, analytics, expense_dicts)
             print(f"Report saved to {args.output}")
 
+    except MessageDatabaseError as e:
+        # Nothing was stored and no watermark advanced
+        print(f"Error: Could not read the message database: {e}")
+        return 1
+
     except Exception as e:
         logger.error(f"Error in main: {e}", exc_info=True)
         print(f"An error occurred: {e}")
         return 1
 
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            if args.timings == "json":
+                print(profiler.to_json())
+            elif args.timings:
+                print(profiler.format_table())
+            if args.profile:
+                print(f"Profile of stage '{args.profile}' saved to {profiler.profile_file}")
+
     return 0
 
 
@@ -1,9 +1,14 @@
+import sys
+from array import array
 from dataclasses import dataclass, field
-from datetime import datetime
-from typing import Any, Dict, Optional
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+# Slotted dataclasses (no per-instance __dict__) need Python 3.10+
+_DATACLASS_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
 
-@dataclass
+
+@dataclass(**_DATACLASS_OPTIONS)
 class Expense:
     """Representation of an expense or income transaction"""
 
@@ -13,6 +18,8 @@ class Expense:
     date: Optional[datetime] = None
     message: str = ""
     is_income: bool = field(default=False, compare=False)
+    # Assigned by the expense store; not part of to_dict
+    id: Optional[int] = field(default=None, compare=False)
 
     def to_dict(self) -> Dict[str, Any]:
         """Convert expense to dictionary"""
@@ -38,6 +45,7 @@ class Expense:
             category=data["category"],
             message=data.get("message", ""),
             is_income=data.get("is_income", False),
+            id=data.get("id"),
         )
 
         if "date" in data and data["date"]:
@@ -47,3 +55,182 @@ class Expense:
                 pass
 
         return expense
+
+
+class ExpenseBatch:
+    """Compact, column-oriented collection of expenses
+
+    Amounts, dates and interned merchant/category ids live in typed arrays and
+    the income flags in a bitmask, so millions of expenses take a few dozen
+    bytes each instead of one object per row. Message texts are kept in an
+    optional side buffer.
+
+    Dates are stored as microseconds since 1970-01-01 of the (naive) wall
+    clock time, which round-trips datetimes exactly.
+    """
+
+    # Date column value for expenses without a date
+    NO_DATE = -(2**63)
+
+    _EPOCH = datetime(1970, 1, 1)
+    _MICROSECOND = timedelta(microseconds=1)
+
+    def __init__(self, keep_messages: bool = True):
+        """Initialize an empty batch
+
+        Args:
+            keep_messages: Whether to keep the raw message texts
+        """
+        self.amounts = array("d")
+        self.dates = array("q")
+        self.merchant_ids = array("I")
+        self.category_ids = array("I")
+        self.income_mask = bytearray()
+        self.messages: Optional[List[str]] = [] if keep_messages else None
+
+        # Interned merchant and category names, indexed by id
+        self.merchants: List[str] = []
+        self.categories: List[str] = []
+        self._merchant_ids: Dict[str, int] = {}
+        self._category_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        """Number of expenses in the batch"""
+        return len(self.amounts)
+
+    @staticmethod
+    def _intern(value: str, names: List[str], ids: Dict[str, int]) -> int:
+        """Get the id of a name, assigning the next free id to new names"""
+        value_id = ids.get(value)
+        if value_id is None:
+            value_id = ids[value] = len(names)
+            names.append(value)
+        return value_id
+
+    def append(self, expense: Expense):
+        """Append an expense to the batch"""
+        index = len(self.amounts)
+        date = expense.date
+
+        self.amounts.append(expense.amount)
+        self.dates.append((date - self._EPOCH) // self._MICROSECOND if date else self.NO_DATE)
+        self.merchant_ids.append(
+            self._intern(expense.merchant, self.merchants, self._merchant_ids)
+        )
+        self.category_ids.append(
+            self._intern(expense.category, self.categories, self._category_ids)
+        )
+
+        if index % 8 == 0:
+            self.income_mask.append(0)
+        if expense.is_income:
+            self.income_mask[index // 8] |= 1 << (index % 8)
+
+        if self.messages is not None:
+            self.messages.append(expense.message)
+
+    def extend(self, expenses: Iterable[Expense]):
+        """Append every expense from an iterable to the batch"""
+        for expense in expenses:
+            self.append(expense)
+
+    def is_income(self, index: int) -> bool:
+        """Get the income flag of the expense at an index"""
+        return bool(self.income_mask[index // 8] >> (index % 8) & 1)
+
+    def date(self, index: int) -> Optional[datetime]:
+        """Get the date of the expense at an index"""
+        value = self.dates[index]
+        if value == self.NO_DATE:
+            return None
+        return self._EPOCH + timedelta(microseconds=value)
+
+    def __getitem__(self, index: int) -> Expense:
+        """Materialize the expense at an index"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("ExpenseBatch index out of range")
+
+        return Expense(
+            amount=self.amounts[index],
+            merchant=self.merchants[self.merchant_ids[index]],
+            category=self.categories[self.category_ids[index]],
+            date=self.date(index),
+            message=self.messages[index] if self.messages is not None else "",
+            is_income=self.is_income(index),
+        )
+
+    def __iter__(self) -> Iterator[Expense]:
+        """Materialize the expenses one at a time"""
+        for index in range(len(self)):
+            yield self[index]
+
+    def iter_rows(self) -> Iterator[Tuple[float, str, str, Optional[str], str, bool]]:
+        """Iterate over expenses as plain tuples, without creating Expense objects
+
+        Yields:
+            (amount, merchant, category, ISO date or None, message, is_income) tuples
+        """
+        merchants = self.merchants
+        categories = self.categories
+        messages = self.messages
+
+        for index in range(len(self)):
+            date = self.date(index)
+            yield (
+                self.amounts[index],
+                merchants[self.merchant_ids[index]],
+                categories[self.category_ids[index]],
+                date.isoformat() if date else None,
+                messages[index] if messages is not None else "",
+                self.is_income(index),
+            )
+
+    def iter_dicts(self) -> Iterator[Dict[str, Any]]:
+        """Iterate over expenses as dictionaries in Expense.to_dict format"""
+        for amount, merchant, category, date, message, is_income in self.iter_rows():
+            result = {
+                "amount": amount,
+                "merchant": merchant,
+                "category": category,
+                "message": message,
+                "is_income": is_income,
+            }
+
+            if date:
+                result["date"] = date
+
+            yield result
+
+    def to_expenses(self) -> List[Expense]:
+        """Convert the batch to a list of Expense objects"""
+        return list(self)
+
+    @classmethod
+    def from_expenses(
+        cls, expenses: Iterable[Expense], keep_messages: bool = True
+    ) -> "ExpenseBatch":
+        """Create a batch from Expense objects
+
+        Args:
+            expenses: Expenses to add
+            keep_messages: Whether to keep the raw message texts
+        """
+        batch = cls(keep_messages=keep_messages)
+        batch.extend(expenses)
+        return batch
+
+    @classmethod
+    def from_dicts(
+        cls, data: Iterable[Dict[str, Any]], keep_messages: bool = True
+    ) -> "ExpenseBatch":
+        """Create a batch from dictionaries in Expense.to_dict format
+
+        Args:
+            data: Expense dictionaries to add
+            keep_messages: Whether to keep the raw message texts
+        """
+        return cls.from_expenses(
+            (Expense.from_dict(item) for item in data), keep_messages=keep_messages
+        )
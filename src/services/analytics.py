@@ -1,83 +1,368 @@
-from typing import Any, Dict, List
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
-from src.models.expense import Expense
+from src.models.expense import Expense, ExpenseBatch
+from src.services.sketches import AmountSketch, amount_buckets, distributions
+from src.services.topk import TopK
+from src.utils.date_utils import month_key, month_keys
 
 
 class ExpenseAnalyzer:
     """Analyzes expense data and generates reports"""
 
-    def analyze(self, expenses: List[Expense]) -> Dict[str, Any]:
+    def __init__(
+        self,
+        top_merchants: int = 5,
+        top_income_sources: int = 3,
+        top_capacity: Optional[int] = None,
+    ):
+        """Initialize analyzer
+
+        Args:
+            top_merchants: Number of merchants to list by spending
+            top_income_sources: Number of income sources to list
+            top_capacity: Distinct merchants tracked exactly per direction
+                (default: topk.DEFAULT_CAPACITY)
+        """
+        self.top_merchants = top_merchants
+        self.top_income_sources = top_income_sources
+        self.top_capacity = top_capacity
+
+    def analyze(self, expenses: Union[List[Expense], ExpenseBatch]) -> Dict[str, Any]:
         """Generate analytics for a list of expenses
 
         Args:
-            expenses: List of Expense objects
+            expenses: List of Expense objects or an ExpenseBatch
 
         Returns:
-            Dictionary containing analysis results
+            Dictionary containing analysis results, with the same sections as
+            ExpenseAggregator.result
         """
-        if not expenses:
+        if not len(expenses):
             return {"error": "No expenses found"}
 
-        # Convert to DataFrame for easier analysis
-        df = pd.DataFrame([exp.to_dict() for exp in expenses])
+        if isinstance(expenses, ExpenseBatch):
+            return self._summarize(*self._group_batch(expenses))
 
-        # Total amount - separate incoming and outgoing
-        outgoing = (
-            df[~df.get("is_income", False)]["amount"].sum()
-            if "is_income" in df
-            else df["amount"].sum()
+        # Build only the columns the report needs, leaving out message texts.
+        # Months are integer keys (YYYYMM), 0 for expenses without a date.
+        df = pd.DataFrame(
+            {
+                "amount": np.fromiter((exp.amount for exp in expenses), float, len(expenses)),
+                "is_income": np.fromiter(
+                    (exp.is_income for exp in expenses), bool, len(expenses)
+                ),
+                "category": [exp.category for exp in expenses],
+                "merchant": [exp.merchant for exp in expenses],
+                "month": np.fromiter(
+                    (month_key(exp.date) for exp in expenses), np.int64, len(expenses)
+                ),
+            }
         )
-        incoming = df[df.get("is_income", True)]["amount"].sum() if "is_income" in df else 0
 
-        # Net flow (income - expenses)
-        net_flow = incoming - outgoing
+        return self._summarize(self._group(df), self._sketch(df))
 
-        # Category breakdown (ignore income categories for expense breakdown)
-        expense_df = df[~df.get("is_income", False)] if "is_income" in df else df
-        category_totals = expense_df.groupby("category")["amount"].sum().to_dict()
+    def analyze_rollups(
+        self,
+        rollups: Iterable[Tuple[int, str, str, bool, float, int]],
+        sketches: Optional[Iterable[Tuple[int, str, str, int, float, int]]] = None,
+    ) -> Dict[str, Any]:
+        """Generate analytics from pre-aggregated expense totals
 
-        # Top merchants by spending
-        top_merchants = (
-            expense_df.groupby("merchant")["amount"]
-            .sum()
-            .sort_values(ascending=False)
-            .head(5)
-            .to_dict()
+        Costs O(number of buckets) instead of O(number of expenses).
+
+        Args:
+            rollups: (YYYYMM month or 0, category, merchant, is_income, total, count)
+                buckets, e.g. from SQLiteExpenseStore.load_rollups
+            sketches: Optional (YYYYMM month or 0, category, merchant, AmountSketch
+                bucket, total, count) buckets of outgoing transactions, e.g. from
+                SQLiteExpenseStore.load_amount_sketches, to report distributions
+
+        Returns:
+            Dictionary containing analysis results
+        """
+        grouped = pd.DataFrame(
+            list(rollups),
+            columns=["month", "category", "merchant", "is_income", "amount", "count"],
         )
+        if grouped.empty:
+            return {"error": "No expenses found"}
 
-        # Top income sources
-        top_income_sources = {}
-        if "is_income" in df and df["is_income"].any():
-            income_df = df[df["is_income"]]
-            top_income_sources = (
-                income_df.groupby("merchant")["amount"]
-                .sum()
-                .sort_values(ascending=False)
-                .head(3)
-                .to_dict()
+        if sketches is not None:
+            sketches = pd.DataFrame(
+                list(sketches),
+                columns=["month", "category", "merchant", "amount_bucket", "amount", "count"],
             )
+        return self._summarize(grouped, sketches)
+
+    @staticmethod
+    def _group_batch(batch: ExpenseBatch) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Group an ExpenseBatch directly from its column arrays
+
+        Rows are grouped by interned merchant and category ids; names are only
+        looked up for the resulting groups.
+
+        Returns:
+            Tuple of the grouped totals and the amount sketch buckets
+        """
+        count = len(batch)
 
-        # Monthly breakdown if dates are available
-        monthly_summary = {}
-        if "date" in df.columns and df["date"].notna().any():
-            df["month"] = pd.to_datetime(df["date"]).dt.strftime("%Y-%m")
-            monthly_summary = df.groupby("month")["amount"].sum().to_dict()
+        # Integer YYYYMM months from the microsecond date column, whose
+        # NO_DATE sentinel is NaT's bit pattern; 0 if undated
+        month = month_keys(np.frombuffer(batch.dates, dtype=np.int64).view("datetime64[us]"))
 
-            # Monthly breakdown by category
-            monthly_categories = {}
-            for month in df["month"].unique():
-                month_df = df[df["month"] == month]
-                monthly_categories[month] = month_df.groupby("category")["amount"].sum().to_dict()
+        df = pd.DataFrame(
+            {
+                "amount": np.frombuffer(batch.amounts, dtype=np.float64),
+                "is_income": np.unpackbits(
+                    np.frombuffer(bytes(batch.income_mask), dtype=np.uint8), bitorder="little"
+                )[:count].astype(bool),
+                "category": np.frombuffer(batch.category_ids, dtype=np.uint32),
+                "merchant": np.frombuffer(batch.merchant_ids, dtype=np.uint32),
+                "month": month,
+            }
+        )
+
+        categories = np.array(batch.categories, dtype=object)
+        merchants = np.array(batch.merchants, dtype=object)
+        frames = (ExpenseAnalyzer._group(df), ExpenseAnalyzer._sketch(df))
+        for frame in frames:
+            frame["category"] = categories[frame["category"]]
+            frame["merchant"] = merchants[frame["merchant"]]
+        return frames
+
+    @staticmethod
+    def _group(df: pd.DataFrame) -> pd.DataFrame:
+        """Reduce expense rows to one total per (direction, category, merchant, month)"""
+        return (
+            df.groupby(["is_income", "category", "merchant", "month"], sort=False)["amount"]
+            .sum()
+            .reset_index()
+        )
+
+    @staticmethod
+    def _sketch(df: pd.DataFrame) -> pd.DataFrame:
+        """Reduce outgoing expense rows to AmountSketch buckets per (category, merchant)"""
+        outgoing = df[~df["is_income"].to_numpy(dtype=bool)]
+        return (
+            outgoing.assign(amount_bucket=amount_buckets(outgoing["amount"].to_numpy()))
+            .groupby(["category", "merchant", "amount_bucket"], sort=False)["amount"]
+            .agg(amount="sum", count="size")
+            .reset_index()
+        )
+
+    def _summarize(
+        self, grouped: pd.DataFrame, sketches: Optional[pd.DataFrame] = None
+    ) -> Dict[str, Any]:
+        """Derive every report section from the grouped totals
+
+        Args:
+            grouped: Frame with is_income, category, merchant, month and amount columns
+            sketches: Optional frame of outgoing transactions with category,
+                merchant, amount_bucket, amount and count columns
+
+        Returns:
+            Dictionary containing analysis results
+        """
+        income_mask = grouped["is_income"].to_numpy(dtype=bool)
+        expense_groups = grouped[~income_mask]
+        income_groups = grouped[income_mask]
+
+        # Total amount - separate incoming and outgoing
+        outgoing = float(expense_groups["amount"].sum())
+        incoming = float(income_groups["amount"].sum())
+
+        # Category breakdown (ignore income categories for expense breakdown)
+        category_totals = expense_groups.groupby("category")["amount"].sum().to_dict()
+
+        # Top merchants and income sources, in memory bounded like ExpenseAggregator's
+        merchant_totals = self._top(expense_groups, self.top_merchants)
+        income_totals = self._top(income_groups, self.top_income_sources)
+        top_merchants = merchant_totals.result()
+
+        # Monthly breakdown, overall and by category, for dated expenses
+        dated = grouped[grouped["month"] > 0]
+        monthly_summary = {
+            _month_label(month): amount
+            for month, amount in dated.groupby("month")["amount"].sum().items()
+        }
+        monthly_categories: Dict[str, Dict[str, float]] = {}
+        month_category_totals = dated.groupby(["month", "category"])["amount"].sum()
+        for (month, category), amount in month_category_totals.items():
+            monthly_categories.setdefault(_month_label(month), {})[category] = amount
 
-        return {
+        result = {
             "total_spent": outgoing,
             "total_income": incoming,
-            "net_flow": net_flow,
+            "net_flow": incoming - outgoing,
             "category_totals": category_totals,
             "top_merchants": top_merchants,
-            "top_income_sources": top_income_sources,
+            "top_income_sources": income_totals.result(),
             "monthly_summary": monthly_summary,
-            "monthly_categories": monthly_categories if "date" in df.columns else {},
+            "monthly_categories": monthly_categories,
         }
+
+        # Transaction size distributions of every category and top merchant
+        if sketches is not None:
+            merged = (
+                sketches.groupby(["category", "merchant", "amount_bucket"], sort=False)[
+                    ["count", "amount"]
+                ]
+                .sum()
+                .reset_index()
+            )
+            # Merchant distributions only while the merchant totals are exact
+            result["distributions"] = distributions(
+                merged.itertuples(index=False, name=None),
+                top_merchants if merchant_totals.exact else (),
+            )
+
+        if not merchant_totals.exact:
+            result["top_merchants_error"] = merchant_totals.errors()
+        if not income_totals.exact:
+            result["top_income_sources_error"] = income_totals.errors()
+
+        return result
+
+    def _top(self, groups: pd.DataFrame, k: int) -> TopK:
+        """Add up the merchant totals of grouped rows in a TopK
+
+        Args:
+            groups: Frame with merchant and amount columns, merchants may repeat
+            k: Number of merchants to report
+
+        Returns:
+            TopK holding the merchant totals
+        """
+        totals = TopK(k, self.top_capacity)
+        totals.update(zip(groups["merchant"].tolist(), groups["amount"].tolist()))
+        return totals
+
+
+def _month_label(month: int) -> str:
+    """Format an integer YYYYMM month key as YYYY-MM"""
+    return f"{month // 100:04d}-{month % 100:02d}"
+
+
+class ExpenseAggregator:
+    """Incrementally aggregates expenses into the same report as ExpenseAnalyzer
+
+    Only per-key running totals are kept, so arbitrarily long streams of
+    expenses can be summarized in memory bounded by the number of distinct
+    categories and months. Merchant and income source totals are tracked by
+    TopK, which stays within `top_capacity` keys however many distinct
+    counterparties (e.g. "Transfer to <person>") the stream contains; past
+    that, the reported totals are estimates with error bounds.
+
+    Amount distributions are kept as an AmountSketch per category, and per
+    merchant only while the merchant totals are exact: once TopK starts
+    evicting merchants, merchant distributions are dropped from the report.
+    """
+
+    def __init__(
+        self,
+        top_merchants: int = 5,
+        top_income_sources: int = 3,
+        top_capacity: Optional[int] = None,
+    ):
+        """Initialize empty running totals
+
+        Args:
+            top_merchants: Number of merchants to list by spending
+            top_income_sources: Number of income sources to list
+            top_capacity: Distinct merchants tracked exactly per direction
+                (default: topk.DEFAULT_CAPACITY)
+        """
+        self.count = 0
+        self.total_spent = 0.0
+        self.total_income = 0.0
+        self.category_totals: Dict[str, float] = defaultdict(float)
+        self.merchant_totals = TopK(top_merchants, top_capacity)
+        self.income_totals = TopK(top_income_sources, top_capacity)
+        self.category_sketches: Dict[str, AmountSketch] = defaultdict(AmountSketch)
+        self.merchant_sketches: Optional[Dict[str, AmountSketch]] = defaultdict(AmountSketch)
+        self.monthly_summary: Dict[str, float] = defaultdict(float)
+        self.monthly_categories: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+
+    def add(self, expense: Expense):
+        """Add a single expense to the running totals
+
+        Args:
+            expense: Expense to aggregate
+        """
+        self.count += 1
+        amount = expense.amount
+
+        if expense.is_income:
+            self.total_income += amount
+            self.income_totals.add(expense.merchant, amount)
+        else:
+            self.total_spent += amount
+            self.category_totals[expense.category] += amount
+            self.merchant_totals.add(expense.merchant, amount)
+            self.category_sketches[expense.category].add(amount)
+            if self.merchant_sketches is not None:
+                if self.merchant_totals.exact:
+                    self.merchant_sketches[expense.merchant].add(amount)
+                else:
+                    self.merchant_sketches = None
+
+        if expense.date:
+            month = expense.date.strftime("%Y-%m")
+            self.monthly_summary[month] += amount
+            self.monthly_categories[month][expense.category] += amount
+
+    def add_all(self, expenses: Iterable[Expense]):
+        """Add every expense from an iterable to the running totals"""
+        for expense in expenses:
+            self.add(expense)
+
+    def result(self) -> Dict[str, Any]:
+        """Get the analytics for everything aggregated so far
+
+        Returns:
+            Dictionary containing analysis results. If the merchants outgrew the
+            TopK capacity, "top_merchants_error" and "top_income_sources_error"
+            hold the most each listed total may be overstated by.
+            "distributions" holds the transaction size distribution of every
+            category and, while merchant totals are exact, of the top merchants.
+        """
+        if not self.count:
+            return {"error": "No expenses found"}
+
+        result = {
+            "total_spent": self.total_spent,
+            "total_income": self.total_income,
+            "net_flow": self.total_income - self.total_spent,
+            "category_totals": dict(self.category_totals),
+            "top_merchants": self.merchant_totals.result(),
+            "top_income_sources": self.income_totals.result(),
+            "monthly_summary": dict(self.monthly_summary),
+            "monthly_categories": {
+                month: dict(totals) for month, totals in self.monthly_categories.items()
+            },
+        }
+
+        merchant_sketches = self.merchant_sketches or {}
+        result["distributions"] = {
+            "categories": {
+                category: sketch.summary() for category, sketch in self.category_sketches.items()
+            },
+            "merchants": {
+                merchant: merchant_sketches[merchant].summary()
+                for merchant in result["top_merchants"]
+                if merchant in merchant_sketches
+            },
+        }
+
+        if not self.merchant_totals.exact:
+            result["top_merchants_error"] = self.merchant_totals.errors()
+        if not self.income_totals.exact:
+            result["top_income_sources_error"] = self.income_totals.errors()
+
+        return result
@@ -1,21 +1,155 @@
+import hashlib
 import json
 import os
-import re
-from typing import Dict, List, Tuple
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds all category keywords in a single scan"""
+
+    def __init__(self, categories: Dict[str, List[str]]):
+        """Build the automaton from a category table
+
+        Args:
+            categories: Mapping of category names to lowercase keywords
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Best keyword ending in each state as (-length, table order, category,
+        # keyword), so that the smallest tuple is the longest, earliest keyword
+        self._best: List[Optional[Tuple[int, int, str, str]]] = [None]
+        self._exact: Dict[str, str] = {}
+
+        order = 0
+        for category, keywords in categories.items():
+            for keyword in keywords:
+                # Skip empty keywords
+                if not keyword:
+                    continue
+                self._exact.setdefault(keyword, category)
+                self._insert(keyword, (-len(keyword), order, category, keyword))
+                order += 1
+
+        self._build_failure_links()
+
+    def _insert(self, keyword: str, rank: Tuple[int, int, str, str]):
+        """Add a keyword to the trie, keeping the first occurrence of duplicates"""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(None)
+            state = next_state
+
+        if self._best[state] is None:
+            self._best[state] = rank
+
+    def _build_failure_links(self):
+        """Compute failure links breadth-first and fold suffix matches into each state"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+
+                # A state also matches every keyword that is a suffix of its path
+                suffix_best = self._best[self._fail[next_state]]
+                own_best = self._best[next_state]
+                if suffix_best is not None and (own_best is None or suffix_best < own_best):
+                    self._best[next_state] = suffix_best
+
+                queue.append(next_state)
+
+    def match(self, text: str) -> Optional[str]:
+        """Find the category of the best keyword contained in a text
+
+        An exact match wins; otherwise the longest contained keyword wins, with
+        ties going to the keyword listed first in the category table.
+
+        Args:
+            text: Lowercase text to scan
+
+        Returns:
+            Category name or None if no keyword occurs in the text
+        """
+        exact = self._exact.get(text)
+        if exact is not None:
+            return exact
+
+        best_match = self._scan(text)
+        return best_match[2] if best_match else None
+
+    def match_keyword(self, text: str) -> Optional[Tuple[str, str]]:
+        """Find the best keyword contained in a text, like match()
+
+        Args:
+            text: Lowercase text to scan
+
+        Returns:
+            Tuple of (category, keyword) or None if no keyword occurs in the text
+        """
+        exact = self._exact.get(text)
+        if exact is not None:
+            return exact, text
+
+        best_match = self._scan(text)
+        return (best_match[2], best_match[3]) if best_match else None
+
+    def _scan(self, text: str) -> Optional[Tuple[int, int, str, str]]:
+        """Run the automaton over a text and return the rank of the best keyword found"""
+
+        goto = self._goto
+        fail = self._fail
+        best = self._best
+        best_match = None
+        state = 0
+
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            candidate = best[state]
+            if candidate is not None and (best_match is None or candidate < best_match):
+                best_match = candidate
+
+        return best_match
 
 
 class ExpenseCategorizer:
     """Categorizes expenses based on merchant names"""
 
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, cache_size: int = 4096):
         """Initialize with categories from config file or default categories
 
         Args:
             config_path: Path to categories.json configuration file
+            cache_size: Maximum number of merchants whose category is memoized
         """
         self.categories: Dict[str, List[str]] = {}
         self.config_path = config_path
+        self._matcher: Optional[KeywordMatcher] = None
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_size = cache_size
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        self.load_categories(config_path)
+
+    def load_categories(self, config_path: str = None):
+        """(Re)load categories from a config file, falling back to the defaults
 
+        Args:
+            config_path: Path to categories.json configuration file
+        """
         if config_path and os.path.exists(config_path):
             try:
                 with open(config_path, "r") as f:
@@ -34,6 +168,46 @@ class ExpenseCategorizer:
         for category, keywords in self.categories.items():
             normalized[category] = [kw.lower() for kw in keywords]
         self.categories = normalized
+        self._invalidate()
+
+    def _invalidate(self, keywords: Iterable[str] = None):
+        """Drop the keyword matcher and memoized categories affected by a change
+
+        Args:
+            keywords: New keywords; only merchants containing one of them can change
+                category. Clears the whole cache when omitted.
+        """
+        self._matcher = None
+
+        if keywords is None:
+            self._cache.clear()
+            return
+
+        keywords = [kw for kw in keywords if kw]
+        stale = [
+            merchant
+            for merchant in self._cache
+            if any(kw in merchant.lower() for kw in keywords)
+        ]
+        for merchant in stale:
+            del self._cache[merchant]
+
+    def rules_version(self) -> str:
+        """Fingerprint of the current category table, in table order"""
+        return hashlib.sha256(json.dumps(self.categories).encode()).hexdigest()[:16]
+
+    def cache_info(self) -> Dict[str, Any]:
+        """Get statistics for the merchant category cache
+
+        Returns:
+            Dictionary with hits, misses, current size and maximum size
+        """
+        return {
+            "hits": self._cache_hits,
+            "misses": self._cache_misses,
+            "size": len(self._cache),
+            "maxsize": self._cache_size,
+        }
 
     def _init_default_categories(self):
         """Initialize with default categories if config file not available"""
@@ -74,7 +248,7 @@ class ExpenseCategorizer:
 
         try:
             # Create directory if it doesn't exist
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
 
             with open(save_path, "w") as f:
                 json.dump(self.categories, f, indent=2)
@@ -95,38 +269,45 @@ class ExpenseCategorizer:
         if not merchant or merchant == "Unknown":
             return "other"
 
-        merchant_lower = merchant.lower()
-        best_match = "other"
-        best_match_score = 0
+        category = self._cache.get(merchant)
+        if category is not None:
+            self._cache_hits += 1
+            self._cache.move_to_end(merchant)
+            return category
 
-        # Try different matching strategies, looking for the best match
-        for category, keywords in self.categories.items():
-            for keyword in keywords:
-                # Skip empty keywords
-                if not keyword:
-                    continue
+        self._cache_misses += 1
 
-                # Exact match has highest priority
-                if keyword == merchant_lower:
-                    return category
+        # A single scan finds every keyword hit; exact matches win, then the
+        # longest keyword contained in the merchant name
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(self.categories)
 
-                # Contained as whole word
-                if re.search(r"\b" + re.escape(keyword) + r"\b", merchant_lower):
-                    # Longer keyword = better match
-                    if len(keyword) > best_match_score:
-                        best_match = category
-                        best_match_score = len(keyword)
+        category = self._matcher.match(merchant.lower()) or "other"
 
-                # Simple contains match (less priority than word boundary match)
-                elif keyword in merchant_lower and len(keyword) > best_match_score:
-                    best_match = category
-                    best_match_score = len(keyword)
+        if self._cache_size > 0:
+            self._cache[merchant] = category
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
 
-        # Debug output if needed
-        # if merchant_lower != "unknown" and best_match == "other":
-        #     print(f"Could not categorize merchant: '{merchant_lower}'")
+        return category
 
-        return best_match
+    def explain(self, merchant: str) -> Tuple[str, Optional[str]]:
+        """Categorize a merchant and report the keyword that decided it
+
+        Args:
+            merchant: The merchant name
+
+        Returns:
+            Tuple of (category, keyword); keyword is None for merchants that
+            fall back to "other"
+        """
+        if not merchant or merchant == "Unknown":
+            return "other", None
+
+        if self._matcher is None:
+            self._matcher = KeywordMatcher(self.categories)
+
+        return self._matcher.match_keyword(merchant.lower()) or ("other", None)
 
     def add_keyword(self, category: str, keyword: str) -> None:
         """Add a new keyword to a category
@@ -140,6 +321,26 @@ class ExpenseCategorizer:
             keyword_lower = keyword.lower()
             if keyword_lower not in self.categories[category]:
                 self.categories[category].append(keyword_lower)
+                self._invalidate([keyword_lower])
+
+    def remove_keyword(self, category: str, keyword: str) -> bool:
+        """Remove a keyword from a category
+
+        Args:
+            category: Category name
+            keyword: Keyword to remove
+
+        Returns:
+            Whether the keyword was found and removed
+        """
+        keyword_lower = keyword.lower()
+        if keyword_lower not in self.categories.get(category, []):
+            return False
+
+        self.categories[category].remove(keyword_lower)
+        # Only merchants containing the keyword could have been matched by it
+        self._invalidate([keyword_lower])
+        return True
 
     def add_category(self, category: str, keywords: List[str] = None) -> None:
         """Add a new category with optional keywords
@@ -151,3 +352,4 @@ class ExpenseCategorizer:
         if category not in self.categories:
             # Normalize all keywords to lowercase
             self.categories[category] = [kw.lower() for kw in (keywords or [])]
+            self._invalidate(self.categories[category])
@@ -0,0 +1,116 @@
+import logging
+import re
+from typing import List, Tuple
+
+from src.services.parser import extract_payment_details
+
+logger = logging.getLogger(__name__)
+
+# Bump when canonical_merchant changes, so merchant dictionaries are rebuilt
+MERCHANT_REVISION = 2
+
+# Runs of whitespace and punctuation separating the words of a merchant name.
+# "&", "'" and "+" are part of names like "H&M" or "MARKS & SPENCER".
+_SEPARATORS = re.compile(r"([\s\-_*#.,/\\:;|()\[\]{}\"!?]+)")
+
+# Separators that set a trailing branch number apart ("Carrefour - 2",
+# "Carrefour #2"), unlike the space in "Studio 54" or "Cafe 21"
+_BRANCH_SEPARATOR = re.compile(r"[-#/|]")
+
+_NUMBER = re.compile(r"\d+")
+
+# Abbreviations introducing a branch number, dropped along with it
+_NUMBER_MARKERS = frozenset({"no", "nr", "br", "branch"})
+
+
+def _split_words(raw: str) -> List[Tuple[str, str]]:
+    """Split a merchant name into (separator before, word) pairs"""
+    parts = _SEPARATORS.split(raw)
+    # parts alternates words and separators, starting and ending with a word
+    return [
+        (parts[index - 1] if index else "", parts[index])
+        for index in range(0, len(parts), 2)
+        if parts[index]
+    ]
+
+
+def _drop_store_numbers(words: List[Tuple[str, str]]) -> List[str]:
+    """Remove branch numbers: numbers after a marker word or a branch separator
+
+    A trailing number after a plain space is part of the name ("Studio 54").
+    """
+    kept: List[Tuple[str, str]] = []
+    for separator, word in words:
+        if _NUMBER.fullmatch(word) and len(kept) > 1 and kept[-1][1].casefold() in _NUMBER_MARKERS:
+            kept.pop()
+            continue
+        kept.append((separator, word))
+
+    # A name made of numbers only (e.g. a transfer reference) is kept as is
+    if any(not _NUMBER.fullmatch(word) for _, word in kept):
+        while _NUMBER.fullmatch(kept[-1][1]) and _BRANCH_SEPARATOR.search(kept[-1][0]):
+            kept.pop()
+    return [word for _, word in kept]
+
+
+def canonical_merchant(raw: str) -> str:
+    """Clean up a merchant name as extracted from a message
+
+    Punctuation becomes a single space, surrounding whitespace is dropped
+    and branch numbers ("MOE - 2", "Mall Br. 12", "Lulu #4") are removed;
+    other numbers ("Studio 54") are kept. Case is kept; variants differing
+    only in case share a merchant_key.
+
+    Args:
+        raw: Merchant name, e.g. "Carrefour - MOE - 2"
+
+    Returns:
+        Cleaned name, e.g. "Carrefour MOE"; the raw name if nothing is left
+    """
+    words = _drop_store_numbers(_split_words(raw))
+    return " ".join(words) or raw
+
+
+def merchant_key(raw: str) -> str:
+    """Get the key under which variants of a merchant name are merged
+
+    Args:
+        raw: Merchant name, e.g. "Carrefour - MOE - 2"
+
+    Returns:
+        Case-folded canonical name, e.g. "carrefour moe"
+    """
+    return canonical_merchant(raw).casefold()
+
+
+def canonicalize_stored_merchants(expense_store, merchants) -> int:
+    """Rename the stored merchants to their canonical names
+
+    The raw merchant of each expense is extracted again from its message,
+    so names merged by earlier canonicalization rules are split up again;
+    expenses without a usable message are renamed from their stored merchant.
+    Categories are kept, so categories set by hand survive the rename.
+
+    Args:
+        expense_store: SQLiteExpenseStore holding the expenses
+        merchants: MerchantDictionary assigning the canonical names
+
+    Returns:
+        Number of renamed expenses
+    """
+    updates = []
+    for expense in expense_store.iter_expenses():
+        raw = expense["merchant"]
+        if expense["message"]:
+            extracted = extract_payment_details(expense["message"])["merchant"]
+            if extracted != "Unknown":
+                raw = extracted
+        canonical = merchants.canonicalize(raw)
+        if canonical != expense["merchant"]:
+            updates.append((expense["id"], canonical))
+    merchants.flush()
+
+    updated = expense_store.update_expense_merchants(updates, MERCHANT_REVISION)
+    if updated:
+        logger.info(f"Renamed the merchant of {updated} expenses to its canonical name")
+    return updated
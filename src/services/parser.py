@@ -1,6 +1,153 @@
+import hashlib
+import logging
 import re
+from dataclasses import astuple, dataclass
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+from src.utils.date_utils import convert_imessage_timestamp, convert_imessage_timestamps
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class MessageTemplate:
+    """Precompiled description of one bank notification format"""
+
+    name: str
+    # Literals that must all appear in the message for the template to apply
+    required: Tuple[str, ...]
+    # Pattern with an "amount" group, e.g. "1,000.50"
+    amount_pattern: Pattern
+    # Optional pattern with a "counterparty" group (merchant, sender, recipient)
+    counterparty_pattern: Optional[Pattern] = None
+    # At least one of these literals must appear as well, if any are given
+    any_of: Tuple[str, ...] = ()
+    # Prefix for the merchant name, e.g. "Transfer from "
+    merchant_prefix: str = ""
+    # Merchant name used when no counterparty can be extracted
+    fallback_merchant: str = "Unknown"
+    is_income: bool = False
+
+    def matches(self, message: str) -> bool:
+        """Cheap literal prefilter deciding whether this template handles a message"""
+        for literal in self.required:
+            if literal not in message:
+                return False
+        if not self.any_of:
+            return True
+        for literal in self.any_of:
+            if literal in message:
+                return True
+        return False
+
+    def parse(self, message: str) -> Tuple[float, str, bool]:
+        """Extract amount, merchant and income direction from a matching message
+
+        Args:
+            message: The payment message text
+
+        Returns:
+            Tuple of (amount, merchant, is_income); amount is 0.0 if not found
+        """
+        amount = 0.0
+        is_income = False
+        merchant = self.fallback_merchant
+
+        amount_match = self.amount_pattern.search(message)
+        if amount_match:
+            # Remove commas in numbers like 1,000
+            amount = float(amount_match["amount"].replace(",", ""))
+            is_income = self.is_income
+
+        if self.counterparty_pattern is not None:
+            counterparty_match = self.counterparty_pattern.search(message)
+            if counterparty_match:
+                merchant = self.merchant_prefix + counterparty_match["counterparty"].strip()
+
+        return amount, merchant, is_income
+
+
+# Built-in templates, tried in order; the first one whose prefilter passes
+# handles the message
+_TEMPLATES: List[MessageTemplate] = [
+    MessageTemplate(
+        name="payment",
+        required=("Payment of AED",),
+        amount_pattern=re.compile(r"Payment of AED\s+(?P<amount>\d+\.?\d*)"),
+        counterparty_pattern=re.compile(r"done at (?P<counterparty>.*?)(?= using| with|$)"),
+    ),
+    MessageTemplate(
+        name="incoming_transfer",
+        required=("AED",),
+        any_of=("sent by", "has been credited"),
+        amount_pattern=re.compile(r"AED\s+(?P<amount>[0-9,]+\.?\d*)"),
+        counterparty_pattern=re.compile(r"sent by (?P<counterparty>[^and]+?)(?:and|$)"),
+        merchant_prefix="Transfer from ",
+        fallback_merchant="Incoming Transfer",
+        is_income=True,
+    ),
+    MessageTemplate(
+        name="outgoing_transfer",
+        required=("Your local transfer of AED",),
+        amount_pattern=re.compile(r"transfer of AED\s+(?P<amount>[0-9,]+\.?\d*)"),
+        counterparty_pattern=re.compile(r"to (?P<counterparty>.*?)(?= from|$)"),
+        merchant_prefix="Transfer to ",
+        fallback_merchant="Outgoing Transfer",
+    ),
+    MessageTemplate(
+        name="refund",
+        required=("refunded", "AED"),
+        amount_pattern=re.compile(r"AED\s+(?P<amount>[0-9,]+\.?\d*)"),
+        counterparty_pattern=re.compile(r"from (?P<counterparty>.*?)(?= has| to|$)"),
+        merchant_prefix="Refund from ",
+        fallback_merchant="Refund",
+        is_income=True,
+    ),
+]
+
+
+def register_template(template: MessageTemplate, index: Optional[int] = None) -> None:
+    """Register a message template for a new bank notification format
+
+    Args:
+        template: Template to register
+        index: Position in the dispatch order; appended last if omitted
+    """
+    if index is None:
+        _TEMPLATES.append(template)
+    else:
+        _TEMPLATES.insert(index, template)
+
+
+def get_templates() -> List[MessageTemplate]:
+    """Get the registered message templates in dispatch order"""
+    return list(_TEMPLATES)
+
+
+# Bump when extract_payment_details, MessageTemplate.parse or the date
+# conversion change behaviour in a way the template definitions don't capture
+PARSER_REVISION = 2
+
+
+def get_parser_version() -> str:
+    """Fingerprint of the current parsing rules
+
+    Covers PARSER_REVISION and every field of the registered templates in
+    dispatch order, so it changes whenever a template is added, reordered or
+    edited. Persisted parse results are only valid for the same version.
+
+    Returns:
+        Short hex digest
+    """
+    digest = hashlib.sha256(f"revision={PARSER_REVISION}".encode())
+    for template in _TEMPLATES:
+        for value in astuple(template):
+            if isinstance(value, re.Pattern):
+                value = (value.pattern, value.flags)
+            digest.update(repr(value).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
 
 
 def extract_payment_details(message: str) -> Dict[str, Any]:
@@ -12,106 +159,66 @@ def extract_payment_details(message: str) -> Dict[str, Any]:
     Returns:
         Dictionary with extracted details (amount, merchant, direction)
     """
-    result = {"amount": 0.0, "merchant": "Unknown", "message": message, "is_income": False}
+    amount, merchant, is_income = 0.0, "Unknown", False
 
-    # Handle payment messages
-    if "Payment of AED" in message:
-        # Extract the amount
-        amount_match = re.search(r"Payment of AED\s+(\d+\.?\d*)", message)
+    # Single dispatch step: the first template whose literal prefilter passes
+    # parses the message
+    for template in _TEMPLATES:
+        if template.matches(message):
+            amount, merchant, is_income = template.parse(message)
+            break
 
-        # Extract the merchant more reliably with lookahead and lookbehind
-        merchant_match = re.search(r"done at (.*?)(?= using| with|$)", message)
+    if merchant == "Unknown" and "Payment" in message:
+        logger.debug(f"Could not extract merchant from: {message}")
 
-        if amount_match:
-            result["amount"] = float(amount_match.group(1))
+    return {"amount": amount, "merchant": merchant, "message": message, "is_income": is_income}
 
-        if merchant_match:
-            result["merchant"] = merchant_match.group(1).strip()
 
-    # Handle incoming transfer messages
-    elif "AED" in message and ("sent by" in message or "has been credited" in message):
-        amount_match = re.search(r"AED\s+([0-9,]+\.?\d*)", message)
-        sender_match = re.search(r"sent by ([^and]+?)(?:and|$)", message)
+# A message, its details in extract_payment_details format and its date
+ParsedMessage = Tuple[Dict[str, Any], Dict[str, Any], Optional[datetime]]
 
-        if amount_match:
-            # Remove commas in numbers like 1,000
-            amount_str = amount_match.group(1).replace(",", "")
-            result["amount"] = float(amount_str)
-            result["is_income"] = True
 
-        if sender_match:
-            result["merchant"] = f"Transfer from {sender_match.group(1).strip()}"
-        else:
-            result["merchant"] = "Incoming Transfer"
+def parse_message(message: Dict[str, Any]) -> ParsedMessage:
+    """Extract payment details and the date of a message dictionary
 
-    # Handle outgoing transfer messages
-    elif "Your local transfer of AED" in message:
-        amount_match = re.search(r"transfer of AED\s+([0-9,]+\.?\d*)", message)
-        recipient_match = re.search(r"to (.*?)(?= from|$)", message)
+    Args:
+        message: Message dictionary with text and optional date
 
-        if amount_match:
-            # Remove commas in numbers like 1,000
-            amount_str = amount_match.group(1).replace(",", "")
-            result["amount"] = float(amount_str)
+    Returns:
+        Tuple of (message, payment details, date or None)
+    """
+    details = extract_payment_details(message["text"])
+    return message, details, convert_imessage_timestamp(message.get("date"))
 
-        if recipient_match:
-            result["merchant"] = f"Transfer to {recipient_match.group(1).strip()}"
-        else:
-            result["merchant"] = "Outgoing Transfer"
 
-    # Handle refund messages
-    elif "refunded" in message and "AED" in message:
-        amount_match = re.search(r"AED\s+([0-9,]+\.?\d*)", message)
-        source_match = re.search(r"from (.*?)(?= has| to|$)", message)
+def convert_imessage_date(timestamp: int) -> Optional[datetime]:
+    """Convert iMessage timestamp to Python datetime
 
-        if amount_match:
-            # Remove commas in numbers like 1,000
-            amount_str = amount_match.group(1).replace(",", "")
-            result["amount"] = float(amount_str)
-            result["is_income"] = True
+    Kept for existing callers; see date_utils.convert_imessage_timestamp.
 
-        if source_match:
-            result["merchant"] = f"Refund from {source_match.group(1).strip()}"
-        else:
-            result["merchant"] = "Refund"
+    Args:
+        timestamp: iMessage timestamp (nanoseconds since 2001-01-01)
 
-    # For debugging - log any issues with extraction
-    if result["merchant"] == "Unknown" and "Payment" in message:
-        print(f"Warning: Could not extract merchant from: {message}")
+    Returns:
+        Python datetime object, None for unset or out-of-range timestamps
+    """
+    return convert_imessage_timestamp(timestamp)
 
-    return result
 
+def parse_messages(messages: List[Dict[str, Any]]) -> List[ParsedMessage]:
+    """Extract payment details and dates of a batch of message dictionaries
 
-def convert_imessage_date(timestamp: int) -> Optional[datetime]:
-    """Convert iMessage timestamp to Python datetime
+    Gives the same results as parse_message, but converts the dates of the
+    whole batch in one vectorized pass.
 
     Args:
-        timestamp: iMessage timestamp (nanoseconds since 2001-01-01)
+        messages: Message dictionaries with text and optional date
 
     Returns:
-        Python datetime object
+        List of (message, payment details, date or None) tuples, in input order
     """
-    if not timestamp:
-        return None
-
-    # iMessage uses nanoseconds since 2001-01-01
-    # First, convert to seconds
-    timestamp_seconds = timestamp / 1e9
-
-    # Mac Absolute Time epoch starts at 2001-01-01
-    # Unix epoch starts at 1970-01-01
-    # The difference is 978307200 seconds
-    unix_timestamp = timestamp_seconds + 978307200
-
-    try:
-        return datetime.fromtimestamp(unix_timestamp)
-    except (OSError, ValueError, OverflowError) as e:
-        # If the timestamp is still invalid, let's try a different approach
-        # Some versions of iMessage may use a different epoch or format
-        try:
-            # Try interpreting as milliseconds since Unix epoch
-            return datetime.fromtimestamp(timestamp / 1e6)
-        except:
-            # As a last resort, return current date
-            print(f"Warning: Could not convert timestamp {timestamp}: {e}")
-            return None
+    dates = convert_imessage_timestamps([message.get("date") for message in messages])
+    return [
+        (message, extract_payment_details(message["text"]), date)
+        for message, date in zip(messages, dates)
+    ]
@@ -0,0 +1,278 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.db.merchant_dictionary import MerchantDictionary
+from src.db.parse_cache import ParseCache
+from src.models.expense import Expense
+from src.services.categorizer import ExpenseCategorizer
+from src.services.parser import ParsedMessage, parse_messages
+from src.utils import profiling
+
+# Number of messages parsed together, so their dates are converted in one pass
+PARSE_BATCH_SIZE = 1000
+
+
+@dataclass
+class ProcessingStats:
+    """Counters collected while turning messages into expenses"""
+
+    messages: int = 0
+    expenses: int = 0
+    successful: int = 0
+    unknown_merchants: int = 0
+    cached: int = 0
+
+    def merge(self, other: "ProcessingStats"):
+        """Add the counters of another run, e.g. from a worker process"""
+        self.messages += other.messages
+        self.expenses += other.expenses
+        self.successful += other.successful
+        self.unknown_merchants += other.unknown_merchants
+        self.cached += other.cached
+
+    def print_summary(self):
+        """Print the processing counters"""
+        print(f"Processed {self.expenses} payment messages")
+        print(f"Successfully extracted merchants: {self.successful}")
+        print(f"Unknown merchants: {self.unknown_merchants}")
+        if self.cached:
+            print(f"Reused cached parse results: {self.cached}")
+
+
+def _iter_parsed(messages: Iterable[Dict[str, Any]]) -> Iterator[ParsedMessage]:
+    """Parse messages in batches of PARSE_BATCH_SIZE, yielding them one at a time"""
+    messages = iter(messages)
+    batches = iter(lambda: list(islice(messages, PARSE_BATCH_SIZE)), [])
+    return chain.from_iterable(map(parse_messages, batches))
+
+
+def iter_expenses(
+    messages: Iterable[Dict[str, Any]],
+    categorizer: ExpenseCategorizer,
+    stats: Optional[ProcessingStats] = None,
+    parse_cache: Optional[ParseCache] = None,
+    merchants: Optional[MerchantDictionary] = None,
+    raw_merchants: Optional[List[Tuple[str, int]]] = None,
+) -> Iterator[Expense]:
+    """Lazily turn messages into categorized expenses
+
+    Args:
+        messages: Iterable of message dictionaries with text and date
+        categorizer: Categorizer used for each expense
+        stats: Optional counters updated as expenses are produced
+        parse_cache: Optional persistent cache of parse results by ROWID
+        merchants: Optional merchant dictionary; expenses then carry canonical
+            merchant names and each merchant is categorized once
+        raw_merchants: Optional list receiving the raw merchant name and
+            merchant id of every expense, when merchants is given
+
+    Yields:
+        Expense objects, in message order
+    """
+    if stats is None:
+        stats = ProcessingStats()
+
+    # Extract payment details and dates, reusing earlier results if possible
+    if parse_cache is not None:
+        cache_hits = parse_cache.hits
+        parsed = parse_cache.iter_parsed(messages)
+    else:
+        parsed = _iter_parsed(messages)
+
+    # Both are returned unchanged unless a profiler is running
+    parsed = profiling.iter_stage("parse", parsed)
+    categorize = profiling.wrap("categorize", categorizer.categorize)
+
+    # Category of each merchant id seen in this run
+    merchant_categories: Dict[int, str] = {}
+
+    for message, details, date in parsed:
+        stats.messages += 1
+
+        # Skip messages with no amount (like promotional messages)
+        if details["amount"] == 0:
+            continue
+
+        # Keep track of unknown merchants
+        if details["merchant"] == "Unknown":
+            stats.unknown_merchants += 1
+        else:
+            stats.successful += 1
+
+        stats.expenses += 1
+
+        if merchants is not None:
+            merchant_id = merchants.intern(details["merchant"])
+            merchant = merchants.names[merchant_id]
+            if raw_merchants is not None:
+                raw_merchants.append((details["merchant"], merchant_id))
+            category = merchant_categories.get(merchant_id)
+            if category is None:
+                category = merchant_categories[merchant_id] = categorize(merchant)
+        else:
+            merchant = details["merchant"]
+            category = categorize(merchant)
+
+        yield Expense(
+            amount=details["amount"],
+            merchant=merchant,
+            category=category,
+            date=date,
+            message=details["message"],
+            is_income=details["is_income"],
+        )
+
+    if parse_cache is not None:
+        stats.cached += parse_cache.hits - cache_hits
+    if merchants is not None:
+        merchants.flush()
+
+
+# Categorizer, parse cache and merchant dictionary of the current worker process,
+# set up once by _init_worker
+_worker_categorizer: Optional[ExpenseCategorizer] = None
+_worker_parse_cache: Optional[ParseCache] = None
+_worker_merchants: Optional[MerchantDictionary] = None
+
+
+def _init_worker(
+    categorizer: ExpenseCategorizer,
+    parse_cache_file: Optional[str] = None,
+    merchants_file: Optional[str] = None,
+    use_merchants: bool = False,
+):
+    """Keep private copies of the categorizer and caches in each worker process
+
+    The merchant dictionary is a read-only copy of the main process's file; new
+    merchants get worker-local ids, and the main process interns their raw names.
+    """
+    global _worker_categorizer, _worker_parse_cache, _worker_merchants
+    _worker_categorizer = categorizer
+    _worker_parse_cache = ParseCache(parse_cache_file) if parse_cache_file else None
+    if use_merchants:
+        _worker_merchants = MerchantDictionary(merchants_file, read_only=True)
+
+
+def _process_chunk(
+    messages: List[Dict[str, Any]],
+) -> Tuple[List[Expense], List[Tuple[str, int]], ProcessingStats]:
+    """Turn one chunk of messages into expenses inside a worker process
+
+    Returns:
+        Expenses, the raw merchant name and worker-local merchant id of each
+        expense (empty without a merchant dictionary), and the counters
+    """
+    stats = ProcessingStats()
+    raw_merchants: List[Tuple[str, int]] = []
+    expenses = list(
+        iter_expenses(
+            messages,
+            _worker_categorizer,
+            stats,
+            _worker_parse_cache,
+            _worker_merchants,
+            raw_merchants,
+        )
+    )
+    return expenses, raw_merchants, stats
+
+
+def _intern_chunk(
+    expenses: List[Expense],
+    raw_merchants: List[Tuple[str, int]],
+    merchants: MerchantDictionary,
+    categorizer: ExpenseCategorizer,
+):
+    """Intern the raw merchant names of a worker's expenses in the main dictionary
+
+    Names already in the file when the workers started have the same id and
+    name everywhere. A merchant new to a worker is named after the first
+    variant that worker saw, so it is renamed and categorized again if the
+    main dictionary saw another variant first, as iter_expenses would.
+    """
+    renamed: Dict[int, Tuple[str, str]] = {}
+    for expense, (raw, local_id) in zip(expenses, raw_merchants):
+        name = merchants.names[merchants.intern(raw)]
+        if name == expense.merchant:
+            continue
+        if local_id not in renamed:
+            renamed[local_id] = (name, categorizer.categorize(name))
+        expense.merchant, expense.category = renamed[local_id]
+
+
+def iter_expenses_parallel(
+    messages: Iterable[Dict[str, Any]],
+    categorizer: ExpenseCategorizer,
+    workers: int,
+    stats: Optional[ProcessingStats] = None,
+    chunk_size: int = 2000,
+    parse_cache: Optional[ParseCache] = None,
+    merchants: Optional[MerchantDictionary] = None,
+) -> Iterator[Expense]:
+    """Turn messages into categorized expenses using a pool of worker processes
+
+    Messages are split into chunks that are parsed and categorized in
+    parallel. Only a few chunks per worker are in flight at a time, so the
+    input is still consumed as a stream.
+
+    Args:
+        messages: Iterable of message dictionaries with text and date
+        categorizer: Categorizer copied once into every worker
+        workers: Number of worker processes
+        stats: Optional counters updated as chunks complete
+        chunk_size: Number of messages handed to a worker at a time
+        parse_cache: Optional persistent cache of parse results; every worker
+            opens its own connection to the same file
+        merchants: Optional merchant dictionary; workers canonicalize with a
+            read-only copy, and the raw names are interned here in message
+            order, so the dictionary ends up as with iter_expenses
+
+    Yields:
+        Expense objects, in message order
+    """
+    if stats is None:
+        stats = ProcessingStats()
+
+    messages = iter(messages)
+    max_pending = workers * 2
+
+    parse_cache_file = parse_cache.cache_file if parse_cache is not None else None
+    if merchants is not None:
+        # Workers read the names assigned so far from the file
+        merchants.flush()
+    initargs = (
+        categorizer,
+        parse_cache_file,
+        merchants.dictionary_file if merchants is not None else None,
+        merchants is not None,
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=initargs
+    ) as executor:
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < max_pending:
+                    chunk = list(islice(messages, chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_process_chunk, chunk))
+
+                if not pending:
+                    break
+
+                # Wait on the oldest chunk first to preserve message order
+                chunk_expenses, chunk_merchants, chunk_stats = pending.popleft().result()
+                stats.merge(chunk_stats)
+                if merchants is not None:
+                    _intern_chunk(chunk_expenses, chunk_merchants, merchants, categorizer)
+                yield from chunk_expenses
+        finally:
+            for future in pending:
+                future.cancel()
+            if merchants is not None:
+                merchants.flush()
@@ -0,0 +1,142 @@
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from src.db.expense_store import SQLiteExpenseStore
+from src.services.categorizer import ExpenseCategorizer
+
+
+@dataclass
+class RecategorizeResult:
+    """Outcome of applying a keyword change to the stored expenses"""
+
+    merchants_checked: int = 0
+    merchants_changed: int = 0
+    expenses_updated: int = 0
+    seconds: float = 0.0
+
+    def print_summary(self):
+        """Print what the keyword change touched"""
+        print(
+            f"Recategorized {self.expenses_updated} expenses of {self.merchants_changed} "
+            f"merchants ({self.merchants_checked} checked) in {self.seconds * 1000:.1f} ms"
+        )
+
+
+def index_merchants(
+    expense_store: SQLiteExpenseStore, categorizer: ExpenseCategorizer
+) -> Dict[str, Optional[str]]:
+    """Bring the stored merchant-to-keyword index up to date with the categorizer
+
+    Merchants added since the last update are indexed; if the category rules
+    changed in the meantime (e.g. categories.json was edited by hand) every
+    merchant is indexed again.
+
+    Args:
+        expense_store: SQLite store with the distinct merchant table
+        categorizer: Categorizer with the current rules
+
+    Returns:
+        Mapping of every stored merchant to its deciding keyword ('' for none)
+    """
+    version = categorizer.rules_version()
+    if expense_store.get_merchant_rules_version() != version:
+        expense_store.clear_merchant_keywords()
+
+    merchants = expense_store.load_merchants()
+    pending = [
+        (merchant, categorizer.explain(merchant)[1])
+        for merchant, keyword in merchants.items()
+        if keyword is None
+    ]
+    if pending:
+        expense_store.set_merchant_keywords(pending, version)
+        merchants.update((merchant, keyword or "") for merchant, keyword in pending)
+
+    return merchants
+
+
+def change_keyword(
+    expense_store,
+    categorizer: ExpenseCategorizer,
+    category: str,
+    keyword: str,
+    remove: bool = False,
+    categories_file: Optional[str] = None,
+) -> Optional[RecategorizeResult]:
+    """Add or remove a category keyword and recategorize only the affected stored expenses
+
+    Adding a keyword can only change merchants whose name contains it;
+    removing one only those whose category it decided. Just those merchants
+    are categorized again, and their expenses are moved in one batch update.
+    Expenses whose category was changed by hand are left alone.
+
+    Args:
+        expense_store: SQLiteExpenseStore or JSON ExpenseStore
+        categorizer: Categorizer the keyword is added to or removed from
+        category: Category name
+        keyword: Keyword to add or remove
+        remove: Whether to remove the keyword instead of adding it
+        categories_file: Optional categories.json to save the changed rules
+            to, before the stored expenses are touched
+
+    Returns:
+        RecategorizeResult, or None if the category rules did not change
+
+    Raises:
+        OSError: If the categories can't be saved; the categorizer and the
+            stored expenses are then left unchanged
+    """
+    start = time.perf_counter()
+    keyword = keyword.lower()
+
+    if category not in categorizer.categories or not keyword:
+        return None
+    if (keyword in categorizer.categories[category]) != remove:
+        return None
+
+    indexed = isinstance(expense_store, SQLiteExpenseStore)
+    if indexed:
+        merchants = index_merchants(expense_store, categorizer)
+    else:
+        merchants = {expense["merchant"]: None for expense in expense_store.load_expenses()}
+
+    if remove and indexed:
+        candidates = expense_store.merchants_for_keyword(keyword)
+    else:
+        candidates = [merchant for merchant in merchants if keyword in merchant.lower()]
+
+    before = {merchant: categorizer.explain(merchant)[0] for merchant in candidates}
+
+    if remove:
+        categorizer.remove_keyword(category, keyword)
+    else:
+        categorizer.add_keyword(category, keyword)
+
+    # Save the rules first, so the stored expenses never follow rules that
+    # categories.json doesn't have
+    if categories_file is not None and not categorizer.save_categories(categories_file):
+        if remove:
+            categorizer.add_keyword(category, keyword)
+        else:
+            categorizer.remove_keyword(category, keyword)
+        raise OSError(f"Could not save categories to {categories_file}")
+
+    keywords = []
+    changes = []
+    for merchant in candidates:
+        new_category, new_keyword = categorizer.explain(merchant)
+        keywords.append((merchant, new_keyword))
+        if new_category != before[merchant]:
+            changes.append((merchant, before[merchant], new_category))
+
+    updated = expense_store.recategorize_merchants(changes)
+    if indexed:
+        expense_store.set_merchant_keywords(keywords, categorizer.rules_version())
+
+    return RecategorizeResult(
+        merchants_checked=len(candidates),
+        merchants_changed=len(changes),
+        expenses_updated=updated,
+        seconds=time.perf_counter() - start,
+    )
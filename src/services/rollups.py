@@ -0,0 +1,315 @@
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.services.topk import top_items
+from src.utils.date_utils import day_key_ordinals
+
+# (YYYYMMDD day, category, merchant, is_income, total, count), as stored in
+# SQLiteExpenseStore's daily rollup table
+DailyBucket = Tuple[int, str, str, bool, float, int]
+
+# Calendar periods a date range can be broken down into
+VIEW_PERIODS = ("week", "month")
+
+# Earlier periods a date range can be compared with
+COMPARE_MODES = ("previous", "year")
+
+
+def previous_period(first: date, last: date, mode: str = "previous") -> Tuple[date, date]:
+    """Get the period a date range is compared with
+
+    Args:
+        first: First day of the range
+        last: Last day of the range
+        mode: "previous" for the range of the same length right before,
+            "year" for the same days one year earlier
+
+    Returns:
+        Tuple of (first day, last day) of the earlier period
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode == "previous":
+        length = last - first + timedelta(days=1)
+        return first - length, last - length
+    if mode == "year":
+        return _year_earlier(first), _year_earlier(last)
+    raise ValueError(f"Unknown comparison mode: {mode}")
+
+
+def _year_earlier(day: date) -> date:
+    """Get the same day one year earlier, Feb 28 for Feb 29"""
+    if day.month == 2 and day.day == 29:
+        return day.replace(year=day.year - 1, day=28)
+    return day.replace(year=day.year - 1)
+
+
+def iter_periods(first: date, last: date, period: str) -> Iterable[Tuple[str, date, date]]:
+    """Split a date range into calendar weeks or months
+
+    Args:
+        first: First day of the range
+        last: Last day of the range
+        period: "week" (ISO weeks, starting on Monday) or "month"
+
+    Yields:
+        Tuples of (label, first day, last day), clipped to the range
+
+    Raises:
+        ValueError: If the period is unknown
+    """
+    if period not in VIEW_PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    start = first
+    while start <= last:
+        if period == "week":
+            year, week, weekday = start.isocalendar()
+            label = f"{year}-W{week:02d}"
+            end = start + timedelta(days=7 - weekday)
+        else:
+            label = f"{start.year:04d}-{start.month:02d}"
+            next_month = date(start.year + start.month // 12, start.month % 12 + 1, 1)
+            end = next_month - timedelta(days=1)
+
+        end = min(end, last)
+        yield label, start, end
+        start = end + timedelta(days=1)
+
+
+class DailyRollups:
+    """Daily expense totals indexed for arbitrary date range queries
+
+    Built from the buckets of SQLiteExpenseStore's daily rollup table. The
+    totals and counts of every (category, direction) pair are kept as
+    prefix sums over a dense day axis, so the total of any date range costs
+    two lookups per category, no matter how many days or expenses it spans.
+    Weekly and monthly views are sums of such ranges. Merchant totals for a
+    range add up just the buckets of its days, which are kept sorted by day.
+    """
+
+    def __init__(self, buckets: Iterable[DailyBucket]):
+        """Index daily buckets
+
+        Args:
+            buckets: Daily buckets; undated ones (day 0) are ignored
+        """
+        category_ids: Dict[str, int] = {}
+        merchant_ids: Dict[str, int] = {}
+        days = []
+        categories = []
+        merchants = []
+        income = []
+        totals = []
+        counts = []
+
+        for day, category, merchant, is_income, total, count in buckets:
+            if not day:
+                continue
+            days.append(day)
+            categories.append(category_ids.setdefault(category, len(category_ids)))
+            merchants.append(merchant_ids.setdefault(merchant, len(merchant_ids)))
+            income.append(bool(is_income))
+            totals.append(total)
+            counts.append(count)
+
+        self.categories: List[str] = list(category_ids)
+        self.merchants: List[str] = list(merchant_ids)
+
+        ordinals = day_key_ordinals(days)
+        self.first_ordinal = int(ordinals.min()) if len(ordinals) else 0
+        self.days = int(ordinals.max()) - self.first_ordinal + 1 if len(ordinals) else 0
+
+        # Buckets sorted by day, for merchant totals over a range
+        order = np.argsort(ordinals, kind="stable")
+        self._day = ordinals[order] - self.first_ordinal
+        self._category = np.array(categories, dtype=np.int64)[order]
+        self._merchant = np.array(merchants, dtype=np.int64)[order]
+        self._income = np.array(income, dtype=bool)[order]
+        self._total = np.array(totals, dtype=np.float64)[order]
+        self._count = np.array(counts, dtype=np.int64)[order]
+
+        # Prefix sums per series, series = category id * 2 + is_income:
+        # column d holds the sum over all days before day d
+        series = self._category * 2 + self._income
+        shape = (len(self.categories) * 2, self.days)
+        cells = series * self.days + self._day
+        self._total_prefix = self._prefix(
+            np.bincount(cells, weights=self._total, minlength=shape[0] * shape[1]), shape
+        )
+        self._count_prefix = self._prefix(
+            np.bincount(cells, weights=self._count, minlength=shape[0] * shape[1]), shape
+        ).astype(np.int64)
+
+    @staticmethod
+    def _prefix(daily: np.ndarray, shape: Tuple[int, int]) -> np.ndarray:
+        """Turn flat per-(series, day) values into prefix sums along the day axis"""
+        prefix = np.zeros((shape[0], shape[1] + 1))
+        np.cumsum(daily.reshape(shape), axis=1, out=prefix[:, 1:])
+        return prefix
+
+    @property
+    def first_date(self) -> Optional[date]:
+        """First day with a stored expense, None if there are none"""
+        return date.fromordinal(self.first_ordinal) if self.days else None
+
+    @property
+    def last_date(self) -> Optional[date]:
+        """Last day with a stored expense, None if there are none"""
+        return date.fromordinal(self.first_ordinal + self.days - 1) if self.days else None
+
+    def _span(self, first: date, last: date) -> Tuple[int, int]:
+        """Get the half-open day axis indexes of a date range, clipped to the stored days"""
+        start = min(max(first.toordinal() - self.first_ordinal, 0), self.days)
+        end = min(max(last.toordinal() - self.first_ordinal + 1, start), self.days)
+        return start, end
+
+    def series_totals(self, first: date, last: date) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the totals and counts of every (category, direction) series over a date range
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+
+        Returns:
+            Tuple of (totals, counts) arrays indexed by category id * 2 + is_income
+        """
+        start, end = self._span(first, last)
+        return (
+            self._total_prefix[:, end] - self._total_prefix[:, start],
+            self._count_prefix[:, end] - self._count_prefix[:, start],
+        )
+
+    def summary(self, first: date, last: date) -> Dict[str, Any]:
+        """Get the totals of a date range from the prefix sums alone
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+
+        Returns:
+            Dictionary with the range, total_spent, total_income, net_flow,
+            expense_count and the spending per category
+        """
+        totals, counts = self.series_totals(first, last)
+        spent = float(totals[0::2].sum())
+        income = float(totals[1::2].sum())
+
+        return {
+            "from": first.isoformat(),
+            "to": last.isoformat(),
+            "total_spent": spent,
+            "total_income": income,
+            "net_flow": income - spent,
+            "expense_count": int(counts.sum()),
+            "category_totals": {
+                category: float(totals[2 * index])
+                for index, category in enumerate(self.categories)
+                if counts[2 * index]
+            },
+        }
+
+    def merchant_totals(self, first: date, last: date, is_income: bool = False) -> Dict[str, float]:
+        """Get the total per merchant over a date range
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+            is_income: Whether to total incoming instead of outgoing transactions
+
+        Returns:
+            Mapping of merchant to its total, for merchants with transactions in the range
+        """
+        start, end = self._span(first, last)
+        lo, hi = np.searchsorted(self._day, [start, end])
+        selected = self._income[lo:hi] == is_income
+        merchants = self._merchant[lo:hi][selected]
+
+        totals = np.bincount(
+            merchants, weights=self._total[lo:hi][selected], minlength=len(self.merchants)
+        )
+        present = np.bincount(merchants, minlength=len(self.merchants)) > 0
+        return {self.merchants[index]: float(totals[index]) for index in np.flatnonzero(present)}
+
+    def analytics(
+        self, first: date, last: date, top_merchants: int = 5, top_income_sources: int = 3
+    ) -> Dict[str, Any]:
+        """Generate the report of ExpenseAnalyzer for a date range
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+            top_merchants: Number of merchants to list
+            top_income_sources: Number of income sources to list
+
+        Returns:
+            Dictionary containing analysis results, plus the range as "period"
+        """
+        summary = self.summary(first, last)
+        if not summary["expense_count"]:
+            return {"error": "No expenses found"}
+
+        monthly_summary = {}
+        monthly_categories = {}
+        for label, month_first, month_last in iter_periods(first, last, "month"):
+            totals, counts = self.series_totals(month_first, month_last)
+            if not counts.sum():
+                continue
+            # Like ExpenseAnalyzer, monthly figures add up both directions
+            monthly_summary[label] = float(totals.sum())
+            monthly_categories[label] = {
+                category: float(totals[2 * index] + totals[2 * index + 1])
+                for index, category in enumerate(self.categories)
+                if counts[2 * index] or counts[2 * index + 1]
+            }
+
+        return {
+            "period": {"from": summary["from"], "to": summary["to"]},
+            "total_spent": summary["total_spent"],
+            "total_income": summary["total_income"],
+            "net_flow": summary["net_flow"],
+            "category_totals": summary["category_totals"],
+            "top_merchants": top_items(self.merchant_totals(first, last), top_merchants),
+            "top_income_sources": top_items(
+                self.merchant_totals(first, last, is_income=True), top_income_sources
+            ),
+            "monthly_summary": monthly_summary,
+            "monthly_categories": monthly_categories,
+        }
+
+    def compare(
+        self, first: date, last: date, mode: str = "previous"
+    ) -> Dict[str, Dict[str, Any]]:
+        """Summarize a date range next to the period it is compared with
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+            mode: Comparison mode, see previous_period
+
+        Returns:
+            Dictionary with "current" and "previous" summaries
+        """
+        return {
+            "current": self.summary(first, last),
+            "previous": self.summary(*previous_period(first, last, mode)),
+        }
+
+    def view(self, first: date, last: date, period: str) -> Dict[str, Dict[str, Any]]:
+        """Summarize a date range per calendar week or month
+
+        Args:
+            first: First day of the range
+            last: Last day of the range
+            period: "week" or "month"
+
+        Returns:
+            Mapping of period label to its summary, in date order
+        """
+        return {
+            label: self.summary(period_first, period_last)
+            for label, period_first, period_last in iter_periods(first, last, period)
+        }
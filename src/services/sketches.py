@@ -0,0 +1,208 @@
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+# Largest relative error of a quantile estimate
+RELATIVE_ACCURACY = 0.01
+
+# Bucket i holds the amounts in (GAMMA ** (i - 1), GAMMA ** i]
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(GAMMA)
+
+# Amounts below this (zero, refunds booked as 0.00) share the zero bucket
+MIN_AMOUNT = 0.005
+ZERO_BUCKET = -(2**31)
+
+# Quantiles reported for each distribution
+QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+
+# Transactions above the 75th percentile plus this many interquartile ranges
+# count as outliers (Tukey's upper fence)
+OUTLIER_IQR_FACTOR = 1.5
+
+# Fewest amounts with a meaningful interquartile range; smaller sketches
+# report no outlier threshold or share
+MIN_OUTLIER_COUNT = 4
+
+
+def amount_bucket(amount: float) -> int:
+    """Get the sketch bucket of an amount"""
+    if amount < MIN_AMOUNT:
+        return ZERO_BUCKET
+    return math.ceil(math.log(amount) / _LOG_GAMMA)
+
+
+def amount_buckets(amounts):
+    """Get the sketch buckets of a numpy array of amounts, like amount_bucket"""
+    # SQLiteExpenseStore loads this module at startup, so numpy is imported on use
+    import numpy as np
+
+    amounts = np.asarray(amounts, dtype=np.float64)
+    small = amounts < MIN_AMOUNT
+    buckets = np.ceil(np.log(np.where(small, 1.0, amounts)) / _LOG_GAMMA).astype(np.int64)
+    buckets[small] = ZERO_BUCKET
+    return buckets
+
+
+def bucket_value(bucket: int) -> float:
+    """Get the amount representing a bucket, within RELATIVE_ACCURACY of all its amounts"""
+    if bucket == ZERO_BUCKET:
+        return 0.0
+    return 2 * GAMMA**bucket / (GAMMA + 1)
+
+
+class AmountSketch:
+    """Mergeable sketch of a transaction amount distribution
+
+    Amounts are counted in logarithmic buckets (as in DDSketch), so every
+    quantile is estimated within RELATIVE_ACCURACY of a true amount of that
+    rank, however many amounts were added. Sketches of different months,
+    categories or workers merge by adding their bucket counts, and an
+    amount can be removed again, which lets SQLiteExpenseStore keep the
+    buckets up to date with triggers. The total of each bucket is kept as
+    well, so the share of spending above a threshold is exact up to the
+    bucket containing it.
+    """
+
+    def __init__(self):
+        """Initialize an empty sketch"""
+        self.counts: Dict[int, int] = {}
+        self.totals: Dict[int, float] = {}
+
+    @classmethod
+    def from_buckets(cls, buckets: Iterable[Tuple[int, int, float]]) -> "AmountSketch":
+        """Build a sketch from (bucket, count, total) triples, adding up repeated buckets"""
+        sketch = cls()
+        for bucket, count, total in buckets:
+            sketch.add_bucket(bucket, count, total)
+        return sketch
+
+    @property
+    def count(self) -> int:
+        """Number of amounts added"""
+        return sum(self.counts.values())
+
+    @property
+    def total(self) -> float:
+        """Sum of the amounts added"""
+        return sum(self.totals.values())
+
+    def add(self, amount: float):
+        """Add an amount to the sketch"""
+        self.add_bucket(amount_bucket(amount), 1, amount)
+
+    def add_bucket(self, bucket: int, count: int, total: float):
+        """Add a number of amounts with a known total to one bucket"""
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.totals[bucket] = self.totals.get(bucket, 0.0) + total
+
+    def merge(self, other: "AmountSketch") -> "AmountSketch":
+        """Add every amount of another sketch to this one
+
+        Returns:
+            This sketch
+        """
+        for bucket, count in other.counts.items():
+            self.add_bucket(bucket, count, other.totals[bucket])
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile of the amounts
+
+        Args:
+            q: Quantile between 0 and 1
+
+        Returns:
+            Estimated amount, None if the sketch is empty
+        """
+        count = self.count
+        if not count:
+            return None
+
+        # Nearest rank: the smallest amount with at least q of the amounts
+        # at or below it, counted from 1
+        rank = max(math.ceil(q * count), 1)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return bucket_value(bucket)
+        return bucket_value(max(self.counts))
+
+    def share_above(self, threshold: float) -> float:
+        """Get the share of the total in buckets entirely above an amount
+
+        Args:
+            threshold: Amount to compare with
+
+        Returns:
+            Fraction of the summed amounts, 0.0 for an empty or zero total
+        """
+        total = self.total
+        if total <= 0:
+            return 0.0
+        cutoff = amount_bucket(threshold)
+        return sum(value for bucket, value in self.totals.items() if bucket > cutoff) / total
+
+    def outlier_threshold(self) -> Optional[float]:
+        """Get the amount above which transactions count as outliers
+
+        Returns:
+            Tukey's upper fence (p75 + 1.5 * IQR), None with fewer than
+            MIN_OUTLIER_COUNT amounts
+        """
+        if self.count < MIN_OUTLIER_COUNT:
+            return None
+        q1 = self.quantile(0.25)
+        q3 = self.quantile(0.75)
+        return q3 + OUTLIER_IQR_FACTOR * (q3 - q1)
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarize the distribution for reports
+
+        Returns:
+            Dictionary with count, p50, p90, p99, the outlier threshold and
+            outlier_share, the share of the total spent in outlier
+            transactions; both are None with fewer than MIN_OUTLIER_COUNT amounts
+        """
+        threshold = self.outlier_threshold()
+        result: Dict[str, Any] = {"count": self.count}
+        result.update((name, self.quantile(q)) for name, q in QUANTILES)
+        result["outlier_threshold"] = threshold
+        result["outlier_share"] = self.share_above(threshold) if threshold is not None else None
+        return result
+
+
+def distributions(
+    buckets: Iterable[Tuple[str, str, int, int, float]], merchants: Iterable[str] = ()
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Merge sketch buckets into the amount distribution of each category and merchant
+
+    Args:
+        buckets: (category, merchant, AmountSketch bucket, count, total) tuples,
+            repeated keys are added up
+        merchants: Merchants to report distributions for, e.g. the top merchants
+
+    Returns:
+        Dictionary with the AmountSketch summary of every category under
+        "categories" and of each of the given merchants with amounts
+        under "merchants", in the given order
+    """
+    merchants = list(merchants)
+    wanted = set(merchants)
+    by_category: Dict[str, AmountSketch] = defaultdict(AmountSketch)
+    by_merchant: Dict[str, AmountSketch] = defaultdict(AmountSketch)
+
+    for category, merchant, bucket, count, total in buckets:
+        by_category[category].add_bucket(bucket, count, total)
+        if merchant in wanted:
+            by_merchant[merchant].add_bucket(bucket, count, total)
+
+    return {
+        "categories": {category: sketch.summary() for category, sketch in by_category.items()},
+        "merchants": {
+            merchant: by_merchant[merchant].summary()
+            for merchant in merchants
+            if merchant in by_merchant
+        },
+    }
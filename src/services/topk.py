@@ -0,0 +1,119 @@
+import heapq
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Distinct keys tracked exactly before switching to the Space-Saving sketch
+DEFAULT_CAPACITY = 10000
+
+
+class TopK:
+    """Streaming top-K of keys by summed weight, in bounded memory
+
+    Sums are exact while there are at most `capacity` distinct keys. Beyond
+    that, the tracker becomes a weighted Space-Saving sketch: a new key
+    takes over the counter of the key with the smallest sum, inheriting
+    that sum as its error. An estimate never understates a key's true sum
+    and overstates it by at most its error, which is at most the total
+    weight divided by the capacity. Every key whose true sum exceeds that
+    bound is tracked.
+
+    Weights must not be negative.
+    """
+
+    def __init__(self, k: int = 5, capacity: Optional[int] = None):
+        """Initialize an empty tracker
+
+        Args:
+            k: Number of keys reported by top()
+            capacity: Number of keys tracked at once (default: DEFAULT_CAPACITY),
+                raised to k if smaller
+
+        Raises:
+            ValueError: If k is negative or the capacity is not positive
+        """
+        capacity = DEFAULT_CAPACITY if capacity is None else capacity
+        if k < 0 or capacity < 1:
+            raise ValueError(f"Invalid top-K size {k} or capacity {capacity}")
+
+        self.k = k
+        self.capacity = max(capacity, k)
+        self.total_weight = 0.0
+        self._sums: Dict[Hashable, float] = {}
+        self._errors: Dict[Hashable, float] = {}
+        # Min-heap of (sum, key) with one entry per tracked key, built when the
+        # sketch takes over. Sums only grow, so an entry may lag behind its key's
+        # sum; it is refreshed when it reaches the top.
+        self._heap: Optional[List[Tuple[float, Hashable]]] = None
+
+    @property
+    def exact(self) -> bool:
+        """Whether every sum so far is exact"""
+        return self._heap is None
+
+    def add(self, key: Hashable, weight: float):
+        """Add a weight to a key's sum
+
+        Args:
+            key: Key to add to
+            weight: Non-negative weight
+        """
+        self.total_weight += weight
+        sums = self._sums
+
+        if key in sums:
+            sums[key] += weight
+        elif len(sums) < self.capacity:
+            sums[key] = weight
+        else:
+            self._replace_min(key, weight)
+
+    def update(self, items: Iterable[Tuple[Hashable, float]]):
+        """Add the weights of many (key, weight) pairs"""
+        for key, weight in items:
+            self.add(key, weight)
+
+    def _replace_min(self, key: Hashable, weight: float):
+        """Hand the counter of the smallest tracked key over to a new key"""
+        sums = self._sums
+        heap = self._heap
+        if heap is None:
+            heap = self._heap = [(total, tracked) for tracked, total in sums.items()]
+            heapq.heapify(heap)
+
+        while True:
+            total, evicted = heap[0]
+            current = sums[evicted]
+            if current == total:
+                break
+            heapq.heapreplace(heap, (current, evicted))
+
+        del sums[evicted]
+        self._errors.pop(evicted, None)
+
+        sums[key] = total + weight
+        self._errors[key] = total
+        heapq.heapreplace(heap, (total + weight, key))
+
+    def top(self) -> List[Tuple[Hashable, float, float]]:
+        """Get the k keys with the largest sums
+
+        Returns:
+            List of (key, estimated sum, maximum overestimate), largest first
+        """
+        largest = heapq.nlargest(self.k, self._sums.items(), key=itemgetter(1))
+        return [(key, total, self._errors.get(key, 0.0)) for key, total in largest]
+
+    def result(self) -> Dict[Hashable, float]:
+        """Get the k keys with the largest sums as a key-to-sum dictionary"""
+        return {key: total for key, total, _ in self.top()}
+
+    def errors(self) -> Dict[Hashable, float]:
+        """Get the maximum overestimate of each of the top k sums, empty while exact"""
+        if self.exact:
+            return {}
+        return {key: error for key, _, error in self.top()}
+
+
+def top_items(totals: Dict[Hashable, float], k: int) -> Dict[Hashable, float]:
+    """Get the k largest entries of a totals dictionary, largest first"""
+    return dict(heapq.nlargest(k, totals.items(), key=itemgetter(1)))
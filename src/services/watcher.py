@@ -0,0 +1,161 @@
+import logging
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (mtime in nanoseconds, size) of each watched file; None for missing files
+FileState = Tuple[Optional[Tuple[int, int]], ...]
+
+
+class FileChangeDetector:
+    """Detects writes to a SQLite database by polling file metadata
+
+    A database in WAL mode (like chat.db) receives new rows in its -wal file
+    and only changes the main file on checkpoints, so both are watched.
+    """
+
+    def __init__(self, db_path: str):
+        """Initialize detector
+
+        Args:
+            db_path: Path to the SQLite database
+        """
+        self.paths: List[str] = [db_path, f"{db_path}-wal"]
+        self._last: FileState = self.snapshot()
+
+    def snapshot(self) -> FileState:
+        """Get the current modification time and size of every watched file"""
+        state = []
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                state.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                state.append(None)
+        return tuple(state)
+
+    def changed(self) -> bool:
+        """Check whether any watched file changed since the last call"""
+        state = self.snapshot()
+        if state == self._last:
+            return False
+        self._last = state
+        return True
+
+
+class DatabaseWatcher:
+    """Polls a database for changes and runs a callback once writes settle
+
+    The poll interval starts at `min_interval` after activity and doubles on
+    every idle poll up to `max_interval`, so an idle watcher only stats two
+    files a few times per second. A detected change is debounced: the
+    callback runs once no further change has been seen for `debounce`
+    seconds (or after `max_debounce` at the latest), so a burst of writes
+    triggers a single update.
+
+    The files are compared with their state from before the callback ran,
+    so a write landing while the callback reads is picked up by the next
+    poll. The callback only reads (through a read-only connection), so it
+    changes neither file itself. As a safety net, the callback also runs
+    every `resync_interval` seconds.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        on_change: Callable[[], Any],
+        min_interval: float = 0.05,
+        max_interval: float = 0.5,
+        debounce: float = 0.1,
+        max_debounce: float = 1.0,
+        resync_interval: float = 30.0,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Initialize watcher
+
+        Args:
+            db_path: Path to the SQLite database to watch
+            on_change: Called after changes settle; its exceptions are logged
+                and trigger a retry on the next poll
+            min_interval: Poll interval right after activity, in seconds
+            max_interval: Longest poll interval when idle, in seconds
+            debounce: Quiet time required before calling on_change, in seconds
+            max_debounce: Longest delay of on_change during continuous writes
+            resync_interval: Time after which on_change runs even without changes
+            sleep: Sleep function, replaceable in tests
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.detector = FileChangeDetector(db_path)
+        self.on_change = on_change
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.debounce = debounce
+        self.max_debounce = max_debounce
+        self.resync_interval = resync_interval
+        self._sleep = sleep
+        self._clock = clock
+        self.interval = min_interval
+        self.running = False
+        self._retry = False
+        self._last_run = clock()
+
+    def _settle(self):
+        """Wait until the watched files stop changing, up to max_debounce
+
+        The detector is left at the state of the last check, which is what
+        the callback gets to see.
+        """
+        deadline = self._clock() + self.max_debounce
+        while self._clock() < deadline:
+            self._sleep(self.debounce)
+            if not self.detector.changed():
+                return
+
+    def poll_once(self) -> bool:
+        """Check for changes once and run the callback if there were any
+
+        Returns:
+            Whether the callback ran successfully
+        """
+        resync = self._clock() - self._last_run >= self.resync_interval
+        if not (self.detector.changed() or self._retry or resync):
+            self.interval = min(self.interval * 2, self.max_interval)
+            return False
+
+        self._settle()
+        self.interval = self.min_interval
+
+        try:
+            self.on_change()
+        except Exception as e:
+            # e.g. the database is locked mid-checkpoint; try again on the next poll
+            logger.error(f"Error processing database changes: {e}")
+            self._retry = True
+            self.interval = self.max_interval
+            return False
+        finally:
+            self._last_run = self._clock()
+
+        self._retry = False
+        return True
+
+    def run(self, max_polls: Optional[int] = None):
+        """Poll until stop() is called, max_polls is reached or the process is interrupted
+
+        Args:
+            max_polls: Optional number of polls after which to return
+        """
+        self.running = True
+        polls = 0
+        while self.running and (max_polls is None or polls < max_polls):
+            self.poll_once()
+            polls += 1
+            if self.running:
+                self._sleep(self.interval)
+
+    def stop(self):
+        """Make run() return after the current poll"""
+        self.running = False
@@ -1,11 +1,31 @@
 import argparse
-from typing import Any, Dict, List
+from datetime import date
+from typing import Any, Dict, List, Optional
 
 from tabulate import tabulate
 
 from src.models.expense import Expense
 
 
+def _parse_date(value: str) -> date:
+    """Parse a YYYY-MM-DD command line date"""
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{value}', expected YYYY-MM-DD")
+
+
+def _non_negative_int(value: str) -> int:
+    """Parse a command line count that may not be negative"""
+    try:
+        number = int(value)
+    except ValueError:
+        number = -1
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"invalid count '{value}', expected an integer >= 0")
+    return number
+
+
 class ExpenseTrackerCLI:
     """Command-line interface for the expense tracker"""
 
@@ -19,16 +39,150 @@ class ExpenseTrackerCLI:
         self.parser.add_argument(
             "--days", type=int, default=30, help="Number of past days to analyze"
         )
+        self.parser.add_argument(
+            "--from",
+            dest="date_from",
+            type=_parse_date,
+            metavar="YYYY-MM-DD",
+            help="Report on stored expenses from this day on (default: first stored day)",
+        )
+        self.parser.add_argument(
+            "--to",
+            dest="date_to",
+            type=_parse_date,
+            metavar="YYYY-MM-DD",
+            help="Report on stored expenses up to and including this day (default: last stored)",
+        )
+        self.parser.add_argument(
+            "--compare",
+            nargs="?",
+            const="previous",
+            choices=["previous", "year"],
+            help="Compare the --from/--to range with the period of the same length before it "
+            "(previous) or with the same days a year earlier (year)",
+        )
+        self.parser.add_argument(
+            "--view",
+            choices=["week", "month"],
+            help="Break the --from/--to range down into weekly or monthly totals",
+        )
+        self.parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only process messages received since the last incremental run",
+        )
+        self.parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running and process new messages as they arrive (implies --incremental)",
+        )
+        self.parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.5,
+            help="Longest time between checks for new messages in --watch mode, in seconds",
+        )
+        self.parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to parse and categorize messages",
+        )
+        self.parser.add_argument(
+            "--no-parse-cache",
+            action="store_true",
+            help="Parse every message again instead of reusing cached parse results",
+        )
+        self.parser.add_argument(
+            "--top",
+            type=_non_negative_int,
+            default=5,
+            help="Number of top merchants to report (default: 5)",
+        )
+        self.parser.add_argument(
+            "--top-income",
+            type=_non_negative_int,
+            default=3,
+            help="Number of top income sources to report (default: 3)",
+        )
+        self.parser.add_argument(
+            "--distributions",
+            action="store_true",
+            help="Show the median, p90, p99 and outlier share of transaction sizes "
+            "per category and top merchant",
+        )
         self.parser.add_argument("--plot", action="store_true", help="Generate and display charts")
-        self.parser.add_argument("--output", help="Save report to file")
+        self.parser.add_argument(
+            "--plot-dir",
+            help="Save charts as files in this directory instead of displaying them "
+            "(unchanged charts are not rendered again)",
+        )
+        self.parser.add_argument(
+            "--plot-format",
+            nargs="+",
+            choices=["png", "svg"],
+            default=["png"],
+            help="File formats of the charts saved with --plot-dir (default: png)",
+        )
+        self.parser.add_argument(
+            "--output",
+            help="Save report to file (.ndjson/.jsonl for one expense per line; "
+            "add .gz to compress)",
+        )
         self.parser.add_argument("--category", help="Update category for an expense")
-        self.parser.add_argument("--index", type=int, help="Index of expense to update")
+        self.parser.add_argument(
+            "--id",
+            "--index",
+            dest="expense_id",
+            type=int,
+            help="Id of expense to update, as listed under Recent Transactions",
+        )
         self.parser.add_argument("--categories", help="Path to categories.json configuration file")
+        self.parser.add_argument(
+            "--index-file",
+            help="Path to a full-text search index of the iMessage database (created if missing)",
+        )
         self.parser.add_argument(
             "--add-keyword",
             nargs=2,
             metavar=("CATEGORY", "KEYWORD"),
-            help="Add keyword to a category",
+            help="Add keyword to a category and recategorize affected stored expenses",
+        )
+        self.parser.add_argument(
+            "--remove-keyword",
+            nargs=2,
+            metavar=("CATEGORY", "KEYWORD"),
+            help="Remove keyword from a category and recategorize affected stored expenses",
+        )
+        self.parser.add_argument(
+            "--verify-rollups",
+            action="store_true",
+            help="Check stored expense totals against a full recompute",
+        )
+        self.parser.add_argument(
+            "--canonicalize-merchants",
+            action="store_true",
+            help="Rename the merchants of stored expenses to their canonical names",
+        )
+        self.parser.add_argument(
+            "--timings",
+            nargs="?",
+            const="table",
+            choices=["table", "json"],
+            help="Print wall time, CPU time and rows per pipeline stage (table or json)",
+        )
+        self.parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="Also record peak memory per stage with --timings (slows the run down)",
+        )
+        self.parser.add_argument(
+            "--profile",
+            metavar="STAGE",
+            help="Run a pipeline stage (e.g. parse, analyze) under cProfile",
+        )
+        self.parser.add_argument(
+            "--profile-file", help="Where to save the --profile pstats dump (default: STAGE.prof)"
         )
         self.parser.add_argument(
             "--show-categories",
@@ -85,6 +239,7 @@ class ExpenseTrackerCLI:
             for merchant, amount in analytics["top_merchants"].items()
         ]
         print(tabulate(merchant_data, headers=["Merchant", "Amount"], tablefmt="grid"))
+        self._display_top_error(analytics.get("top_merchants_error"))
 
         # Top income sources (if available)
         if analytics.get("top_income_sources"):
@@ -94,16 +249,18 @@ class ExpenseTrackerCLI:
                 for source, amount in analytics["top_income_sources"].items()
             ]
             print(tabulate(income_data, headers=["Source", "Amount"], tablefmt="grid"))
+            self._display_top_error(analytics.get("top_income_sources_error"))
 
         # Recent transactions
         print("\n----- Recent Transactions -----")
 
         # Filter to show a mix of recent expenses and income
         all_transactions = []
-        for i, exp in enumerate(expenses):
+        for exp in expenses:
             type_label = "INCOME" if getattr(exp, "is_income", False) else "EXPENSE"
+            expense_id = exp.id if exp.id is not None else "-"
             all_transactions.append(
-                (i, exp.merchant, f"AED {exp.amount:.2f}", exp.category, type_label)
+                (expense_id, exp.merchant, f"AED {exp.amount:.2f}", exp.category, type_label)
             )
 
         # Show most recent 15 transactions
@@ -111,7 +268,7 @@ class ExpenseTrackerCLI:
         print(
             tabulate(
                 recent_data,
-                headers=["Index", "Merchant", "Amount", "Category", "Type"],
+                headers=["Id", "Merchant", "Amount", "Category", "Type"],
                 tablefmt="grid",
             )
         )
@@ -125,6 +282,138 @@ class ExpenseTrackerCLI:
             ]
             print(tabulate(monthly_data, headers=["Month", "Total"], tablefmt="grid"))
 
+    @staticmethod
+    def _display_top_error(errors: Optional[Dict[str, float]]):
+        """Note how far approximate top totals may be overstated"""
+        if errors and max(errors.values()) > 0:
+            print(
+                "Too many distinct counterparties to track exactly; amounts may be "
+                f"overstated by up to AED {max(errors.values()):.2f}"
+            )
+
+    def display_comparison(self, comparison: Dict[str, Dict[str, Any]]):
+        """Display a date range next to the period it is compared with
+
+        Args:
+            comparison: "current" and "previous" summaries, as from DailyRollups.compare
+        """
+        current = comparison["current"]
+        previous = comparison["previous"]
+        print(
+            f"\n----- {current['from']} to {current['to']} "
+            f"vs. {previous['from']} to {previous['to']} -----"
+        )
+
+        rows = [
+            ("Total Spent", current["total_spent"], previous["total_spent"]),
+            ("Total Income", current["total_income"], previous["total_income"]),
+            ("Net Flow", current["net_flow"], previous["net_flow"]),
+        ]
+        categories = sorted(
+            current["category_totals"].keys() | previous["category_totals"].keys(),
+            key=lambda category: current["category_totals"].get(category, 0),
+            reverse=True,
+        )
+        rows.extend(
+            (
+                category,
+                current["category_totals"].get(category, 0.0),
+                previous["category_totals"].get(category, 0.0),
+            )
+            for category in categories
+        )
+
+        comparison_data = [
+            (
+                label,
+                f"AED {now:.2f}",
+                f"AED {before:.2f}",
+                f"{now - before:+.2f}",
+                f"{(now - before) / abs(before) * 100:+.1f}%" if before else "N/A",
+            )
+            for label, now, before in rows
+        ]
+        print(
+            tabulate(
+                comparison_data,
+                headers=["", "Current", "Previous", "Change", "Change %"],
+                tablefmt="grid",
+                disable_numparse=True,
+            )
+        )
+
+    def display_period_view(self, view: Dict[str, Dict[str, Any]], period: str):
+        """Display spending per calendar week or month
+
+        Args:
+            view: Summaries by period label, as from DailyRollups.view
+            period: "week" or "month"
+        """
+        print(f"\n----- {'Weekly' if period == 'week' else 'Monthly'} View -----")
+
+        category_sums: Dict[str, float] = {}
+        for summary in view.values():
+            for category, amount in summary["category_totals"].items():
+                category_sums[category] = category_sums.get(category, 0.0) + amount
+        categories = sorted(category_sums, key=category_sums.get, reverse=True)
+
+        view_data = [
+            [label, f"{summary['total_spent']:.2f}", f"{summary['total_income']:.2f}"]
+            + [f"{summary['category_totals'].get(category, 0.0):.2f}" for category in categories]
+            for label, summary in view.items()
+        ]
+        print(
+            tabulate(
+                view_data,
+                headers=["Period", "Spent", "Income"] + categories,
+                tablefmt="grid",
+                disable_numparse=True,
+            )
+        )
+
+    def display_distributions(self, distributions: Dict[str, Dict[str, Dict[str, Any]]]):
+        """Display the transaction size distributions of categories and top merchants
+
+        Args:
+            distributions: "categories" and "merchants" AmountSketch summaries,
+                plus the "months" they cover for date range reports
+        """
+        months = distributions.get("months")
+        suffix = f" ({months['from']} to {months['to']})" if months else ""
+
+        for label, summaries in (
+            ("Category", distributions["categories"]),
+            ("Merchant", distributions["merchants"]),
+        ):
+            if not summaries:
+                continue
+            print(f"\n----- {label} Transaction Sizes{suffix} -----")
+            rows = [
+                (
+                    name,
+                    summary["count"],
+                    f"AED {summary['p50']:.2f}",
+                    f"AED {summary['p90']:.2f}",
+                    f"AED {summary['p99']:.2f}",
+                    (
+                        f"{summary['outlier_share'] * 100:.1f}%"
+                        if summary["outlier_share"] is not None
+                        else "-"
+                    ),
+                )
+                for name, summary in sorted(
+                    summaries.items(), key=lambda item: item[1]["count"], reverse=True
+                )
+            ]
+            print(
+                tabulate(
+                    rows,
+                    headers=[label, "Count", "Median", "P90", "P99", "Outlier Share"],
+                    tablefmt="grid",
+                    disable_numparse=True,
+                )
+            )
+
     def display_categories(self, categories: Dict[str, List[str]]):
         """Display current category configuration
 
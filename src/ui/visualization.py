@@ -1,7 +1,212 @@
-from typing import Any, Dict
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
-import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.figure import Figure
+
+logger = logging.getLogger(__name__)
+
+# Bump when a chart's drawing code changes, so cached files are rendered again
+RENDER_VERSION = 1
+
+CHART_FORMATS = ("png", "svg")
+
+# Name of the file next to the rendered charts recording the input hash of each
+MANIFEST_FILE = ".charts.json"
+
+# (chart name, chart input, formats, output paths by format)
+RenderJob = Tuple[str, Dict[str, Any], Sequence[str], Dict[str, str]]
+
+
+def _draw_cash_flow(ax, data: Dict[str, Any]):
+    """Draw income, expenses and net flow as bars"""
+    cash_flow_labels = ["Income", "Expenses", "Net"]
+    cash_flow_values = [data["total_income"], data["total_spent"], data["net_flow"]]
+    colors = ["green", "red", "blue" if data["net_flow"] >= 0 else "orange"]
+    ax.bar(cash_flow_labels, cash_flow_values, color=colors)
+    ax.set_title("Cash Flow Overview")
+    ax.set_ylabel("Amount (AED)")
+
+    # Add value labels on bars
+    for i, v in enumerate(cash_flow_values):
+        ax.text(i, v / 2, f"AED {v:.0f}", ha="center", color="white", fontweight="bold")
+
+
+def _draw_categories(ax, data: Dict[str, Any]):
+    """Draw the share of each category as a pie chart"""
+    categories = list(data["category_totals"].keys())
+    amounts = list(data["category_totals"].values())
+
+    # Sort categories by amount for better visualization
+    sorted_indices = np.argsort(amounts)
+    categories = [categories[i] for i in sorted_indices]
+    amounts = [amounts[i] for i in sorted_indices]
+
+    # Show only top categories, group small ones as "Other"
+    if len(categories) > 7:
+        top_categories = categories[-7:]
+        top_amounts = amounts[-7:]
+        other_amount = sum(amounts[:-7])
+        categories = top_categories + ["Other"]
+        amounts = top_amounts + [other_amount]
+
+    ax.pie(amounts, labels=categories, autopct="%1.1f%%", startangle=90)
+    ax.set_title("Expenses by Category")
+    ax.axis("equal")
+
+
+def _draw_barh(ax, totals: Dict[str, float], title: str, color: Optional[str] = None):
+    """Draw totals as horizontal bars, which keep long merchant names readable"""
+    names = list(totals.keys())
+    amounts = list(totals.values())
+
+    y_pos = np.arange(len(names))
+    ax.barh(y_pos, amounts, align="center", color=color)
+    ax.set_yticks(y_pos)
+    ax.set_yticklabels(names)
+    ax.set_title(title)
+    ax.set_xlabel("Amount (AED)")
+
+
+def _draw_merchants(ax, data: Dict[str, Any]):
+    """Draw the merchants with the highest spending"""
+    _draw_barh(ax, data["top_merchants"], "Top Merchants")
+
+
+def _draw_income(ax, data: Dict[str, Any]):
+    """Draw the largest income sources"""
+    _draw_barh(ax, data["top_income_sources"], "Top Income Sources", color="green")
+
+
+def _draw_monthly_trend(ax, data: Dict[str, Any]):
+    """Draw total spending per month as a line"""
+    months = sorted(data["monthly_summary"].keys())
+    monthly_amounts = [data["monthly_summary"][month] for month in months]
+
+    ax.plot(months, monthly_amounts, marker="o", linewidth=2)
+    ax.set_title("Monthly Expense Trend")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Amount (AED)")
+    ax.grid(True, linestyle="--", alpha=0.7)
+    ax.tick_params(axis="x", rotation=45)
+
+    # Add value labels on points
+    for i, v in enumerate(monthly_amounts):
+        ax.text(i, v + max(monthly_amounts) * 0.05, f"AED {v:.0f}", ha="center", va="bottom")
+
+
+def _draw_monthly_categories(ax, data: Dict[str, Any]):
+    """Draw spending per month as bars stacked by category"""
+    monthly_categories = data["monthly_categories"]
+    months = sorted(monthly_categories.keys())
+    all_categories = set()
+    for month_data in monthly_categories.values():
+        all_categories.update(month_data.keys())
+
+    all_categories = sorted(all_categories)
+
+    # Create the stacked bar chart
+    bottom = np.zeros(len(months))
+    for category in all_categories:
+        values = [monthly_categories[month].get(category, 0) for month in months]
+        ax.bar(months, values, bottom=bottom, label=category)
+        bottom += np.array(values)
+
+    ax.set_title("Monthly Expenses by Category")
+    ax.set_xlabel("Month")
+    ax.set_ylabel("Amount (AED)")
+    ax.legend(loc="upper left", bbox_to_anchor=(1, 1))
+    ax.tick_params(axis="x", rotation=45)
+
+
+# Drawing function and figure size of every chart, in display order
+CHARTS: Dict[str, Tuple[Callable[[Any, Dict[str, Any]], None], Tuple[float, float]]] = {
+    "cash_flow": (_draw_cash_flow, (7, 5)),
+    "categories": (_draw_categories, (7, 6)),
+    "merchants": (_draw_merchants, (9, 6)),
+    "income": (_draw_income, (9, 6)),
+    "monthly_trend": (_draw_monthly_trend, (12, 5)),
+    "monthly_categories": (_draw_monthly_categories, (12, 8)),
+}
+
+
+def chart_inputs(analytics: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Select the analytics each chart is drawn from
+
+    Charts without data (no income, a single month) are left out.
+
+    Args:
+        analytics: Analytics results
+
+    Returns:
+        Mapping of chart name to the subset of analytics it uses
+    """
+    inputs = {}
+
+    if analytics.get("total_income", 0) > 0:
+        inputs["cash_flow"] = {
+            "total_income": analytics["total_income"],
+            "total_spent": analytics["total_spent"],
+            "net_flow": analytics["net_flow"],
+        }
+
+    inputs["categories"] = {"category_totals": analytics["category_totals"]}
+    inputs["merchants"] = {"top_merchants": analytics["top_merchants"]}
+
+    if analytics.get("top_income_sources"):
+        inputs["income"] = {"top_income_sources": analytics["top_income_sources"]}
+
+    if analytics.get("monthly_summary") and len(analytics["monthly_summary"]) > 1:
+        inputs["monthly_trend"] = {"monthly_summary": analytics["monthly_summary"]}
+
+    if analytics.get("monthly_categories") and len(analytics["monthly_categories"]) > 1:
+        inputs["monthly_categories"] = {"monthly_categories": analytics["monthly_categories"]}
+
+    return inputs
+
+
+def chart_hash(name: str, data: Dict[str, Any]) -> str:
+    """Digest of everything a rendered chart depends on
+
+    Args:
+        name: Chart name
+        data: Chart input from chart_inputs
+
+    Returns:
+        Hex digest of the chart name, its input, RENDER_VERSION and the matplotlib version
+    """
+    import matplotlib
+
+    payload = json.dumps(
+        [name, data, RENDER_VERSION, matplotlib.__version__], sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _render_chart(job: RenderJob) -> str:
+    """Draw one chart and save it in every requested format
+
+    Runs in a worker process. Figures are created without pyplot, so no
+    GUI backend is loaded. Each file is written under a temporary name and
+    renamed, so an interrupted run never leaves a partial chart behind.
+    """
+    name, data, formats, paths = job
+    draw, figsize = CHARTS[name]
+
+    figure = Figure(figsize=figsize)
+    draw(figure.add_subplot(), data)
+    figure.tight_layout()
+
+    for chart_format in formats:
+        temp_path = f"{paths[chart_format]}.tmp"
+        figure.savefig(temp_path, format=chart_format, dpi=100)
+        os.replace(temp_path, paths[chart_format])
+
+    return name
 
 
 class ExpenseVisualizer:
@@ -13,131 +218,128 @@ class ExpenseVisualizer:
         Args:
             analytics: Analytics results
         """
+        # pyplot picks a GUI backend, so it is only imported for interactive use
+        import matplotlib.pyplot as plt
+
+        inputs = chart_inputs(analytics)
+
         # Cash flow overview
         plt.figure(figsize=(15, 12))
 
-        # Create a cash flow overview chart at the top
-        if "total_income" in analytics and analytics["total_income"] > 0:
-            plt.subplot(3, 2, 1)
-            cash_flow_labels = ["Income", "Expenses", "Net"]
-            cash_flow_values = [
-                analytics["total_income"],
-                analytics["total_spent"],
-                analytics["net_flow"],
-            ]
-            colors = ["green", "red", "blue" if analytics["net_flow"] >= 0 else "orange"]
-            plt.bar(cash_flow_labels, cash_flow_values, color=colors)
-            plt.title("Cash Flow Overview")
-            plt.ylabel("Amount (AED)")
-
-            # Add value labels on bars
-            for i, v in enumerate(cash_flow_values):
-                plt.text(i, v / 2, f"AED {v:.0f}", ha="center", color="white", fontweight="bold")
-
-        # Pie chart for category distribution
-        plt.subplot(3, 2, 2)
-        categories = list(analytics["category_totals"].keys())
-        amounts = list(analytics["category_totals"].values())
-
-        # Sort categories by amount for better visualization
-        sorted_indices = np.argsort(amounts)
-        categories = [categories[i] for i in sorted_indices]
-        amounts = [amounts[i] for i in sorted_indices]
-
-        # Show only top categories, group small ones as "Other"
-        if len(categories) > 7:
-            top_categories = categories[-7:]
-            top_amounts = amounts[-7:]
-            other_amount = sum(amounts[:-7])
-            categories = top_categories + ["Other"]
-            amounts = top_amounts + [other_amount]
-
-        plt.pie(amounts, labels=categories, autopct="%1.1f%%", startangle=90)
-        plt.title("Expenses by Category")
-        plt.axis("equal")
-
-        # Bar chart for top merchants
-        plt.subplot(3, 2, 3)
-        merchants = list(analytics["top_merchants"].keys())
-        merchant_amounts = list(analytics["top_merchants"].values())
-
-        # Horizontal bar chart for better readability of merchant names
-        y_pos = np.arange(len(merchants))
-        plt.barh(y_pos, merchant_amounts, align="center")
-        plt.yticks(y_pos, merchants)
-        plt.title("Top Merchants")
-        plt.xlabel("Amount (AED)")
-
-        # Add income sources if available
-        if analytics.get("top_income_sources"):
-            plt.subplot(3, 2, 4)
-            sources = list(analytics["top_income_sources"].keys())
-            source_amounts = list(analytics["top_income_sources"].values())
-
-            y_pos = np.arange(len(sources))
-            plt.barh(y_pos, source_amounts, align="center", color="green")
-            plt.yticks(y_pos, sources)
-            plt.title("Top Income Sources")
-            plt.xlabel("Amount (AED)")
-
-        # Add monthly trend if available
-        if analytics.get("monthly_summary") and len(analytics["monthly_summary"]) > 1:
-            plt.subplot(3, 2, (5, 6))
-            months = sorted(analytics["monthly_summary"].keys())
-            monthly_amounts = [analytics["monthly_summary"][month] for month in months]
-
-            plt.plot(months, monthly_amounts, marker="o", linewidth=2)
-            plt.title("Monthly Expense Trend")
-            plt.xlabel("Month")
-            plt.ylabel("Amount (AED)")
-            plt.grid(True, linestyle="--", alpha=0.7)
-            plt.xticks(rotation=45)
-
-            # Add value labels on points
-            for i, v in enumerate(monthly_amounts):
-                plt.text(
-                    i, v + max(monthly_amounts) * 0.05, f"AED {v:.0f}", ha="center", va="bottom"
-                )
+        layout = {
+            "cash_flow": 1,
+            "categories": 2,
+            "merchants": 3,
+            "income": 4,
+            "monthly_trend": (5, 6),
+        }
+        for name, position in layout.items():
+            if name in inputs:
+                CHARTS[name][0](plt.subplot(3, 2, position), inputs[name])
 
         plt.tight_layout()
         plt.show()
 
         # If monthly category data is available, create a stacked bar chart
-        if analytics.get("monthly_categories") and len(analytics["monthly_categories"]) > 1:
-            self._plot_monthly_category_breakdown(analytics["monthly_categories"])
+        if "monthly_categories" in inputs:
+            plt.figure(figsize=(12, 8))
+            _draw_monthly_categories(plt.gca(), inputs["monthly_categories"])
+            plt.tight_layout()
+            plt.show()
+
+    def render_charts(
+        self,
+        analytics: Dict[str, Any],
+        output_dir: str,
+        formats: Sequence[str] = ("png",),
+        workers: Optional[int] = None,
+    ) -> Dict[str, List[str]]:
+        """Render every chart to its own file without a display
 
-    def _plot_monthly_category_breakdown(self, monthly_categories):
-        """Plot a stacked bar chart showing category breakdown by month
+        Each chart is hashed together with the part of the analytics it is
+        drawn from. Charts whose hash matches the one recorded for the files
+        already in `output_dir` are skipped; the others are drawn in parallel
+        worker processes.
 
         Args:
-            monthly_categories: Dictionary mapping months to category totals
+            analytics: Analytics results
+            output_dir: Directory for the chart files (created if missing)
+            formats: File formats to save, out of CHART_FORMATS
+            workers: Number of worker processes (default: one per chart, up to the CPU count)
+
+        Returns:
+            Mapping of chart name to its file paths, for every chart with data
+
+        Raises:
+            ValueError: If a format is not supported
         """
-        plt.figure(figsize=(12, 8))
-
-        months = sorted(monthly_categories.keys())
-        all_categories = set()
-        for month_data in monthly_categories.values():
-            all_categories.update(month_data.keys())
-
-        all_categories = sorted(all_categories)
-
-        # Create a data structure for stacked bars
-        data = {}
-        for category in all_categories:
-            data[category] = []
-            for month in months:
-                data[category].append(monthly_categories[month].get(category, 0))
-
-        # Create the stacked bar chart
-        bottom = np.zeros(len(months))
-        for category in all_categories:
-            plt.bar(months, data[category], bottom=bottom, label=category)
-            bottom += np.array(data[category])
-
-        plt.title("Monthly Expenses by Category")
-        plt.xlabel("Month")
-        plt.ylabel("Amount (AED)")
-        plt.legend(loc="upper left", bbox_to_anchor=(1, 1))
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.show()
+        formats = list(dict.fromkeys(formats))
+        unsupported = [name for name in formats if name not in CHART_FORMATS]
+        if unsupported:
+            raise ValueError(f"Unsupported chart format: {', '.join(unsupported)}")
+
+        os.makedirs(output_dir, exist_ok=True)
+        manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+        manifest = self._load_manifest(manifest_path)
+
+        files: Dict[str, List[str]] = {}
+        hashes: Dict[str, str] = {}
+        jobs: List[RenderJob] = []
+
+        for name, data in chart_inputs(analytics).items():
+            paths = {
+                chart_format: os.path.join(output_dir, f"{name}.{chart_format}")
+                for chart_format in formats
+            }
+            files[name] = list(paths.values())
+            hashes[name] = chart_hash(name, data)
+
+            missing = [
+                chart_format
+                for chart_format, path in paths.items()
+                if manifest.get(name, {}).get(chart_format) != hashes[name]
+                or not os.path.exists(path)
+            ]
+            if missing:
+                jobs.append((name, data, missing, paths))
+
+        if workers is None:
+            workers = min(len(jobs), os.cpu_count() or 1)
+
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                rendered = list(executor.map(_render_chart, jobs))
+        else:
+            rendered = [_render_chart(job) for job in jobs]
+
+        for job, name in zip(jobs, rendered):
+            manifest.setdefault(name, {}).update(
+                (chart_format, hashes[name]) for chart_format in job[2]
+            )
+        if rendered:
+            self._save_manifest(manifest_path, manifest)
+
+        print(f"Rendered {len(rendered)} of {len(files)} charts to {output_dir}")
+        return files
+
+    @staticmethod
+    def _load_manifest(manifest_path: str) -> Dict[str, Dict[str, str]]:
+        """Read the input hash recorded for each rendered chart file"""
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            # Everything is rendered again and the manifest rewritten
+            logger.warning(f"Ignoring unreadable chart manifest {manifest_path}: {e}")
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    @staticmethod
+    def _save_manifest(manifest_path: str, manifest: Dict[str, Dict[str, str]]):
+        """Record the input hash of each rendered chart file"""
+        temp_path = f"{manifest_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_path, manifest_path)
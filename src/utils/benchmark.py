@@ -0,0 +1,370 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the parent directory to path so we can import our modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.db.data_source import MessageDatabase
+from src.db.expense_store import SQLiteExpenseStore
+from src.models.expense import Expense, ExpenseBatch
+from src.services.analytics import ExpenseAnalyzer
+from src.services.categorizer import ExpenseCategorizer
+from src.services.parser import extract_payment_details
+from src.utils.config import ExpenseStore
+from src.utils.date_utils import (
+    MAC_EPOCH_OFFSET,
+    NANOSECONDS,
+    UNIX_SECONDS_SQL,
+    convert_imessage_timestamp,
+    convert_imessage_timestamps,
+    imessage_to_local_datetime64,
+    month_keys,
+)
+from src.utils.synthetic_chatdb import generate_chat_db
+
+
+def synthetic_expenses(rows: int, seed: int = 42) -> List[Expense]:
+    """Generate random expenses spread over about three years"""
+    rng = random.Random(seed)
+    start = datetime(2022, 1, 1)
+    categories = ["grocery", "restaurant", "transport", "clothes", "services", "other"]
+
+    return [
+        Expense(
+            amount=round(rng.uniform(1, 500), 2),
+            merchant=f"Merchant {rng.randint(1, 2000)}",
+            category=rng.choice(categories),
+            date=start + timedelta(seconds=rng.randint(0, 3 * 365 * 86400)),
+            message="Payment of AED 1 was done at Merchant using your card 1234",
+            is_income=rng.random() < 0.1,
+        )
+        for _ in range(rows)
+    ]
+
+
+def benchmark_analyze(rows: int, repeat: int = 3) -> Dict[str, Any]:
+    """Time ExpenseAnalyzer.analyze on synthetic expenses
+
+    Args:
+        rows: Number of expenses to analyze
+        repeat: Number of timed runs; the best one is reported
+
+    Returns:
+        Dictionary with the benchmark name, row count and timings in seconds
+    """
+    expenses = synthetic_expenses(rows)
+    analyzer = ExpenseAnalyzer()
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        analyzer.analyze(expenses)
+        timings.append(time.perf_counter() - start)
+
+    return {"benchmark": "analyze", "rows": rows, "best": min(timings), "timings": timings}
+
+
+def benchmark_dates(rows: int, repeat: int = 3) -> Dict[str, Any]:
+    """Time the conversion of iMessage timestamps to local dates and month keys
+
+    Compares converting one timestamp at a time with the vectorized batch
+    conversion, and with converting to Unix seconds inside SQLite.
+
+    Args:
+        rows: Number of timestamps, spread over about three years
+        repeat: Number of timed runs; the best one is reported
+
+    Returns:
+        Dictionary with the best time in seconds of every conversion
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    start = (datetime(2022, 1, 1).timestamp() - MAC_EPOCH_OFFSET) * NANOSECONDS
+    timestamps = (start + rng.integers(0, 3 * 365 * 86400 * NANOSECONDS, rows)).astype(np.int64)
+    values = timestamps.tolist()
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE message (date INTEGER)")
+    conn.executemany("INSERT INTO message VALUES (?)", ((value,) for value in values))
+    # Aggregated, so the time is spent converting rather than returning rows
+    sql = f"SELECT sum({UNIX_SECONDS_SQL.format(date='date')}) FROM message"
+
+    conversions = {
+        "scalar_datetimes": lambda: [convert_imessage_timestamp(value) for value in values],
+        "batch_datetimes": lambda: convert_imessage_timestamps(values),
+        "vectorized_datetime64": lambda: imessage_to_local_datetime64(timestamps),
+        "vectorized_month_keys": lambda: month_keys(imessage_to_local_datetime64(timestamps)),
+        "sqlite_unix_seconds": lambda: conn.execute(sql).fetchall(),
+    }
+
+    results = {}
+    for name, convert in conversions.items():
+        results[name] = min(_timed(convert)[0] for _ in range(repeat))
+
+    return {"benchmark": "dates", "rows": rows, "best": results}
+
+
+# Modules that lightweight commands must not import at startup
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib")
+
+
+def _import_times(stderr: str) -> Dict[str, int]:
+    """Parse `python -X importtime` output into self times per module, in microseconds"""
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _cumulative_us, module = line[len("import time:") :].split("|")
+        times[module.strip()] = int(self_us)
+    return times
+
+
+def benchmark_startup(budget_ms: float = 250.0) -> Dict[str, Any]:
+    """Measure the cold start of the lightweight CLI commands
+
+    Each command runs in a fresh interpreter with `-X importtime`. A command
+    fails the benchmark if its total import time exceeds the budget or if it
+    imports pandas, numpy or matplotlib.
+
+    Args:
+        budget_ms: Maximum total import time per command in milliseconds
+
+    Returns:
+        Dictionary with per-command results and an overall "passed" flag
+    """
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    categories_file = os.path.join(project_root, "src", "utils", "categories.json")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # The commands only check that the database exists; they never read it
+        db_path = os.path.join(tmp_dir, "chat.db")
+        open(db_path, "w").close()
+        tmp_categories = os.path.join(tmp_dir, "categories.json")
+        shutil.copyfile(categories_file, tmp_categories)
+
+        env = dict(
+            os.environ,
+            EXPENSE_TRACKER_DB_PATH=db_path,
+            EXPENSE_TRACKER_DATA_FILE=os.path.join(tmp_dir, "expenses.db"),
+        )
+        commands = {
+            "show-categories": ["--show-categories", "--categories", tmp_categories],
+            "add-keyword": ["--add-keyword", "other", "benchmark", "--categories", tmp_categories],
+        }
+
+        results = {}
+        for name, args in commands.items():
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, "-X", "importtime", "-m", "src.main", *args],
+                cwd=project_root,
+                env=env,
+                capture_output=True,
+                text=True,
+            )
+            wall_ms = (time.perf_counter() - start) * 1000
+
+            times = _import_times(completed.stderr)
+            import_ms = sum(times.values()) / 1000
+            heavy = sorted(
+                {module.split(".")[0] for module in times if module.split(".")[0] in HEAVY_MODULES}
+            )
+            results[name] = {
+                "wall_ms": wall_ms,
+                "import_ms": import_ms,
+                "heavy_modules": heavy,
+                "exit_code": completed.returncode,
+                "passed": completed.returncode == 0 and import_ms <= budget_ms and not heavy,
+            }
+
+    return {
+        "benchmark": "startup",
+        "budget_ms": budget_ms,
+        "commands": results,
+        "passed": all(result["passed"] for result in results.values()),
+    }
+
+
+def _timed(func, *args) -> Tuple[float, Any]:
+    """Call a function and return its wall time in seconds with its result"""
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def benchmark_suite(
+    sizes: List[int], work_dir: Optional[str] = None, seed: int = 42
+) -> Dict[str, Any]:
+    """Run the pipeline stages end to end on synthetic chat databases
+
+    For each size a chat.db with that many messages is generated (or reused
+    from the work directory) and every stage is timed on the output of the
+    previous one: fetching payment messages, parsing, categorizing,
+    analyzing, and saving/loading through both expense stores.
+
+    Args:
+        sizes: Numbers of messages to generate
+        work_dir: Directory to keep the generated databases in, so later runs
+            can reuse them; a temporary directory is used if not given
+        seed: Random seed of the generator
+
+    Returns:
+        Dictionary with environment details and one result per stage and size
+    """
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+    categories_file = os.path.join(project_root, "src", "utils", "categories.json")
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_dir = work_dir or tmp_dir
+        os.makedirs(db_dir, exist_ok=True)
+
+        for size in sizes:
+            db_path = os.path.join(db_dir, f"chat_{size}_{seed}.db")
+            if not os.path.exists(db_path):
+                generate_chat_db(db_path, size, categories_file=categories_file, seed=seed)
+
+            def record(stage: str, seconds: float, rows_in: int, rows_out: int, size=size):
+                results.append(
+                    {
+                        "benchmark": stage,
+                        "messages": size,
+                        "rows_in": rows_in,
+                        "rows_out": rows_out,
+                        "seconds": seconds,
+                        "rows_per_second": rows_in / seconds if seconds else None,
+                    }
+                )
+
+            db = MessageDatabase(db_path)
+            seconds, messages = _timed(db.fetch_payment_messages, 10 * 365)
+            record("fetch_payment_messages", seconds, size, len(messages))
+
+            texts = [message["text"] for message in messages]
+            seconds, parsed = _timed(
+                lambda texts=texts: [extract_payment_details(text) for text in texts]
+            )
+            parsed = [(details, message) for details, message in zip(parsed, messages) if details]
+            record("extract_payment_details", seconds, len(texts), len(parsed))
+
+            seconds, dates = _timed(
+                convert_imessage_timestamps, [message["date"] for _, message in parsed]
+            )
+            record("convert_dates", seconds, len(parsed), len(dates))
+
+            categorizer = ExpenseCategorizer(categories_file)
+            merchants = [details["merchant"] for details, _ in parsed]
+            seconds, categories = _timed(
+                lambda categorizer=categorizer, merchants=merchants: [
+                    categorizer.categorize(merchant) for merchant in merchants
+                ]
+            )
+            record("categorize", seconds, len(merchants), len(categories))
+
+            batch = ExpenseBatch()
+            for (details, message), category, date in zip(parsed, categories, dates):
+                batch.append(
+                    Expense(
+                        amount=details["amount"],
+                        merchant=details["merchant"],
+                        category=category,
+                        date=date,
+                        message=message["text"],
+                        is_income=details["is_income"],
+                    )
+                )
+
+            seconds, _ = _timed(ExpenseAnalyzer().analyze, batch)
+            record("analyze", seconds, len(batch), len(batch))
+
+            for name, store in (
+                ("sqlite", SQLiteExpenseStore(os.path.join(tmp_dir, f"expenses_{size}.db"))),
+                ("json", ExpenseStore(os.path.join(tmp_dir, f"expenses_{size}.json"))),
+            ):
+                seconds, saved = _timed(store.save_expenses, batch)
+                record(f"store_save_{name}", seconds, len(batch), saved)
+                seconds, loaded = _timed(store.load_expenses)
+                record(f"store_load_{name}", seconds, len(batch), len(loaded))
+
+    return {
+        "benchmark": "suite",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "seed": seed,
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark expense tracker components")
+
+    subparsers = parser.add_subparsers(dest="command", help="Benchmark to run")
+
+    suite_parser = subparsers.add_parser(
+        "suite", help="Time every pipeline stage on synthetic chat databases"
+    )
+    suite_parser.add_argument(
+        "--sizes",
+        default="10000,100000,1000000",
+        help="Comma-separated numbers of messages to generate",
+    )
+    suite_parser.add_argument("--work-dir", help="Directory to keep generated databases in")
+    suite_parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    suite_parser.add_argument("--output", help="Write JSON results to this file")
+
+    analyze_parser = subparsers.add_parser("analyze", help="Benchmark ExpenseAnalyzer.analyze")
+    analyze_parser.add_argument("--rows", type=int, default=1_000_000, help="Number of expenses")
+    analyze_parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs")
+
+    dates_parser = subparsers.add_parser(
+        "dates", help="Benchmark iMessage timestamp conversion"
+    )
+    dates_parser.add_argument("--rows", type=int, default=1_000_000, help="Number of timestamps")
+    dates_parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs")
+
+    startup_parser = subparsers.add_parser(
+        "startup", help="Check cold start time of lightweight CLI commands"
+    )
+    startup_parser.add_argument(
+        "--budget-ms", type=float, default=250.0, help="Import time budget per command"
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        sizes = [int(size) for size in args.sizes.split(",")]
+        result = benchmark_suite(sizes, args.work_dir, args.seed)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(result, f, indent=2)
+            print(f"Results written to {args.output}")
+        else:
+            print(json.dumps(result, indent=2))
+    elif args.command == "analyze":
+        print(json.dumps(benchmark_analyze(args.rows, args.repeat), indent=2))
+    elif args.command == "dates":
+        print(json.dumps(benchmark_dates(args.rows, args.repeat), indent=2))
+    elif args.command == "startup":
+        result = benchmark_startup(args.budget_ms)
+        print(json.dumps(result, indent=2))
+        if not result["passed"]:
+            sys.exit(1)
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
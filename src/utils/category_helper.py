@@ -1,7 +1,10 @@
 import argparse
 import json
 import os
-from typing import Dict, List, Set
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+from src.db.expense_store import SQLITE_EXTENSIONS, open_expense_store
+from src.utils.report import iter_report_expenses
 
 
 def load_json(file_path: str) -> List[Dict]:
@@ -27,9 +30,26 @@ def save_json(file_path: str, data) -> bool:
         return False
 
 
-def extract_merchant_suggestions(expenses: List[Dict]) -> Dict[str, Set[str]]:
-    """Extract unique merchants from expenses and suggest categories"""
+def iter_expenses_file(file_path: str) -> Iterator[Dict]:
+    """Stream expenses from an expense store or a saved report
+
+    SQLite stores are read through their cursor and NDJSON reports a line
+    at a time, so neither is loaded into memory whole.
+    """
+    if os.path.splitext(file_path)[1].lower() in SQLITE_EXTENSIONS:
+        return open_expense_store(file_path).iter_expenses()
+    return iter_report_expenses(file_path)
+
+
+def scan_merchants(expenses: Iterable[Dict]) -> Tuple[Dict[str, Set[str]], List[str]]:
+    """Collect merchant suggestions and uncategorized merchants in one pass
+
+    Returns:
+        Tuple of (merchant to its non-'other' categories, merchants with an
+        'other' expense in first-seen order)
+    """
     merchants = {}
+    uncategorized = {}
 
     for expense in expenses:
         merchant = expense.get("merchant", "").strip()
@@ -38,30 +58,31 @@ def extract_merchant_suggestions(expenses: List[Dict]) -> Dict[str, Set[str]]:
             if "category" in expense and expense["category"] != "other":
                 merchants[merchant].add(expense["category"])
 
-    return merchants
+        if merchant and expense.get("category") == "other":
+            uncategorized[merchant] = None
+
+    return merchants, list(uncategorized)
+
+
+def extract_merchant_suggestions(expenses: Iterable[Dict]) -> Dict[str, Set[str]]:
+    """Extract unique merchants from expenses and suggest categories"""
+    return scan_merchants(expenses)[0]
 
 
 def update_categories(categories_file: str, expenses_file: str) -> None:
     """Update categories based on expense data"""
     # Load data
     categories = load_json(categories_file)
-    expenses = load_json(expenses_file)
+    try:
+        merchants, uncategorized = scan_merchants(iter_expenses_file(expenses_file))
+    except (OSError, ValueError) as e:
+        print(f"Error loading {expenses_file}: {e}")
+        merchants, uncategorized = {}, []
 
-    if not categories or not expenses:
+    if not categories or not (merchants or uncategorized):
         print("Error: Could not load categories or expenses")
         return
 
-    # Extract merchant information
-    merchants = extract_merchant_suggestions(expenses)
-
-    # Find uncategorized merchants (those with 'other' category)
-    uncategorized = []
-    for expense in expenses:
-        if expense.get("category") == "other":
-            merchant = expense.get("merchant", "").strip()
-            if merchant and merchant not in uncategorized:
-                uncategorized.append(merchant)
-
     # Print statistics
     print(f"Found {len(merchants)} unique merchants")
     print(f"Found {len(uncategorized)} uncategorized merchants")
@@ -103,7 +124,11 @@ def update_categories(categories_file: str, expenses_file: str) -> None:
 def main():
     parser = argparse.ArgumentParser(description="Helper for updating expense categories")
     parser.add_argument("--categories", required=True, help="Path to categories.json file")
-    parser.add_argument("--expenses", required=True, help="Path to expenses.json file")
+    parser.add_argument(
+        "--expenses",
+        required=True,
+        help="Path to expenses file (.db or .json) or saved report (.json, .ndjson, .jsonl, .gz)",
+    )
 
     args = parser.parse_args()
     update_categories(args.categories, args.expenses)
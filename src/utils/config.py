@@ -1,11 +1,22 @@
 import json
+import logging
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 from dotenv import load_dotenv
 
+from src.models.expense import ExpenseBatch
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _env_int(name: str) -> Optional[int]:
+    """Read an optional integer from an environment variable"""
+    value = os.environ.get(name)
+    return int(value) if value else None
+
 
 class Config:
     """Configuration management using environment variables"""
@@ -19,7 +30,24 @@ class Config:
         return {
             # Get values from environment variables or use defaults
             "db_path": os.environ.get("EXPENSE_TRACKER_DB_PATH"),
-            "data_file": os.environ.get("EXPENSE_TRACKER_DATA_FILE", "expenses.json"),
+            # chat.db connection tuning; unset values use MessageDatabase's defaults
+            "db_immutable": os.environ.get("EXPENSE_TRACKER_DB_IMMUTABLE", "").lower()
+            in ("1", "true", "yes"),
+            "db_mmap_size": _env_int("EXPENSE_TRACKER_DB_MMAP_SIZE"),
+            "db_cache_size": _env_int("EXPENSE_TRACKER_DB_CACHE_SIZE"),
+            "db_temp_store": os.environ.get("EXPENSE_TRACKER_DB_TEMP_STORE"),
+            "data_file": os.environ.get("EXPENSE_TRACKER_DATA_FILE", "expenses.db"),
+            "state_file": os.environ.get("EXPENSE_TRACKER_STATE_FILE", "ingest_state.json"),
+            "index_file": os.environ.get("EXPENSE_TRACKER_INDEX_FILE"),
+            "parse_cache_file": os.environ.get(
+                "EXPENSE_TRACKER_PARSE_CACHE_FILE", "parse_cache.db"
+            ),
+            # Canonical merchant names and the raw variants mapped to them
+            "merchants_file": os.environ.get(
+                "EXPENSE_TRACKER_MERCHANTS_FILE", "merchants.db"
+            ),
+            # Distinct merchants tracked exactly for the top merchants lists
+            "top_capacity": _env_int("EXPENSE_TRACKER_TOP_CAPACITY"),
             "categories_file": os.environ.get("EXPENSE_TRACKER_CATEGORIES_FILE",
                                              os.path.join("src", "utils", "categories.json")),
         }
@@ -40,14 +68,86 @@ class ExpenseStore:
         """
         self.data_file = data_file
 
-    def save_expenses(self, expenses: List[Dict[str, Any]]):
+    def save_expenses(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
         """Save expenses to file
 
+        Expenses are written one at a time, so a generator can be saved
+        without holding the whole history in memory. The file is replaced
+        only once everything has been written.
+
         Args:
-            expenses: List of expense dictionaries
+            expenses: Iterable of expense dictionaries or an ExpenseBatch
+
+        Returns:
+            Number of expenses saved
         """
-        with open(self.data_file, "w") as f:
-            json.dump(expenses, f, indent=2)
+        if isinstance(expenses, ExpenseBatch):
+            expenses = expenses.iter_dicts()
+
+        count = 0
+        tmp_file = f"{self.data_file}.tmp"
+
+        try:
+            with open(tmp_file, "w") as f:
+                f.write("[")
+                for expense in expenses:
+                    f.write(",\n  " if count else "\n  ")
+                    f.write(json.dumps(expense))
+                    count += 1
+                f.write("\n]\n" if count else "]\n")
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+        os.replace(tmp_file, self.data_file)
+        return count
+
+    def append_expenses(self, expenses: Union[List[Dict[str, Any]], ExpenseBatch]):
+        """Append expenses to the ones already stored
+
+        Args:
+            expenses: List of expense dictionaries or an ExpenseBatch
+        """
+        if not len(expenses):
+            return
+
+        if isinstance(expenses, ExpenseBatch):
+            expenses = expenses.iter_dicts()
+
+        stored = self.load_expenses()
+        stored.extend(expenses)
+        self.save_expenses(stored)
+
+    def merge_expenses(self, expenses: Union[Iterable[Dict[str, Any]], ExpenseBatch]) -> int:
+        """Append expenses, skipping the ones already stored
+
+        An expense is already stored when one with the same date and
+        message exists; expenses without a message are always appended.
+
+        Args:
+            expenses: Iterable of expense dictionaries or an ExpenseBatch
+
+        Returns:
+            Number of expenses appended
+        """
+        if isinstance(expenses, ExpenseBatch):
+            expenses = expenses.iter_dicts()
+
+        stored = self.load_expenses()
+        seen = {(expense.get("date"), expense.get("message")) for expense in stored}
+        count = len(stored)
+        for expense in expenses:
+            key = (expense.get("date"), expense.get("message", ""))
+            if key[1] and key in seen:
+                continue
+            seen.add(key)
+            stored.append(expense)
+
+        added = len(stored) - count
+        if added:
+            self.save_expenses(stored)
+        return added
 
     def load_expenses(self) -> List[Dict[str, Any]]:
         """Load expenses from file
@@ -63,21 +163,123 @@ class ExpenseStore:
                 return []
         return []
 
-    def update_expense_category(self, index: int, category: str) -> Optional[Dict[str, Any]]:
+    def iter_expenses(self, after_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Iterate over stored expenses
+
+        The JSON file is read whole; this matches SQLiteExpenseStore's interface.
+        The id of an expense is its position in the file, which only
+        changes when all expenses are replaced.
+
+        Args:
+            after_id: Optional id, e.g. from get_last_id, after which to start
+
+        Yields:
+            Expense dictionaries including their id
+        """
+        first = 0 if after_id is None else after_id + 1
+        for expense_id, expense in enumerate(self.load_expenses()[first:], first):
+            yield dict(expense, id=expense_id)
+
+    def get_last_id(self) -> Optional[int]:
+        """Get the id of the most recently stored expense
+
+        Returns:
+            Largest expense id, None if no expenses are stored
+        """
+        count = len(self.load_expenses())
+        return count - 1 if count else None
+
+    def update_expense_category(self, expense_id: int, category: str) -> Optional[Dict[str, Any]]:
         """Update category for a specific expense
 
         Args:
-            index: Index of expense to update
+            expense_id: Expense id, as listed in reports
             category: New category
 
         Returns:
-            Updated expense or None if index is invalid
+            Updated expense or None if no such expense exists
         """
         expenses = self.load_expenses()
 
-        if 0 <= index < len(expenses):
-            expenses[index]["category"] = category
+        if 0 <= expense_id < len(expenses):
+            expenses[expense_id]["category"] = category
             self.save_expenses(expenses)
-            return expenses[index]
+            return dict(expenses[expense_id], id=expense_id)
 
         return None
+
+    def recategorize_merchants(self, changes: Iterable[Tuple[str, str, str]]) -> int:
+        """Move the expenses of merchants from one category to another
+
+        Only expenses still in the old category are moved, so categories set
+        by hand are kept.
+
+        Args:
+            changes: Iterable of (merchant, old category, new category)
+
+        Returns:
+            Number of updated expenses
+        """
+        changes = {merchant: (old, new) for merchant, old, new in changes}
+        if not changes:
+            return 0
+
+        expenses = self.load_expenses()
+        updated = 0
+        for expense in expenses:
+            change = changes.get(expense["merchant"])
+            if change and expense["category"] == change[0]:
+                expense["category"] = change[1]
+                updated += 1
+
+        if updated:
+            self.save_expenses(expenses)
+        return updated
+
+
+class IngestState:
+    """Persisted watermark for incremental ingestion from the message database"""
+
+    def __init__(self, state_file: str = "ingest_state.json"):
+        """Initialize ingest state
+
+        Args:
+            state_file: Path to state file
+        """
+        self.state_file = state_file
+
+    def _load(self) -> Dict[str, Any]:
+        """Load raw state from file"""
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file) as f:
+                    return json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable ingest state {self.state_file}: {e}")
+                return {}
+        return {}
+
+    def get_watermark(self, db_identity: str) -> Optional[int]:
+        """Get the last processed message ROWID for a database
+
+        Args:
+            db_identity: Identity of the message database
+
+        Returns:
+            Last processed ROWID, or None if the stored state belongs to a
+            different database or no state exists yet
+        """
+        state = self._load()
+        if state.get("db_identity") != db_identity:
+            return None
+        return state.get("last_rowid")
+
+    def save_watermark(self, db_identity: str, last_rowid: int):
+        """Persist the last processed message ROWID for a database
+
+        Args:
+            db_identity: Identity of the message database
+            last_rowid: Highest processed ROWID
+        """
+        with open(self.state_file, "w") as f:
+            json.dump({"db_identity": db_identity, "last_rowid": last_rowid}, f, indent=2)
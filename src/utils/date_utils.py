@@ -1,5 +1,60 @@
-from datetime import datetime, timedelta
-from typing import Optional
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Any, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Seconds between the Unix epoch (1970-01-01) and the Mac epoch (2001-01-01)
+MAC_EPOCH_OFFSET = 978307200
+
+NANOSECONDS = 10**9
+MICROSECONDS = 10**6
+
+# chat.db stored dates as seconds since the Mac epoch until macOS 10.13 and
+# as nanoseconds since. Values below this limit are seconds: read as seconds
+# it is the year 5170, read as nanoseconds less than two minutes after 2001.
+SECONDS_RESOLUTION_LIMIT = 10**11
+
+# Range of supported dates in Unix seconds (1970 up to 2106, within which a
+# float of seconds still resolves single microseconds); timestamps outside
+# of it are treated like unset ones
+MIN_UNIX_SECONDS = 0
+MAX_UNIX_SECONDS = 2**32
+
+_MAC_EPOCH_OFFSET_US = MAC_EPOCH_OFFSET * MICROSECONDS
+_MIN_UNIX_US = MIN_UNIX_SECONDS * MICROSECONDS
+_MAX_UNIX_US = MAX_UNIX_SECONDS * MICROSECONDS
+
+# date.toordinal() of the Unix epoch
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# int64 representation of NaT, used for missing dates in microsecond arrays
+NAT = -(2**63)
+
+# Below this many timestamps, converting one by one beats importing numpy
+VECTORIZE_MIN = 16
+
+# SQL expression converting an iMessage date column to whole Unix epoch
+# seconds, NULL for unset dates
+UNIX_SECONDS_SQL = (
+    "(CASE WHEN {date} IS NULL OR {date} = 0 THEN NULL "
+    f"WHEN abs({{date}}) < {SECONDS_RESOLUTION_LIMIT} THEN {{date}} + {MAC_EPOCH_OFFSET} "
+    f"ELSE {{date}} / {NANOSECONDS} + {MAC_EPOCH_OFFSET} END)"
+)
+
+# SQL predicate selecting iMessage dates after a cutoff, with the cutoff in
+# nanoseconds and in legacy seconds as parameters (see imessage_since_params).
+# The raw column is compared directly, so an index on it stays usable.
+IMESSAGE_SINCE_SQL = f"({{date}} > ? OR ({{date}} > ? AND {{date}} < {SECONDS_RESOLUTION_LIMIT}))"
+
+# Integer YYYYMM month and YYYYMMDD day of an ISO date column, 0 for NULL
+MONTH_KEY_SQL = "COALESCE(CAST(substr({date}, 1, 4) || substr({date}, 6, 2) AS INTEGER), 0)"
+DAY_KEY_SQL = (
+    "COALESCE(CAST(substr({date}, 1, 4) || substr({date}, 6, 2) || substr({date}, 9, 2) "
+    "AS INTEGER), 0)"
+)
+
 
 def get_date_threshold(days: int) -> datetime:
     """Get date threshold for filtering
@@ -12,6 +67,7 @@ def get_date_threshold(days: int) -> datetime:
     """
     return datetime.now() - timedelta(days=days)
 
+
 def format_date(date: Optional[datetime]) -> str:
     """Format date for display
 
@@ -26,28 +82,235 @@ def format_date(date: Optional[datetime]) -> str:
 
     return date.strftime("%Y-%m-%d %H:%M")
 
-def convert_imessage_timestamp(timestamp: int) -> Optional[datetime]:
-    """Convert iMessage timestamp to Python datetime
+
+def imessage_since_params(unix_seconds: float) -> Tuple[int, int]:
+    """Get the parameters of IMESSAGE_SINCE_SQL for a cutoff
 
     Args:
-        timestamp: iMessage timestamp (nanoseconds since 2001-01-01)
+        unix_seconds: Cutoff as seconds since the Unix epoch
 
     Returns:
-        Python datetime object
+        Tuple of (cutoff in nanoseconds, cutoff in legacy seconds) since the Mac epoch
+    """
+    mac_seconds = unix_seconds - MAC_EPOCH_OFFSET
+    return int(mac_seconds * NANOSECONDS), int(mac_seconds)
+
+
+def imessage_to_unix_us(timestamp: Optional[int]) -> Optional[int]:
+    """Convert an iMessage timestamp to microseconds since the Unix epoch
+
+    Args:
+        timestamp: Nanoseconds since 2001-01-01, or seconds for legacy
+            timestamps below SECONDS_RESOLUTION_LIMIT
+
+    Returns:
+        Microseconds since 1970-01-01 UTC, or None for unset or out-of-range timestamps
     """
     if not timestamp:
         return None
 
-    # iMessage uses nanoseconds since 2001-01-01
-    # First, convert to seconds
-    timestamp_seconds = timestamp / 1e9
+    timestamp = int(timestamp)
+    if -SECONDS_RESOLUTION_LIMIT < timestamp < SECONDS_RESOLUTION_LIMIT:
+        unix_us = timestamp * MICROSECONDS + _MAC_EPOCH_OFFSET_US
+    else:
+        # Rounded to the nearest microsecond
+        unix_us = (timestamp + 500) // 1000 + _MAC_EPOCH_OFFSET_US
 
-    # Mac Absolute Time epoch starts at 2001-01-01
-    # Unix epoch starts at 1970-01-01
-    # The difference is 978307200 seconds
-    unix_timestamp = timestamp_seconds + 978307200
+    return unix_us if _MIN_UNIX_US <= unix_us < _MAX_UNIX_US else None
+
+
+def convert_imessage_timestamp(timestamp: Optional[int]) -> Optional[datetime]:
+    """Convert iMessage timestamp to Python datetime
 
-    try:
-        return datetime.fromtimestamp(unix_timestamp)
-    except (OSError, ValueError, OverflowError) as e:
+    Args:
+        timestamp: Nanoseconds since 2001-01-01, or seconds for legacy timestamps
+
+    Returns:
+        Naive datetime in local time, or None for unset or out-of-range timestamps
+    """
+    unix_us = imessage_to_unix_us(timestamp)
+    if unix_us is None:
         return None
+
+    # Exact: fromtimestamp rounds to the nearest microsecond
+    return datetime.fromtimestamp(unix_us / MICROSECONDS)
+
+
+def imessage_to_unix_us_array(timestamps: Any) -> "np.ndarray":
+    """Vectorized imessage_to_unix_us
+
+    Args:
+        timestamps: Array-like of iMessage timestamps, 0 for unset ones
+
+    Returns:
+        int64 array of microseconds since the Unix epoch, NAT for unset or
+        out-of-range timestamps
+    """
+    import numpy as np
+
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    unix_us = (timestamps + 500) // 1000 + _MAC_EPOCH_OFFSET_US
+
+    legacy = np.abs(timestamps) < SECONDS_RESOLUTION_LIMIT
+    unix_us[legacy] = timestamps[legacy] * MICROSECONDS + _MAC_EPOCH_OFFSET_US
+
+    valid = (timestamps != 0) & (unix_us >= _MIN_UNIX_US) & (unix_us < _MAX_UNIX_US)
+    unix_us[~valid] = NAT
+    return unix_us
+
+
+def local_offsets(unix_seconds: "np.ndarray") -> "np.ndarray":
+    """Get the UTC offset of the local time zone at each of many instants
+
+    The offset is looked up at the start and end of every distinct UTC day
+    instead of once per instant. Only instants on days with a daylight
+    saving transition are looked up individually.
+
+    Args:
+        unix_seconds: int64 array of seconds since the Unix epoch
+
+    Returns:
+        int64 array of offsets in seconds, to add to UTC to get local time
+    """
+    import numpy as np
+
+    offsets = np.zeros(len(unix_seconds), dtype=np.int64)
+    if not len(unix_seconds):
+        return offsets
+
+    days = unix_seconds // 86400
+    first_day = int(days.min())
+    day_index = days - first_day
+
+    present = np.zeros(int(day_index.max()) + 1, dtype=bool)
+    present[day_index] = True
+
+    day_offsets = np.zeros(len(present), dtype=np.int64)
+    transition_days = np.zeros(len(present), dtype=bool)
+    for index in np.flatnonzero(present).tolist():
+        start = (first_day + index) * 86400
+        start_offset = time.localtime(start).tm_gmtoff
+        day_offsets[index] = start_offset
+        transition_days[index] = time.localtime(start + 86399).tm_gmtoff != start_offset
+
+    offsets = day_offsets[day_index]
+    for position in np.flatnonzero(transition_days[day_index]).tolist():
+        offsets[position] = time.localtime(int(unix_seconds[position])).tm_gmtoff
+    return offsets
+
+
+def imessage_to_local_datetime64(timestamps: Any) -> "np.ndarray":
+    """Convert iMessage timestamps to local wall-clock times in one vectorized pass
+
+    Args:
+        timestamps: Array-like of iMessage timestamps, 0 for unset ones
+
+    Returns:
+        datetime64[us] array of naive local times, NaT for unset or
+        out-of-range timestamps. Its int64 view has the layout of
+        ExpenseBatch.dates.
+    """
+    unix_us = imessage_to_unix_us_array(timestamps)
+    valid = unix_us != NAT
+
+    local_us = unix_us.copy()
+    local_us[valid] += local_offsets(unix_us[valid] // MICROSECONDS) * MICROSECONDS
+    return local_us.view("datetime64[us]")
+
+
+def convert_imessage_timestamps(timestamps: Sequence[Optional[int]]) -> List[Optional[datetime]]:
+    """Convert a batch of iMessage timestamps to Python datetimes
+
+    Gives the same results as convert_imessage_timestamp for every element,
+    converting all of them at once with numpy.
+
+    Args:
+        timestamps: iMessage timestamps, None or 0 for unset ones
+
+    Returns:
+        Naive local datetimes, None for unset or out-of-range timestamps
+    """
+    if len(timestamps) < VECTORIZE_MIN:
+        return [convert_imessage_timestamp(timestamp) for timestamp in timestamps]
+
+    import numpy as np
+
+    values = np.fromiter(
+        (timestamp or 0 for timestamp in timestamps), dtype=np.int64, count=len(timestamps)
+    )
+    # NaT elements become None
+    return imessage_to_local_datetime64(values).tolist()
+
+
+def month_key(date: Optional[datetime]) -> int:
+    """Get the integer YYYYMM month of a date, 0 if there is none"""
+    return date.year * 100 + date.month if date else 0
+
+
+def day_key(date: Optional[datetime]) -> int:
+    """Get the integer YYYYMMDD day of a date, 0 if there is none"""
+    return date.year * 10000 + date.month * 100 + date.day if date else 0
+
+
+def day_keys(dates: "np.ndarray") -> "np.ndarray":
+    """Vectorized day_key
+
+    Keys are computed once per calendar day in the range of the dates and
+    looked up from that table, instead of splitting every date into year,
+    month and day.
+
+    Args:
+        dates: datetime64 array, NaT for missing dates
+
+    Returns:
+        int64 array of YYYYMMDD days, 0 for NaT
+    """
+    import numpy as np
+
+    missing = np.isnat(dates)
+    days = dates.astype("datetime64[D]").astype(np.int64)
+    dated = days[~missing]
+    if not len(dated):
+        return np.zeros(len(dates), dtype=np.int64)
+
+    first_day = dated.min()
+    calendar = np.arange(first_day, dated.max() + 1).astype("datetime64[D]")
+    months = calendar.astype("datetime64[M]")
+    months_since_epoch = months.astype(np.int64)
+    table = (
+        (months_since_epoch // 12 + 1970) * 10000
+        + (months_since_epoch % 12 + 1) * 100
+        + (calendar - months).astype(np.int64)
+        + 1
+    )
+
+    return np.where(missing, 0, table[np.where(missing, 0, days - first_day)])
+
+
+def month_keys(dates: "np.ndarray") -> "np.ndarray":
+    """Vectorized month_key
+
+    Args:
+        dates: datetime64 array, NaT for missing dates
+
+    Returns:
+        int64 array of YYYYMM months, 0 for NaT
+    """
+    return day_keys(dates) // 100
+
+
+def day_key_ordinals(keys: Any) -> "np.ndarray":
+    """Convert YYYYMMDD day keys to day ordinals, the inverse of day_keys
+
+    Args:
+        keys: Array-like of YYYYMMDD days
+
+    Returns:
+        int64 array of proleptic Gregorian ordinals, as returned by date.toordinal()
+    """
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64)
+    months_since_epoch = (keys // 10000 - 1970) * 12 + keys // 100 % 100 - 1
+    month_starts = months_since_epoch.astype("datetime64[M]").astype("datetime64[D]")
+    return month_starts.astype(np.int64) + keys % 100 - 1 + EPOCH_ORDINAL
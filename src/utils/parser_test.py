@@ -9,6 +9,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..",
 
 from src.services.categorizer import ExpenseCategorizer
 from src.services.parser import extract_payment_details
+from src.utils.report import iter_report_expenses
 
 
 def test_parser(message: str) -> None:
@@ -34,13 +35,11 @@ def batch_test(messages_file: str, categories_file: str = None) -> None:
     try:
         categorizer = ExpenseCategorizer(categories_file)
 
-        with open(messages_file, "r") as f:
-            data = json.load(f)
-
         results = []
         success_count = 0
-        for i, item in enumerate(data):
-            message = item.get("text", "")
+        # Messages are streamed from NDJSON files; saved reports hold them as "message"
+        for i, item in enumerate(iter_report_expenses(messages_file)):
+            message = item.get("text") or item.get("message", "")
             details = extract_payment_details(message)
 
             # Only process payment messages that have an amount
@@ -89,7 +88,7 @@ def main():
 
     # Batch test
     batch_parser = subparsers.add_parser("batch", help="Test batch of messages from file")
-    batch_parser.add_argument("file", help="JSON file with messages")
+    batch_parser.add_argument("file", help="JSON or NDJSON file with messages, or a saved report")
     batch_parser.add_argument("--categories", help="Path to categories.json file")
 
     args = parser.parse_args()
@@ -0,0 +1,348 @@
+import cProfile
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+from tabulate import tabulate
+
+T = TypeVar("T")
+
+
+@dataclass
+class StageStats:
+    """Measurements collected for one named pipeline stage
+
+    `wall` and `cpu` include time spent in nested stages; `self_wall` and
+    `self_cpu` exclude it, so the self times of all stages add up to the
+    profiled total.
+    """
+
+    name: str
+    calls: int = 0
+    wall: float = 0.0
+    self_wall: float = 0.0
+    cpu: float = 0.0
+    self_cpu: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    peak_memory: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert stage stats to dictionary"""
+        return asdict(self)
+
+
+class _Frame:
+    """Bookkeeping for one running stage call"""
+
+    __slots__ = ("stats", "wall", "cpu", "child_wall", "child_cpu", "peak")
+
+    def __init__(self, stats: StageStats, peak: int):
+        self.stats = stats
+        self.peak = peak
+        self.child_wall = 0.0
+        self.child_cpu = 0.0
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+
+
+class Profiler:
+    """Per-stage wall time, CPU time, row counts and peak memory
+
+    Stages are recorded through `stage()` (a block of code), `iter_stage()`
+    (time spent producing the items of an iterable) and `wrap()` (calls to a
+    function). Stages may nest and interleave, e.g. a lazily consumed
+    generator chain; time is attributed to the innermost running stage.
+
+    Used as a context manager, the profiler also becomes the active one, so
+    the module-level `stage()`, `iter_stage()` and `wrap()` hooks in library
+    code report to it:
+
+        with Profiler(trace_memory=True) as profiler:
+            run_pipeline()
+        print(profiler.format_table())
+    """
+
+    def __init__(
+        self,
+        trace_memory: bool = False,
+        profile_stage: Optional[str] = None,
+        profile_file: Optional[str] = None,
+    ):
+        """Initialize profiler
+
+        Args:
+            trace_memory: Whether to track peak memory with tracemalloc; this
+                slows down allocation-heavy code several times, which also
+                inflates the timings
+            profile_stage: Optional stage to run under cProfile
+            profile_file: Where to dump the pstats file of the profiled stage;
+                defaults to "<stage>.prof"
+        """
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.profile_file = profile_file or (f"{profile_stage}.prof" if profile_stage else None)
+
+        self.stages: Dict[str, StageStats] = {}
+        self.total: Optional[StageStats] = None
+        self._stack: List[_Frame] = []
+        self._started_tracing = False
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._cprofile_depth = 0
+        self._previous: Optional["Profiler"] = None
+
+    def start(self):
+        """Start measuring and make this the active profiler"""
+        global _active
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        if self.profile_stage:
+            self._cprofile = cProfile.Profile()
+
+        self._previous = _active
+        _active = self
+        self.total = StageStats("total")
+        self._begin(self.total)
+
+    def stop(self):
+        """Stop measuring, restore the previous active profiler and write the pstats dump"""
+        global _active
+
+        # Close stages left open by an exception, then the total
+        while self._stack:
+            self._end(self._stack[-1].stats)
+
+        _active = self._previous
+        self._previous = None
+
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.profile_file)
+            self._cprofile = None
+
+    def __enter__(self) -> "Profiler":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def _get(self, name: str) -> StageStats:
+        """Get the stats of a stage, creating them on first use"""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats(name)
+        return stats
+
+    def _begin(self, stats: StageStats):
+        """Push a frame for a stage call"""
+        peak = 0
+        if tracemalloc.is_tracing():
+            # Fold the peak so far into the running stages before resetting it
+            _, peak = tracemalloc.get_traced_memory()
+            for frame in self._stack:
+                if peak > frame.peak:
+                    frame.peak = peak
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            peak, _ = tracemalloc.get_traced_memory()
+
+        self._stack.append(_Frame(stats, peak))
+
+        if self._cprofile is not None and stats.name == self.profile_stage:
+            if self._cprofile_depth == 0:
+                self._cprofile.enable()
+            self._cprofile_depth += 1
+
+    def _end(self, stats: StageStats):
+        """Pop the frame of a stage call and record its measurements"""
+        if self._cprofile is not None and stats.name == self.profile_stage:
+            self._cprofile_depth -= 1
+            if self._cprofile_depth == 0:
+                self._cprofile.disable()
+
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        frame = self._stack.pop()
+        wall -= frame.wall
+        cpu -= frame.cpu
+        parent = self._stack[-1] if self._stack else None
+
+        stats.calls += 1
+        stats.wall += wall
+        stats.cpu += cpu
+        stats.self_wall += wall - frame.child_wall
+        stats.self_cpu += cpu - frame.child_cpu
+
+        if tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame.peak)
+            stats.peak_memory = max(stats.peak_memory or 0, peak)
+            if parent is not None and peak > parent.peak:
+                parent.peak = peak
+
+        if parent is not None:
+            parent.child_wall += wall
+            parent.child_cpu += cpu
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = 0) -> Iterator[StageStats]:
+        """Measure a block of code as a stage
+
+        Args:
+            name: Stage name
+            rows_in: Number of rows the stage consumes
+
+        Yields:
+            The stage stats, so the block can set `rows_out`
+        """
+        stats = self._get(name)
+        stats.rows_in += rows_in
+        self._begin(stats)
+        try:
+            yield stats
+        finally:
+            self._end(stats)
+
+    def iter_stage(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Measure the time spent producing the items of an iterable
+
+        Args:
+            name: Stage name
+            iterable: Iterable to wrap; each item counts as an output row
+
+        Yields:
+            The items of the iterable
+        """
+        stats = self._get(name)
+        iterator = iter(iterable)
+
+        while True:
+            self._begin(stats)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._end(stats)
+            stats.rows_out += 1
+            yield item
+
+    def wrap(self, name: str, func: Callable[..., T]) -> Callable[..., T]:
+        """Measure every call of a function as a stage
+
+        Args:
+            name: Stage name
+            func: Function to wrap; each call counts as one row in and out
+
+        Returns:
+            Wrapped function
+        """
+        stats = self._get(name)
+
+        def wrapper(*args, **kwargs):
+            self._begin(stats)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._end(stats)
+                stats.rows_in += 1
+                stats.rows_out += 1
+
+        return wrapper
+
+    def results(self) -> List[Dict[str, Any]]:
+        """Get the stats of every stage in first-use order, followed by the total"""
+        results = [stats.to_dict() for stats in self.stages.values()]
+        if self.total is not None:
+            results.append(self.total.to_dict())
+        return results
+
+    def to_json(self) -> str:
+        """Format the results as JSON"""
+        return json.dumps(
+            {"stages": self.results(), "profile_file": self.profile_file}, indent=2
+        )
+
+    def format_table(self) -> str:
+        """Format the results as a table"""
+        rows = [
+            [
+                stats["name"],
+                stats["calls"],
+                f"{stats['wall']:.3f}",
+                f"{stats['self_wall']:.3f}",
+                f"{stats['cpu']:.3f}",
+                stats["rows_in"] or "",
+                stats["rows_out"] or "",
+                f"{stats['peak_memory'] / 2**20:.1f}" if stats["peak_memory"] else "",
+            ]
+            for stats in self.results()
+        ]
+        return tabulate(
+            rows,
+            headers=[
+                "Stage",
+                "Calls",
+                "Wall s",
+                "Self s",
+                "CPU s",
+                "Rows in",
+                "Rows out",
+                "Peak MB",
+            ],
+            tablefmt="grid",
+            disable_numparse=True,
+        )
+
+
+# Profiler the module-level hooks report to, set while a profiler is running
+_active: Optional[Profiler] = None
+
+
+def get_active() -> Optional[Profiler]:
+    """Get the running profiler, if any"""
+    return _active
+
+
+@contextmanager
+def stage(name: str, rows_in: int = 0) -> Iterator[StageStats]:
+    """Measure a block of code with the active profiler, if any
+
+    Args:
+        name: Stage name
+        rows_in: Number of rows the stage consumes
+
+    Yields:
+        The stage stats (a detached instance when no profiler is running)
+    """
+    if _active is None:
+        yield StageStats(name, rows_in=rows_in)
+        return
+
+    with _active.stage(name, rows_in) as stats:
+        yield stats
+
+
+def iter_stage(name: str, iterable: Iterable[T]) -> Iterable[T]:
+    """Measure an iterable with the active profiler; returns it unchanged when none is running"""
+    if _active is None:
+        return iterable
+    return _active.iter_stage(name, iterable)
+
+
+def wrap(name: str, func: Callable[..., T]) -> Callable[..., T]:
+    """Measure a function with the active profiler; returns it unchanged when none is running"""
+    if _active is None:
+        return func
+    return _active.wrap(name, func)
@@ -0,0 +1,158 @@
+import gzip
+import json
+import os
+from typing import IO, Any, Dict, Iterable, Iterator, Optional, Tuple
+
+# File extensions of newline-delimited JSON reports, optionally followed by .gz
+NDJSON_EXTENSIONS = (".ndjson", ".jsonl")
+
+# Type of the record closing an NDJSON report, written compactly with the type first
+TRAILER_TYPE = "analytics"
+_TRAILER_PREFIX = f'{{"type":"{TRAILER_TYPE}"'
+
+
+def _split_compression(path: str) -> Tuple[str, bool]:
+    """Get a report path without a trailing .gz and whether it had one"""
+    if path.lower().endswith(".gz"):
+        return path[:-3], True
+    return path, False
+
+
+def is_ndjson_report(path: str) -> bool:
+    """Check whether a report path selects the newline-delimited JSON format"""
+    base, _ = _split_compression(path)
+    return os.path.splitext(base)[1].lower() in NDJSON_EXTENSIONS
+
+
+def _open(path: str, mode: str, compressed: bool) -> IO[str]:
+    """Open a report file as text, through gzip if compressed"""
+    if compressed:
+        return gzip.open(path, f"{mode}t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _indented(value: Any, level: int) -> str:
+    """json.dumps with indent=2, as nested `level` deep in an indented document"""
+    # Strings escape their newlines, so every newline is indentation
+    return json.dumps(value, indent=2).replace("\n", "\n" + "  " * level)
+
+
+def _write_json(f: IO[str], analytics: Dict[str, Any], expenses: Iterable[Dict[str, Any]]) -> int:
+    """Write a report as one JSON document, an expense at a time
+
+    The output is the same as json.dump({"analytics": ..., "expenses": [...]},
+    indent=2), without building the expense list first.
+    """
+    f.write('{\n  "analytics": ')
+    f.write(_indented(analytics, 1))
+    f.write(',\n  "expenses": [')
+
+    count = 0
+    for expense in expenses:
+        f.write(",\n    " if count else "\n    ")
+        f.write(_indented(expense, 2))
+        count += 1
+
+    f.write("\n  ]\n}" if count else "]\n}")
+    return count
+
+
+def _write_ndjson(f: IO[str], analytics: Dict[str, Any], expenses: Iterable[Dict[str, Any]]) -> int:
+    """Write a report with one compact JSON expense per line and an analytics trailer"""
+    count = 0
+    for expense in expenses:
+        f.write(json.dumps(expense, separators=(",", ":")))
+        f.write("\n")
+        count += 1
+
+    trailer = {"type": TRAILER_TYPE, "expense_count": count, "analytics": analytics}
+    f.write(json.dumps(trailer, separators=(",", ":")))
+    f.write("\n")
+    return count
+
+
+def write_report(path: str, analytics: Dict[str, Any], expenses: Iterable[Dict[str, Any]]) -> int:
+    """Save a report, streaming the expenses to the file
+
+    Paths ending in .ndjson or .jsonl get one compact expense per line,
+    followed by a trailer record of type "analytics". Any other path gets
+    a single indented JSON document with "analytics" and "expenses" keys.
+    A further .gz extension compresses either format. The file is replaced
+    only once everything has been written.
+
+    Args:
+        path: Report file path
+        analytics: Analytics results
+        expenses: Iterable of expense dictionaries, consumed once
+
+    Returns:
+        Number of expenses written
+    """
+    _, compressed = _split_compression(path)
+    write = _write_ndjson if is_ndjson_report(path) else _write_json
+    tmp_file = f"{path}.tmp"
+
+    try:
+        with _open(tmp_file, "w", compressed) as f:
+            count = write(f, analytics, expenses)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+    os.replace(tmp_file, path)
+    return count
+
+
+def iter_report_expenses(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream the expenses of a saved report
+
+    NDJSON reports are read a line at a time. JSON documents (reports or
+    plain expense lists) have to be loaded whole.
+
+    Args:
+        path: Report file path, optionally ending in .gz
+
+    Yields:
+        Expense dictionaries, in file order
+    """
+    _, compressed = _split_compression(path)
+
+    with _open(path, "r", compressed) as f:
+        if not is_ndjson_report(path):
+            data = json.load(f)
+            yield from data["expenses"] if isinstance(data, dict) else data
+            return
+
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") != TRAILER_TYPE:
+                yield record
+
+
+def load_report_analytics(path: str) -> Optional[Dict[str, Any]]:
+    """Read the analytics of a saved report
+
+    Only the trailer line of an NDJSON report is decoded.
+
+    Args:
+        path: Report file path, optionally ending in .gz
+
+    Returns:
+        Analytics results, or None for a plain expense list or an NDJSON
+        report without a trailer (e.g. one cut short while being written)
+    """
+    _, compressed = _split_compression(path)
+
+    with _open(path, "r", compressed) as f:
+        if not is_ndjson_report(path):
+            data = json.load(f)
+            return data.get("analytics") if isinstance(data, dict) else None
+
+        for line in f:
+            if line.startswith(_TRAILER_PREFIX):
+                return json.loads(line)["analytics"]
+
+    return None
@@ -0,0 +1,257 @@
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import date, datetime, timezone
+from itertools import accumulate
+from typing import Dict, List, Optional
+
+# Add the parent directory to path so we can import our modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from src.utils.date_utils import MAC_EPOCH_OFFSET
+
+# Default share of each message kind
+DEFAULT_MIX = {"payment": 0.25, "transfer": 0.05, "income": 0.03, "refund": 0.02, "noise": 0.65}
+
+# Subset of the iMessage schema used by the expense tracker
+SCHEMA = """
+CREATE TABLE handle (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+    id TEXT NOT NULL,
+    service TEXT NOT NULL
+);
+CREATE TABLE message (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT,
+    guid TEXT UNIQUE NOT NULL,
+    text TEXT,
+    handle_id INTEGER DEFAULT 0,
+    service TEXT,
+    date INTEGER,
+    date_read INTEGER,
+    is_from_me INTEGER DEFAULT 0,
+    is_read INTEGER DEFAULT 0
+);
+CREATE INDEX message_idx_handle ON message(handle_id, date);
+CREATE TABLE _SqliteDatabaseProperties (
+    key TEXT,
+    value TEXT,
+    UNIQUE (key)
+);
+"""
+
+PEOPLE = [
+    "JOHN SMITH", "MARIA IVANOVA", "AHMED KHAN", "LI WEI", "SARA LOPEZ",
+    "OMAR FAROUK", "ANNA MUELLER", "RAVI PATEL", "ELENA PETROVA", "DAVID COHEN",
+]
+
+NOISE = [
+    "Your OTP for login is {code}. Do not share it with anyone.",
+    "Hey, are we still meeting tomorrow?",
+    "Get 20% cashback up to AED 100 on dining this weekend!",
+    "Your card ending {card} statement is now available.",
+    "Running 10 minutes late, sorry",
+    "Your appointment is confirmed for {code}.",
+    "Thanks! See you soon",
+]
+
+
+def merchant_names(count: int, categories_file: Optional[str] = None) -> List[str]:
+    """Build a list of merchant names, most popular first
+
+    Keywords from the categories file are used first (uppercased, some with a
+    branch suffix) so realistic shares of merchants get categorized; the rest
+    are generic store names.
+
+    Args:
+        count: Number of merchants
+        categories_file: Optional categories.json to take merchant names from
+    """
+    names = []
+    if categories_file and os.path.exists(categories_file):
+        with open(categories_file) as f:
+            categories = json.load(f)
+        rng = random.Random(7)
+        for keywords in categories.values():
+            for keyword in keywords:
+                suffix = rng.choice(["", "", " LLC", " DMCC", " BR 2", " MOE"])
+                names.append(f"{keyword.upper()}{suffix}")
+        random.Random(11).shuffle(names)
+
+    names = names[:count]
+    names.extend(f"STORE {index} DUBAI" for index in range(len(names), count))
+    return names
+
+
+def zipf_weights(count: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..count"""
+    return list(accumulate(1.0 / rank**exponent for rank in range(1, count + 1)))
+
+
+def _midnight(day: date) -> float:
+    """Unix timestamp of midnight UTC at the start of `day`"""
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def generate_chat_db(
+    path: str,
+    messages: int,
+    mix: Optional[Dict[str, float]] = None,
+    merchants: int = 500,
+    zipf_exponent: float = 1.1,
+    days: int = 3 * 365,
+    categories_file: Optional[str] = None,
+    seed: int = 42,
+    append: bool = False,
+    end_date: Optional[date] = None,
+) -> Dict[str, int]:
+    """Write a synthetic iMessage database with banking notifications
+
+    Messages are spread evenly over the `days` days before midnight (UTC) of
+    `end_date` in ROWID order, like a real chat.db that only ever appends. The
+    same seed and end date always give the same database. With `append`,
+    messages are added to an existing database instead, dated now (or just
+    before `end_date` if given), as if they just arrived.
+
+    Args:
+        path: Output SQLite file; replaced if it exists
+        messages: Number of messages to generate
+        mix: Share of payment, transfer, income, refund and noise messages
+        merchants: Number of distinct merchants
+        zipf_exponent: Exponent of the Zipfian merchant popularity distribution
+        days: Number of days of history
+        categories_file: Optional categories.json to take merchant names from
+        seed: Random seed
+        append: Whether to add messages to an existing database
+        end_date: Day the history ends on; today if not given
+
+    Returns:
+        Number of generated messages per kind
+    """
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    kind_weights = list(accumulate(mix[kind] for kind in kinds))
+
+    names = merchant_names(merchants, categories_file)
+    name_weights = zipf_weights(len(names), zipf_exponent)
+
+    if append and os.path.exists(path):
+        conn = sqlite3.connect(path)
+        (first_index,) = conn.execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()
+        # One millisecond apart, ending now or at the end date
+        end_mac = (_midnight(end_date) if end_date else time.time()) - MAC_EPOCH_OFFSET
+        step = 0.001
+        start_mac = end_mac - messages * step
+    else:
+        if os.path.exists(path):
+            os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        conn.execute("INSERT INTO handle (id, service) VALUES ('BANK', 'SMS')")
+        conn.execute(
+            "INSERT INTO _SqliteDatabaseProperties (key, value) VALUES ('_UniqueIdentifier', ?)",
+            (str(uuid.UUID(int=random.Random(seed).getrandbits(128), version=4)).upper(),),
+        )
+        first_index = 0
+        end_mac = _midnight(end_date or datetime.now(timezone.utc).date()) - MAC_EPOCH_OFFSET
+        start_mac = end_mac - days * 86400
+        step = (end_mac - start_mac) / max(messages, 1)
+
+    # Appended batches get their own random sequence
+    rng = random.Random(seed + first_index)
+    counts = {kind: 0 for kind in kinds}
+
+    def rows():
+        for index in range(messages):
+            kind = rng.choices(kinds, cum_weights=kind_weights)[0]
+            counts[kind] += 1
+            merchant = rng.choices(names, cum_weights=name_weights)[0]
+            card = rng.randint(1000, 9999)
+
+            if kind == "payment":
+                amount = round(rng.lognormvariate(3.5, 1.0), 2)
+                text = (
+                    f"Payment of AED {amount} was done at {merchant} "
+                    f"using your card ending {card}."
+                )
+            elif kind == "transfer":
+                amount = round(rng.uniform(100, 10000), 2)
+                text = (
+                    f"Your local transfer of AED {amount:,.2f} to {rng.choice(PEOPLE)} "
+                    f"from account ending {card} has been processed."
+                )
+            elif kind == "income":
+                amount = round(rng.uniform(500, 30000), 2)
+                text = (
+                    f"AED {amount:,.2f} sent by {rng.choice(PEOPLE)} "
+                    f"and credited to your account ending {card}."
+                )
+            elif kind == "refund":
+                amount = round(rng.lognormvariate(3.0, 1.0), 2)
+                text = f"AED {amount} from {merchant} has been refunded to your card ending {card}."
+            else:
+                text = rng.choice(NOISE).format(code=rng.randint(100000, 999999), card=card)
+
+            date = int((start_mac + index * step) * 1e9)
+            yield (f"SYN-{seed}-{first_index + index}", text, 1, "SMS", date, date, 0, 1)
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO message (guid, text, handle_id, service, date, date_read, is_from_me, "
+            "is_read) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            rows(),
+        )
+    conn.close()
+
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic iMessage chat.db")
+    parser.add_argument("output", help="Path of the SQLite file to write")
+    parser.add_argument("--messages", type=int, default=100_000, help="Number of messages")
+    parser.add_argument("--merchants", type=int, default=500, help="Number of distinct merchants")
+    parser.add_argument(
+        "--zipf", type=float, default=1.1, help="Zipf exponent of merchant popularity"
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="Add messages dated now to an existing database instead of replacing it",
+    )
+    parser.add_argument("--days", type=int, default=3 * 365, help="Days of history")
+    parser.add_argument(
+        "--mix",
+        help="JSON object with shares of payment, transfer, income, refund and noise messages",
+    )
+    parser.add_argument("--categories", help="categories.json to take merchant names from")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed")
+    parser.add_argument(
+        "--end-date",
+        type=date.fromisoformat,
+        help="Day the history ends on (YYYY-MM-DD), today if not given",
+    )
+
+    args = parser.parse_args()
+
+    counts = generate_chat_db(
+        args.output,
+        args.messages,
+        mix=json.loads(args.mix) if args.mix else None,
+        merchants=args.merchants,
+        zipf_exponent=args.zipf,
+        days=args.days,
+        categories_file=args.categories,
+        seed=args.seed,
+        append=args.append,
+        end_date=args.end_date,
+    )
+    print(f"Wrote {args.messages} messages to {args.output}: {counts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.expense import Expense
+from src.services.analytics import ExpenseAggregator, ExpenseAnalyzer
+
+
+def _expenses(count, merchants, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    return [
+        Expense(
+            amount=round(rng.lognormvariate(4, 1), 2),
+            merchant=f"Merchant {int(rng.paretovariate(1.2)) % merchants}",
+            category=rng.choice(["groceries", "dining", "transport"]),
+            date=start + timedelta(hours=7 * i),
+            message=f"message {i}",
+            is_income=rng.random() < 0.1,
+        )
+        for i in range(count)
+    ]
+
+
+def _aggregate(expenses, capacity=None):
+    aggregator = ExpenseAggregator(top_capacity=capacity)
+    aggregator.add_all(expenses)
+    return aggregator.result()
+
+
+def test_analyzer_matches_aggregator():
+    expenses = _expenses(2000, 300)
+    analytics = ExpenseAnalyzer().analyze(expenses)
+    aggregated = _aggregate(expenses)
+
+    for section in ("top_merchants", "top_income_sources", "category_totals"):
+        assert analytics[section] == pytest.approx(aggregated[section])
+    assert list(analytics["top_merchants"]) == list(aggregated["top_merchants"])
+    assert "top_merchants_error" not in analytics
+
+
+def test_analyzer_bounds_merchants_like_aggregator():
+    expenses = _expenses(3000, 2000, seed=1)
+    analytics = ExpenseAnalyzer(top_capacity=50).analyze(expenses)
+
+    exact = ExpenseAnalyzer().analyze(expenses)["top_merchants"]
+    spent = sum(e.amount for e in expenses if not e.is_income)
+    assert analytics["top_merchants_error"]
+    for merchant, total in analytics["top_merchants"].items():
+        error = analytics["top_merchants_error"][merchant]
+        assert error <= spent / 50
+        if merchant in exact:
+            assert exact[merchant] <= total <= exact[merchant] + error + 1e-6
+    assert analytics["distributions"]["merchants"] == {}
@@ -0,0 +1,45 @@
+import pytest
+
+from src.db.expense_store import SQLiteExpenseStore
+from src.utils.config import ExpenseStore
+
+
+def _expense(i, category="other"):
+    return {
+        "amount": 10.0 + i,
+        "merchant": f"Merchant {i}",
+        "category": category,
+        "date": f"2025-01-{i + 1:02d}T12:00:00",
+        "message": f"message {i}",
+        "is_income": False,
+    }
+
+
+@pytest.fixture(params=["expenses.db", "expenses.json"])
+def store(request, tmp_path):
+    path = str(tmp_path / request.param)
+    return SQLiteExpenseStore(path) if path.endswith(".db") else ExpenseStore(path)
+
+
+def test_update_expense_category_by_id(store):
+    assert store.get_last_id() is None
+    store.save_expenses([_expense(i) for i in range(5)])
+    ids = [expense["id"] for expense in store.iter_expenses()]
+
+    last_id = store.get_last_id()
+    store.append_expenses([_expense(i) for i in range(5, 8)])
+    assert [e["id"] for e in store.iter_expenses()][:5] == ids
+    assert [e["merchant"] for e in store.iter_expenses(after_id=last_id)] == [
+        "Merchant 5",
+        "Merchant 6",
+        "Merchant 7",
+    ]
+
+    updated = store.update_expense_category(ids[3], "dining")
+    assert updated["id"] == ids[3]
+    assert updated["merchant"] == "Merchant 3"
+    expected = ["other"] * 8
+    expected[3] = "dining"
+    assert [e["category"] for e in store.iter_expenses()] == expected
+
+    assert store.update_expense_category(store.get_last_id() + 1, "dining") is None
@@ -0,0 +1,114 @@
+import sqlite3
+
+from src.db.data_source import MessageDatabase
+from src.db.expense_store import SQLiteExpenseStore
+from src.main import ingest_new_messages, main
+from src.services.categorizer import ExpenseCategorizer
+from src.utils.config import ExpenseStore, IngestState
+from src.utils.synthetic_chatdb import generate_chat_db
+
+
+def _stored(store):
+    """Stored expenses without their ids, in a comparable order"""
+    rows = [
+        (e.get("date"), e["message"], e["amount"], e["merchant"], e["category"], e["is_income"])
+        for e in store.iter_expenses()
+    ]
+    return sorted(rows, key=repr)
+
+
+def _ingest(db_path, store, state, days=None):
+    return ingest_new_messages(
+        MessageDatabase(db_path), ExpenseCategorizer(), store, state, days=days, quiet=True
+    )
+
+
+def test_incremental_append_matches_full_import(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 400, days=60, seed=1)
+
+    store = SQLiteExpenseStore(str(tmp_path / "expenses.db"))
+    state = IngestState(str(tmp_path / "state.json"))
+    first = _ingest(chat_db, store, state)
+    assert first
+
+    generate_chat_db(chat_db, 100, seed=2, append=True)
+    added = _ingest(chat_db, store, state)
+    assert added
+    assert not _ingest(chat_db, store, state)
+
+    full = SQLiteExpenseStore(str(tmp_path / "full.db"))
+    _ingest(chat_db, full, IngestState(str(tmp_path / "full_state.json")))
+
+    assert _stored(store) == _stored(full)
+    assert len(_stored(store)) == len(first) + len(added)
+
+
+def test_reimport_without_watermark_keeps_history(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 300, days=60, seed=3)
+
+    for store in (
+        SQLiteExpenseStore(str(tmp_path / "expenses.db")),
+        ExpenseStore(str(tmp_path / "expenses.json")),
+    ):
+        state_file = tmp_path / f"state_{type(store).__name__}.json"
+        state = IngestState(str(state_file))
+        _ingest(chat_db, store, state)
+        expected = _stored(store)
+
+        # A lost or corrupt state file imports the --days window again,
+        # keeping the older history and adding no duplicates
+        state_file.write_text("{not json")
+        assert state.get_watermark(MessageDatabase(chat_db).get_identity()) is None
+        assert not _ingest(chat_db, store, state, days=10)
+        assert _stored(store) == expected
+
+        state_file.unlink()
+        _ingest(chat_db, store, state, days=10)
+        assert _stored(store) == expected
+
+
+def test_identity_survives_deleted_messages(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 200, days=60, seed=4)
+    identity = MessageDatabase(chat_db).get_identity()
+
+    conn = sqlite3.connect(chat_db)
+    with conn:
+        conn.execute("DELETE FROM message WHERE ROWID <= 50")
+    conn.close()
+
+    assert MessageDatabase(chat_db).get_identity() == identity
+
+    other = str(tmp_path / "other.db")
+    generate_chat_db(other, 200, days=60, seed=7)
+    assert MessageDatabase(other).get_identity() != identity
+
+
+def _run_main(monkeypatch, tmp_path, *argv):
+    for name, file_name in (
+        ("DATA_FILE", "expenses.db"),
+        ("STATE_FILE", "state.json"),
+        ("PARSE_CACHE_FILE", "parse_cache.db"),
+        ("MERCHANTS_FILE", "merchants.db"),
+    ):
+        monkeypatch.setenv(f"EXPENSE_TRACKER_{name}", str(tmp_path / file_name))
+    monkeypatch.setenv("EXPENSE_TRACKER_DB_PATH", str(tmp_path / "chat.db"))
+    monkeypatch.setattr("sys.argv", ["expense-tracker", *argv])
+    assert main() in (0, None)
+
+
+def test_default_run_keeps_stored_history(monkeypatch, tmp_path, capsys):
+    generate_chat_db(str(tmp_path / "chat.db"), 600, days=365, seed=6)
+    _run_main(monkeypatch, tmp_path, "--incremental", "--days", "3650")
+    store = SQLiteExpenseStore(str(tmp_path / "expenses.db"))
+    before = {e["id"]: e for e in store.iter_expenses()}
+    expense_id = next(iter(before))
+    _run_main(monkeypatch, tmp_path, "--id", str(expense_id), "--category", "dining")
+
+    # A narrower window neither drops the older history nor renumbers it
+    _run_main(monkeypatch, tmp_path, "--days", "30")
+    after = {e["id"]: e for e in store.iter_expenses()}
+    assert after.keys() == before.keys()
+    assert after[expense_id]["category"] == "dining"
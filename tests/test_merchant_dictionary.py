@@ -0,0 +1,28 @@
+import os
+
+from src.db.merchant_dictionary import MerchantDictionary
+
+
+def test_read_only_copy_leaves_file_unchanged(tmp_path):
+    path = str(tmp_path / "merchants.db")
+
+    missing = MerchantDictionary(path, read_only=True)
+    assert missing.canonicalize("Carrefour - MOE - 2") == "Carrefour MOE"
+    missing.close()
+    assert not os.path.exists(path)
+
+    writer = MerchantDictionary(path)
+    writer.intern("Carrefour - MOE - 2")
+    writer.close()
+    size = os.path.getsize(path)
+
+    reader = MerchantDictionary(path, read_only=True)
+    assert reader.intern("CARREFOUR MOE #3") == 0
+    assert reader.intern("Lulu") == 1
+    reader.close()
+    assert os.path.getsize(path) == size
+
+    writer = MerchantDictionary(path)
+    assert len(writer) == 1
+    assert writer.alias_count == 1
+    writer.close()
@@ -0,0 +1,58 @@
+import pytest
+
+from src.db.expense_store import SQLiteExpenseStore
+from src.db.merchant_dictionary import MerchantDictionary
+from src.services.merchants import canonical_merchant, canonicalize_stored_merchants
+
+
+@pytest.mark.parametrize(
+    "raw, canonical",
+    [
+        ("Carrefour - MOE - 2", "Carrefour MOE"),
+        ("Carrefour MOE-2", "Carrefour MOE"),
+        ("Lulu #4", "Lulu"),
+        ("Mall Br. 12", "Mall"),
+        ("  CARREFOUR   MOE ", "CARREFOUR MOE"),
+        ("Studio 54", "Studio 54"),
+        ("Cafe 21", "Cafe 21"),
+        ("GATE 7", "GATE 7"),
+        ("ZARA 1234", "ZARA 1234"),
+        ("12345", "12345"),
+        ("H&M", "H&M"),
+    ],
+)
+def test_canonical_merchant(raw, canonical):
+    assert canonical_merchant(raw) == canonical
+
+
+def _expense(merchant, message, category="other"):
+    return {
+        "amount": 25.0,
+        "merchant": merchant,
+        "category": category,
+        "date": "2025-03-01T10:00:00",
+        "message": message,
+        "is_income": False,
+    }
+
+
+def test_canonicalize_stored_merchants_splits_merged_names(tmp_path):
+    store = SQLiteExpenseStore(str(tmp_path / "expenses.db"))
+    store.save_expenses(
+        [
+            # Merged by the earlier rule that dropped every trailing number
+            _expense("Studio", "Payment of AED 25 was done at Studio 54 using your card 1234"),
+            _expense("Lulu #4", "Payment of AED 25 was done at Lulu #4 using your card 1234"),
+            _expense("Cafe - 2", "", category="dining"),
+        ]
+    )
+
+    merchants = MerchantDictionary(str(tmp_path / "merchants.db"))
+    assert canonicalize_stored_merchants(store, merchants) == 3
+    assert [(e["merchant"], e["category"]) for e in store.iter_expenses()] == [
+        ("Studio 54", "other"),
+        ("Lulu", "other"),
+        ("Cafe", "dining"),
+    ]
+    assert store.verify_rollups() == []
+    assert canonicalize_stored_merchants(store, merchants) == 0
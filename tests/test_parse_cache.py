@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from src.db.data_source import MessageDatabase
+from src.db.parse_cache import ParseCache
+from src.services import parser
+from src.services.parser import parse_messages
+from src.utils.synthetic_chatdb import generate_chat_db
+
+
+@pytest.fixture
+def messages(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 300, days=60, seed=12)
+    return MessageDatabase(chat_db).fetch_payment_messages()
+
+
+def _parse(cache_file, messages):
+    cache = ParseCache(cache_file)
+    try:
+        return list(cache.iter_parsed(messages)), cache.cache_info()
+    finally:
+        cache.close()
+
+
+def test_cached_results_match_a_fresh_parse(tmp_path, messages):
+    cache_file = str(tmp_path / "parse_cache.db")
+
+    first, info = _parse(cache_file, messages)
+    assert info == {"hits": 0, "misses": len(messages)}
+
+    second, info = _parse(cache_file, messages)
+    assert info == {"hits": len(messages), "misses": 0}
+    assert first == second == parse_messages(messages)
+
+
+def test_changed_message_at_the_same_rowid_is_parsed_again(tmp_path, messages):
+    cache_file = str(tmp_path / "parse_cache.db")
+    _parse(cache_file, messages)
+
+    changed = dict(messages[0], text="Payment of AED 12.50 was done at Noon using your card 1234")
+    results, info = _parse(cache_file, [changed, *messages[1:]])
+    assert info == {"hits": len(messages) - 1, "misses": 1}
+    assert results[0][1]["amount"] == 12.5
+
+
+def test_parser_revision_change_clears_the_cache(tmp_path, messages, monkeypatch):
+    cache_file = str(tmp_path / "parse_cache.db")
+    _parse(cache_file, messages)
+
+    monkeypatch.setattr(parser, "PARSER_REVISION", parser.PARSER_REVISION + 1)
+    _, info = _parse(cache_file, messages)
+    assert info == {"hits": 0, "misses": len(messages)}
+
+    _, info = _parse(cache_file, messages)
+    assert info == {"hits": len(messages), "misses": 0}
+
+
+def test_time_zone_change_clears_the_cache(tmp_path, messages, monkeypatch):
+    cache_file = str(tmp_path / "parse_cache.db")
+    _parse(cache_file, messages)
+
+    monkeypatch.setattr(time, "timezone", time.timezone - 4 * 3600)
+    _, info = _parse(cache_file, messages)
+    assert info == {"hits": 0, "misses": len(messages)}
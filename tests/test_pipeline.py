@@ -0,0 +1,61 @@
+import sqlite3
+
+from src.db.data_source import MessageDatabase
+from src.db.merchant_dictionary import MerchantDictionary
+from src.services.categorizer import ExpenseCategorizer
+from src.services.pipeline import iter_expenses, iter_expenses_parallel
+from src.utils.synthetic_chatdb import generate_chat_db
+
+VARIANTS = ["Carrefour - MOE - 2", "CARREFOUR MOE", "carrefour moe #7", "Carrefour. MOE"]
+
+
+def _messages(tmp_path):
+    """Synthetic payment messages with variants of one merchant spread over chunks"""
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 600, days=30, seed=5)
+    messages = MessageDatabase(chat_db).fetch_payment_messages()
+
+    # Each chunk of 7 messages sees a different variant first
+    for position, variant in zip(range(3, len(messages), 5), VARIANTS * 20):
+        text = f"Payment of AED {position}.50 was done at {variant} using your card 1234"
+        messages.insert(position, dict(messages[position], rowid=-position, text=text))
+    return messages
+
+
+def _dictionary(path):
+    conn = sqlite3.connect(path)
+    try:
+        names = conn.execute("SELECT id, key, name FROM merchant_names ORDER BY id").fetchall()
+        aliases = conn.execute("SELECT raw, merchant_id FROM merchant_aliases ORDER BY raw")
+        return names, aliases.fetchall()
+    finally:
+        conn.close()
+
+
+def _expenses(expenses):
+    return [(e.merchant, e.category, e.amount, e.date) for e in expenses]
+
+
+def test_parallel_interning_matches_serial(tmp_path):
+    messages = _messages(tmp_path)
+    categorizer = ExpenseCategorizer()
+
+    serial_file = str(tmp_path / "serial.db")
+    serial = MerchantDictionary(serial_file)
+    serial_expenses = list(iter_expenses(messages, categorizer, merchants=serial))
+    serial.close()
+
+    parallel_file = str(tmp_path / "parallel.db")
+    parallel = MerchantDictionary(parallel_file)
+    parallel_expenses = list(
+        iter_expenses_parallel(messages, categorizer, 2, chunk_size=7, merchants=parallel)
+    )
+    parallel.close()
+
+    assert _expenses(parallel_expenses) == _expenses(serial_expenses)
+    assert _dictionary(parallel_file) == _dictionary(serial_file)
+
+    names, aliases = _dictionary(serial_file)
+    carrefour = [merchant_id for merchant_id, key, _ in names if key == "carrefour moe"]
+    assert [raw for raw, merchant_id in aliases if merchant_id in carrefour] == sorted(VARIANTS)
+    assert {e.merchant for e in serial_expenses if "arrefour" in e.merchant} == {"Carrefour MOE"}
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+from src.db.expense_store import SQLiteExpenseStore
+from src.services.categorizer import ExpenseCategorizer
+from src.services.recategorize import change_keyword
+from src.utils.config import ExpenseStore
+
+CATEGORIES = {"grocery": ["lulu"], "restaurant": ["cafe"], "other": []}
+
+
+def _expense(merchant, category):
+    return {
+        "amount": 20.0,
+        "merchant": merchant,
+        "category": category,
+        "date": "2025-03-01T10:00:00",
+        "message": f"Payment at {merchant}",
+        "is_income": False,
+    }
+
+
+@pytest.fixture(params=["expenses.db", "expenses.json"])
+def setup(request, tmp_path):
+    categories_file = str(tmp_path / "categories.json")
+    with open(categories_file, "w") as f:
+        json.dump(CATEGORIES, f)
+    categorizer = ExpenseCategorizer(categories_file)
+
+    path = str(tmp_path / request.param)
+    store = SQLiteExpenseStore(path) if path.endswith(".db") else ExpenseStore(path)
+    store.save_expenses(
+        [
+            _expense("Lulu Hypermarket", "grocery"),
+            _expense("Zoo Cafe", "restaurant"),
+            _expense("Zoo Shop", "other"),
+            # Moved by hand; keyword changes leave it alone
+            _expense("Zoo Toys", "gifts"),
+        ]
+    )
+    return store, categorizer, categories_file
+
+
+def _categories(store):
+    return [expense["category"] for expense in store.iter_expenses()]
+
+
+def test_add_and_remove_keyword_keep_manual_edits(setup):
+    store, categorizer, categories_file = setup
+
+    result = change_keyword(store, categorizer, "grocery", "Zoo", categories_file=categories_file)
+    assert result.expenses_updated == 1
+    assert _categories(store) == ["grocery", "restaurant", "grocery", "gifts"]
+    with open(categories_file) as f:
+        assert "zoo" in json.load(f)["grocery"]
+
+    result = change_keyword(
+        store, categorizer, "grocery", "zoo", remove=True, categories_file=categories_file
+    )
+    assert result.expenses_updated == 1
+    assert _categories(store) == ["grocery", "restaurant", "other", "gifts"]
+    with open(categories_file) as f:
+        assert json.load(f) == CATEGORIES
+
+    assert change_keyword(store, categorizer, "grocery", "zoo", remove=True) is None
+
+
+def test_failed_save_leaves_store_and_rules_unchanged(setup, tmp_path):
+    store, categorizer, _ = setup
+    unwritable = str(tmp_path / "missing" / "file" / "categories.json")
+    os.makedirs(os.path.dirname(os.path.dirname(unwritable)))
+    open(os.path.dirname(unwritable), "w").close()
+
+    with pytest.raises(OSError):
+        change_keyword(store, categorizer, "grocery", "zoo", categories_file=unwritable)
+    assert _categories(store) == ["grocery", "restaurant", "other", "gifts"]
+    assert categorizer.categorize("Zoo Shop") == "other"
+
+
+def test_save_categories_to_file_in_current_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    categorizer = ExpenseCategorizer()
+    assert categorizer.save_categories("categories.json")
+    assert os.path.exists(tmp_path / "categories.json")
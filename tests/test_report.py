@@ -0,0 +1,82 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.expense import Expense
+from src.services.analytics import ExpenseAnalyzer
+from src.utils.report import iter_report_expenses, load_report_analytics, write_report
+
+
+def _expenses(count):
+    start = datetime(2025, 1, 1)
+    return [
+        Expense(
+            amount=round(10 + i * 1.25, 2),
+            merchant=f"Café {i % 5}",
+            category=["groceries", "dining"][i % 2],
+            date=start + timedelta(hours=13 * i),
+            message=f'Payment of AED {10 + i * 1.25} was done at "Café {i % 5}"\nthanks',
+            is_income=i % 9 == 0,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("count", [0, 1, 40])
+def test_json_report_is_byte_identical_to_json_dump(tmp_path, count):
+    expenses = _expenses(count)
+    analytics = ExpenseAnalyzer().analyze(expenses) if expenses else {"total_spent": 0}
+    expense_dicts = [expense.to_dict() for expense in expenses]
+    path = tmp_path / "report.json"
+
+    assert write_report(str(path), analytics, iter(expense_dicts)) == count
+    expected = json.dumps({"analytics": analytics, "expenses": expense_dicts}, indent=2)
+    assert path.read_text(encoding="utf-8") == expected
+    assert load_report_analytics(str(path)) == json.loads(expected)["analytics"]
+    assert list(iter_report_expenses(str(path))) == expense_dicts
+
+
+@pytest.mark.parametrize("name", ["report.ndjson", "report.jsonl.gz", "report.json.gz"])
+def test_report_round_trip(tmp_path, name):
+    expenses = _expenses(40)
+    analytics = ExpenseAnalyzer().analyze(expenses)
+    expense_dicts = [expense.to_dict() for expense in expenses]
+    path = str(tmp_path / name)
+
+    assert write_report(path, analytics, iter(expense_dicts)) == 40
+    assert load_report_analytics(path) == json.loads(json.dumps(analytics))
+    assert list(iter_report_expenses(path)) == expense_dicts
+    assert not (tmp_path / f"{name}.tmp").exists()
+
+    with open(path, "rb") as f:
+        assert (f.read(2) == b"\x1f\x8b") == name.endswith(".gz")
+
+
+def test_ndjson_report_without_trailer_has_no_analytics(tmp_path):
+    path = tmp_path / "report.ndjson"
+    expense_dicts = [expense.to_dict() for expense in _expenses(3)]
+    write_report(str(path), {"total_spent": 1.0}, iter(expense_dicts))
+
+    # Cut short before the trailer, as if interrupted while being written
+    lines = path.read_text(encoding="utf-8").splitlines(keepends=True)
+    assert json.loads(lines[-1])["expense_count"] == 3
+    path.write_text("".join(lines[:-1]), encoding="utf-8")
+
+    assert load_report_analytics(str(path)) is None
+    assert list(iter_report_expenses(str(path))) == expense_dicts
+
+
+def test_failed_write_keeps_the_previous_report(tmp_path):
+    path = tmp_path / "report.json"
+    write_report(str(path), {"total_spent": 1.0}, iter([]))
+    previous = path.read_bytes()
+
+    def failing():
+        yield _expenses(1)[0].to_dict()
+        raise RuntimeError("store failed")
+
+    with pytest.raises(RuntimeError):
+        write_report(str(path), {"total_spent": 2.0}, failing())
+    assert path.read_bytes() == previous
+    assert not (tmp_path / "report.json.tmp").exists()
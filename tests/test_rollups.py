@@ -0,0 +1,95 @@
+import random
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from src.db.expense_store import SQLiteExpenseStore
+from src.services.rollups import DailyRollups
+
+
+def _expenses(count, seed):
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+    expenses = []
+    for i in range(count):
+        expense = {
+            "amount": round(rng.uniform(1, 400), 2),
+            "merchant": rng.choice(["Lulu", "Carrefour", "Careem", "Salary", "Transfer to A"]),
+            "category": rng.choice(["groceries", "transport", "other"]),
+            "message": f"message {seed} {i}",
+            "is_income": rng.random() < 0.1,
+        }
+        # Some expenses have no date and are left out of the daily totals
+        if rng.random() < 0.95:
+            expense["date"] = (start + timedelta(minutes=rng.randrange(90 * 24 * 60))).isoformat()
+        expenses.append(expense)
+    return expenses
+
+
+def _recomputed(store):
+    """Daily totals summed in Python from the stored expenses"""
+    totals = defaultdict(lambda: [0.0, 0])
+    for expense in store.iter_expenses():
+        if not expense.get("date"):
+            continue
+        day = int(expense["date"][:10].replace("-", ""))
+        key = (day, expense["category"], expense["merchant"], expense["is_income"])
+        totals[key][0] += expense["amount"]
+        totals[key][1] += 1
+    return totals
+
+
+def _assert_consistent(store):
+    stored = {
+        (day, category, merchant, is_income): (total, count)
+        for day, category, merchant, is_income, total, count in store.load_daily_rollups()
+    }
+    expected = _recomputed(store)
+    assert stored.keys() == expected.keys()
+    for key, (total, count) in expected.items():
+        assert stored[key] == (pytest.approx(total), count)
+    assert store.verify_rollups() == []
+
+
+def test_daily_rollups_match_recomputed_sums(tmp_path):
+    store = SQLiteExpenseStore(str(tmp_path / "expenses.db"))
+
+    store.save_expenses(_expenses(500, seed=1))
+    _assert_consistent(store)
+
+    store.append_expenses(_expenses(200, seed=2))
+    _assert_consistent(store)
+
+    store.merge_expenses(_expenses(200, seed=2) + _expenses(50, seed=3))
+    _assert_consistent(store)
+
+    ids = [expense["id"] for expense in store.iter_expenses()]
+    store.update_expense_categories([(expense_id, "dining") for expense_id in ids[::7]])
+    store.recategorize_merchants([("Careem", "transport", "travel")])
+    store.update_expense_merchants([(expense_id, "LuLu") for expense_id in ids[::5]], revision=2)
+    _assert_consistent(store)
+
+    store.save_expenses(_expenses(100, seed=4))
+    _assert_consistent(store)
+
+
+def test_range_summary_matches_recomputed_sums(tmp_path):
+    store = SQLiteExpenseStore(str(tmp_path / "expenses.db"))
+    store.save_expenses(_expenses(800, seed=5))
+    rollups = DailyRollups(store.load_daily_rollups())
+
+    first, last = date(2025, 1, 20), date(2025, 2, 10)
+    spent = income = 0.0
+    count = 0
+    for expense in store.iter_expenses(first_day=first, last_day=last):
+        count += 1
+        if expense["is_income"]:
+            income += expense["amount"]
+        else:
+            spent += expense["amount"]
+
+    summary = rollups.summary(first, last)
+    assert summary["expense_count"] == count
+    assert summary["total_spent"] == pytest.approx(spent)
+    assert summary["total_income"] == pytest.approx(income)
@@ -0,0 +1,67 @@
+import sqlite3
+
+from src.db.data_source import MessageDatabase
+from src.db.search_index import MessageSearchIndex
+from src.utils.synthetic_chatdb import generate_chat_db
+
+
+def _add_messages(db_path, *texts):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        (date,) = conn.execute("SELECT MAX(date) FROM message").fetchone()
+        conn.executemany(
+            "INSERT INTO message (guid, text, handle_id, service, date) VALUES (?, ?, 1, 'SMS', ?)",
+            [(f"TEST-{position}", text, date + position) for position, text in enumerate(texts, 1)],
+        )
+    conn.close()
+
+
+def test_sync_mirrors_payment_messages_incrementally(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 500, days=60, seed=8)
+    index = MessageSearchIndex(str(tmp_path / "search_index.db"), chat_db)
+
+    assert index.sync() == 500
+    assert index.fetch_payment_messages() == MessageDatabase(chat_db).fetch_payment_messages()
+    assert index.sync() == 0
+
+    last_rowid = index.get_max_rowid()
+    generate_chat_db(chat_db, 50, seed=8, append=True)
+    assert index.sync() == 50
+    assert index.get_max_rowid() == last_rowid + 50
+    assert index.fetch_payment_messages() == MessageDatabase(chat_db).fetch_payment_messages()
+    assert index.fetch_payment_messages(since_rowid=last_rowid) == (
+        MessageDatabase(chat_db).fetch_payment_messages(since_rowid=last_rowid)
+    )
+
+
+def test_full_text_candidates_are_rechecked_with_like(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 100, days=60, seed=9)
+    _add_messages(
+        chat_db,
+        # Matches the full-text query, but not the LIKE patterns' word order
+        "Your parcel was sent by courier, AED 20 will be collected on delivery.",
+        "A refund from Noon has been refunded? No: AED 15 pending.",
+        "AED 42.00 sent by Omar Khan and credited to your account ending 1234.",
+    )
+    index = MessageSearchIndex(str(tmp_path / "search_index.db"), chat_db)
+    index.sync()
+
+    texts = [message["text"] for message in index.fetch_payment_messages()]
+    assert "AED 42.00 sent by Omar Khan and credited to your account ending 1234." in texts
+    assert not [text for text in texts if "courier" in text or "Noon" in text]
+    assert index.fetch_payment_messages() == MessageDatabase(chat_db).fetch_payment_messages()
+
+
+def test_index_is_rebuilt_for_a_different_database(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 300, days=60, seed=10)
+    index = MessageSearchIndex(str(tmp_path / "search_index.db"), chat_db)
+    index.sync()
+
+    # Recreated at the same path, as seen by the next run
+    generate_chat_db(chat_db, 200, days=60, seed=11)
+    index = MessageSearchIndex(str(tmp_path / "search_index.db"), chat_db)
+    assert index.sync() == 200
+    assert index.fetch_payment_messages() == MessageDatabase(chat_db).fetch_payment_messages()
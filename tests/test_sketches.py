@@ -0,0 +1,67 @@
+import math
+import random
+
+import pytest
+
+from src.services.sketches import RELATIVE_ACCURACY, AmountSketch
+
+
+def _sketch(amounts):
+    sketch = AmountSketch()
+    for amount in amounts:
+        sketch.add(amount)
+    return sketch
+
+
+def _nearest_rank(amounts, q):
+    ordered = sorted(amounts)
+    return ordered[max(math.ceil(q * len(ordered)), 1) - 1]
+
+
+def test_quantile_of_empty_sketch():
+    sketch = AmountSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.summary()["outlier_share"] is None
+
+
+def test_quantile_of_single_amount():
+    sketch = _sketch([120.0])
+    for q in (0.0, 0.5, 0.9, 0.99, 1.0):
+        assert sketch.quantile(q) == pytest.approx(120.0, rel=RELATIVE_ACCURACY)
+
+
+def test_quantile_of_two_amounts_uses_nearest_rank():
+    sketch = _sketch([5.42, 4200.0])
+    assert sketch.quantile(0.5) == pytest.approx(5.42, rel=RELATIVE_ACCURACY)
+    assert sketch.quantile(0.9) == pytest.approx(4200.0, rel=RELATIVE_ACCURACY)
+    assert sketch.quantile(0.99) == pytest.approx(4200.0, rel=RELATIVE_ACCURACY)
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 5, 7, 10, 31])
+def test_quantiles_of_small_inputs_match_nearest_rank(size):
+    rng = random.Random(size)
+    amounts = [round(rng.uniform(1, 500), 2) for _ in range(size)]
+    sketch = _sketch(amounts)
+    for q in (0.25, 0.5, 0.75, 0.9, 0.99):
+        expected = _nearest_rank(amounts, q)
+        assert sketch.quantile(q) == pytest.approx(expected, rel=RELATIVE_ACCURACY)
+
+
+def test_no_outlier_share_below_minimum_count():
+    summary = _sketch([5.42, 4200.0, 80.0]).summary()
+    assert summary["outlier_threshold"] is None
+    assert summary["outlier_share"] is None
+
+
+def test_outlier_share_of_one_large_amount():
+    amounts = [50.0] * 10 + [5000.0]
+    summary = _sketch(amounts).summary()
+    assert summary["outlier_share"] == pytest.approx(5000.0 / sum(amounts))
+    assert summary["p50"] == pytest.approx(50.0, rel=RELATIVE_ACCURACY)
+
+
+def test_merged_sketches_match_one_sketch():
+    rng = random.Random(0)
+    amounts = [rng.lognormvariate(4, 1) for _ in range(200)]
+    merged = _sketch(amounts[:70]).merge(_sketch(amounts[70:]))
+    assert merged.summary() == pytest.approx(_sketch(amounts).summary())
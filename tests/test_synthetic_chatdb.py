@@ -0,0 +1,41 @@
+import sqlite3
+from datetime import date
+
+from src.db.data_source import MessageDatabase
+from src.utils.date_utils import convert_imessage_timestamp
+from src.utils.synthetic_chatdb import generate_chat_db
+
+
+def _dump(path):
+    conn = sqlite3.connect(path)
+    try:
+        return list(conn.iterdump())
+    finally:
+        conn.close()
+
+
+def test_same_seed_and_end_date_give_the_same_database(tmp_path):
+    first, second = str(tmp_path / "first.db"), str(tmp_path / "second.db")
+    generate_chat_db(first, 300, days=30, seed=11, end_date=date(2024, 3, 1))
+    generate_chat_db(second, 300, days=30, seed=11, end_date=date(2024, 3, 1))
+    assert _dump(first) == _dump(second)
+
+    generate_chat_db(first, 20, seed=11, append=True, end_date=date(2024, 3, 2))
+    generate_chat_db(second, 20, seed=11, append=True, end_date=date(2024, 3, 2))
+    assert _dump(first) == _dump(second)
+
+
+def test_history_ends_at_the_end_date(tmp_path):
+    chat_db = str(tmp_path / "chat.db")
+    generate_chat_db(chat_db, 300, days=30, seed=11, end_date=date(2024, 3, 1))
+
+    dates = [
+        convert_imessage_timestamp(message["date"]).date()
+        for message in MessageDatabase(chat_db).fetch_payment_messages()
+    ]
+    assert min(dates) >= date(2024, 1, 29)
+    assert max(dates) <= date(2024, 3, 1)
+
+    other = str(tmp_path / "other.db")
+    generate_chat_db(other, 300, days=30, seed=12, end_date=date(2024, 3, 1))
+    assert MessageDatabase(other).get_identity() != MessageDatabase(chat_db).get_identity()
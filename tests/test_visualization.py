@@ -0,0 +1,90 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.expense import Expense
+from src.services.analytics import ExpenseAnalyzer
+from src.ui import visualization
+from src.ui.visualization import MANIFEST_FILE, ExpenseVisualizer
+
+
+@pytest.fixture
+def analytics():
+    rng = random.Random(0)
+    start = datetime(2025, 1, 1)
+    expenses = [
+        Expense(
+            amount=round(rng.lognormvariate(4, 1), 2),
+            merchant=f"Merchant {i % 7}",
+            category=rng.choice(["groceries", "dining", "transport"]),
+            date=start + timedelta(days=i),
+            message=f"message {i}",
+            is_income=i % 10 == 0,
+        )
+        for i in range(90)
+    ]
+    return ExpenseAnalyzer().analyze(expenses)
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """(chart name, formats) of every chart drawn"""
+    calls = []
+    render_chart = visualization._render_chart
+
+    def recording_render_chart(job):
+        calls.append((job[0], sorted(job[2])))
+        return render_chart(job)
+
+    monkeypatch.setattr(visualization, "_render_chart", recording_render_chart)
+    return calls
+
+
+def _render(analytics, output_dir, formats=("png",)):
+    return ExpenseVisualizer().render_charts(analytics, output_dir, formats, workers=1)
+
+
+def test_unchanged_charts_are_skipped(tmp_path, analytics, rendered):
+    output_dir = str(tmp_path / "charts")
+
+    files = _render(analytics, output_dir)
+    assert sorted(name for name, _ in rendered) == sorted(files)
+    assert all(os.path.exists(path) for paths in files.values() for path in paths)
+    with open(os.path.join(output_dir, MANIFEST_FILE)) as f:
+        assert sorted(json.load(f)) == sorted(files)
+
+    rendered.clear()
+    assert _render(analytics, output_dir) == files
+    assert rendered == []
+
+
+def test_changed_input_deleted_file_and_new_format_are_rendered(tmp_path, analytics, rendered):
+    output_dir = str(tmp_path / "charts")
+    files = _render(analytics, output_dir)
+
+    rendered.clear()
+    analytics["top_merchants"] = dict(analytics["top_merchants"], **{"Merchant 0": 1.0})
+    _render(analytics, output_dir)
+    assert rendered == [("merchants", ["png"])]
+
+    rendered.clear()
+    os.remove(files["categories"][0])
+    _render(analytics, output_dir)
+    assert rendered == [("categories", ["png"])]
+
+    rendered.clear()
+    _render(analytics, output_dir, ("png", "svg"))
+    assert sorted(rendered) == sorted((name, ["svg"]) for name in files)
+
+
+def test_render_version_change_renders_everything(tmp_path, analytics, rendered, monkeypatch):
+    output_dir = str(tmp_path / "charts")
+    files = _render(analytics, output_dir)
+
+    rendered.clear()
+    monkeypatch.setattr(visualization, "RENDER_VERSION", visualization.RENDER_VERSION + 1)
+    _render(analytics, output_dir)
+    assert sorted(name for name, _ in rendered) == sorted(files)
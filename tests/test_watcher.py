@@ -0,0 +1,112 @@
+import sqlite3
+
+import pytest
+
+from src.services.watcher import DatabaseWatcher
+
+
+class FakeClock:
+    """Monotonic clock that only advances when slept on"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "chat.db")
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE message (ROWID INTEGER PRIMARY KEY, text TEXT)")
+    conn.commit()
+    yield path, conn
+    conn.close()
+
+
+def _append(conn, count=1):
+    with conn:
+        conn.executemany("INSERT INTO message (text) VALUES (?)", [("payment",)] * count)
+
+
+def _watcher(path, on_change, clock):
+    return DatabaseWatcher(path, on_change, sleep=clock.sleep, clock=clock)
+
+
+def test_idle_polls_back_off(db):
+    path, _ = db
+    clock = FakeClock()
+    calls = []
+    watcher = _watcher(path, lambda: calls.append(1), clock)
+
+    for _ in range(5):
+        assert not watcher.poll_once()
+    assert not calls
+    assert watcher.interval == watcher.max_interval
+
+
+def test_burst_of_writes_runs_callback_once(db):
+    path, conn = db
+    clock = FakeClock()
+    calls = []
+    watcher = _watcher(path, lambda: calls.append(1), clock)
+
+    for _ in range(3):
+        _append(conn)
+    assert watcher.poll_once()
+    assert not watcher.poll_once()
+    assert calls == [1]
+    assert clock.now < 1.0
+
+
+def test_write_during_callback_is_picked_up(db):
+    path, conn = db
+    clock = FakeClock()
+    calls = []
+
+    def on_change():
+        calls.append(1)
+        if len(calls) == 1:
+            # A notification arriving while the callback reads
+            _append(conn)
+
+    watcher = _watcher(path, on_change, clock)
+    _append(conn)
+    assert watcher.poll_once()
+    assert watcher.poll_once()
+    assert len(calls) == 2
+    assert not watcher.poll_once()
+    assert clock.now < watcher.resync_interval
+
+
+def test_failed_callback_is_retried(db):
+    path, conn = db
+    clock = FakeClock()
+    calls = []
+
+    def on_change():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+
+    watcher = _watcher(path, on_change, clock)
+    _append(conn)
+    assert not watcher.poll_once()
+    assert watcher.poll_once()
+    assert len(calls) == 2
+
+
+def test_resync_runs_callback_without_changes(db):
+    path, _ = db
+    clock = FakeClock()
+    calls = []
+    watcher = _watcher(path, lambda: calls.append(1), clock)
+
+    clock.sleep(watcher.resync_interval)
+    assert watcher.poll_once()
+    assert calls == [1]